@@ -9,6 +9,11 @@ Lambda Pipeline, a framework for writing clear, minimal Python FAAS
 
 from lpipe._version import __version__
 from lpipe.action import Action
+from lpipe.claimcheck import ClaimCheck
+from lpipe.compression import Codec
 from lpipe.payload import Payload
 from lpipe.pipeline import EventSourceType, process_event
 from lpipe.queue import Queue, QueueType
+from lpipe.retry import Retry
+from lpipe.scheduler import Order, Scheduler
+from lpipe.wire import WireFormat
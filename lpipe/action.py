@@ -3,6 +3,7 @@ from types import FunctionType
 from typing import List, Union
 
 from lpipe import queue, utils
+from lpipe.retry import Retry
 
 
 class Action:
@@ -13,13 +14,19 @@ class Action:
         queues: List[queue.Queue] = [],
         required_params=None,
         include_all_params=False,
+        retry: Retry = None,
+        max_workers: int = 1,
     ):
         assert functions or paths or queues
+        assert retry is None or isinstance(retry, Retry)
+        assert max_workers >= 1
         self.functions = functions
         self.paths = paths
         self.queues = queues
         self.required_params = required_params
         self.include_all_params = include_all_params
+        self.retry = retry
+        self.max_workers = max_workers
 
     def __repr__(self):
         return utils.repr(self, ["functions", "paths", "queues"])
@@ -30,4 +37,6 @@ class Action:
             paths=[str(p).split(".")[-1] for p in self.paths],
             queues=self.queues,
             required_params=self.required_params,
+            retry=self.retry,
+            max_workers=self.max_workers,
         )
@@ -0,0 +1,84 @@
+import hashlib
+from functools import lru_cache
+
+import botocore
+
+import lpipe.exceptions
+from lpipe import utils, wire
+from lpipe.contrib import s3
+
+# A record is a claim check if it is a dict with this as its only key.
+KEY = "__lpipe_claim_check__"
+
+
+class ClaimCheck:
+    """Offload records which are too large for their queue to S3.
+
+    The record is stored, exactly as it would have been sent, in an S3 object named
+    after its hash. A small pointer to that object is sent in its place, and
+    resolved transparently when it's received.
+
+    Args:
+        bucket (str):
+        prefix (str): prefix for the keys of stored records
+    """
+
+    def __init__(self, bucket: str, prefix: str = "lpipe/claim-check/"):
+        self.bucket = bucket
+        self.prefix = prefix
+
+    def __repr__(self):
+        return utils.repr(self, ["bucket", "prefix"])
+
+    def offload(self, data) -> dict:
+        """Store serialized record data and return a pointer to it.
+
+        Args:
+            data (Union[str, bytes]):
+        """
+        body = data.encode("utf-8") if isinstance(data, str) else data
+        # Flagging this as nosec for bandit because this is for naming, not security
+        key = f"{self.prefix}{hashlib.sha1(body).hexdigest()}"  # nosec
+        s3.put_object(self.bucket, key, body)
+        return {KEY: {"bucket": self.bucket, "key": key}}
+
+
+@lru_cache(maxsize=16)
+def _get_object(bucket: str, key: str) -> bytes:
+    # Stored records are immutable (named after their hash), so they're safe to cache.
+    return s3.get_object(bucket, key)
+
+
+def retrieve(payload):
+    """Resolve a claim check to the record it points to.
+
+    Returns:
+        The stored record, or `payload` unchanged if it isn't a claim check.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the stored record is missing or invalid
+        lpipe.exceptions.FailCatastrophically: if the stored record couldn't be fetched
+    """
+    if not (isinstance(payload, dict) and len(payload) == 1 and KEY in payload):
+        return payload
+    try:
+        pointer = payload[KEY]
+        body = _get_object(pointer["bucket"], pointer["key"])
+    except (KeyError, TypeError) as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Malformed claim check: {payload}"
+        ) from e
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            raise lpipe.exceptions.InvalidPayloadError(
+                f"Claim checked record no longer exists: {payload}"
+            ) from e
+        # e.g. access denied or throttled; the record is still there, so retry it.
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Failed to fetch claim checked record: {payload}"
+        ) from e
+    except botocore.exceptions.BotoCoreError as e:
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Failed to fetch claim checked record: {payload}"
+        ) from e
+    return wire.loads(body)
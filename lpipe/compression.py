@@ -0,0 +1,122 @@
+import base64
+import gzip
+import io
+from enum import Enum
+
+import lpipe.exceptions
+
+
+class Codec(Enum):
+    GZIP = 1
+    ZSTD = 2  # Requires the zstandard package
+
+
+MAGIC = {Codec.GZIP: b"\x1f\x8b", Codec.ZSTD: b"\x28\xb5\x2f\xfd"}
+
+# Binary data sent as text (e.g. compressed SQS message bodies) is base64 encoded
+# behind this prefix. JSON can't start with "L", so it never collides with JSON.
+TEXT_PREFIX = "LPZ:"
+
+# Payloads smaller than this (in bytes) aren't worth compressing.
+DEFAULT_THRESHOLD = 1024
+
+
+def _zstandard():
+    try:
+        import zstandard
+    except ImportError as e:
+        raise lpipe.exceptions.InvalidConfigurationError(
+            "Codec.ZSTD requires the zstandard package, please install it to proceed"
+        ) from e
+    return zstandard
+
+
+def compress(data: bytes, codec: Codec) -> bytes:
+    """Compress data. The codec is identified by the output's magic number."""
+    if codec == Codec.GZIP:
+        # gzip.compress only takes mtime from python 3.8. A fixed mtime keeps the
+        # output (and so claim check keys) the same for the same data.
+        buf = io.BytesIO()
+        with gzip.GzipFile(fileobj=buf, mode="wb", compresslevel=6, mtime=0) as f:
+            f.write(data)
+        return buf.getvalue()
+    if codec == Codec.ZSTD:
+        return _zstandard().ZstdCompressor().compress(data)
+    raise lpipe.exceptions.InvalidConfigurationError(f"Unknown codec {codec}")
+
+
+def decompress(data: bytes) -> bytes:
+    """Decompress data if it starts with a known magic number, otherwise return it as-is.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the data is corrupt
+    """
+    try:
+        if data.startswith(MAGIC[Codec.GZIP]):
+            return gzip.decompress(data)
+        if data.startswith(MAGIC[Codec.ZSTD]):
+            return _zstandard().ZstdDecompressor().decompress(data)
+    except lpipe.exceptions.LPBaseException:
+        raise
+    except Exception as e:
+        # e.g. gzip.BadGzipFile, zlib.error, EOFError, zstandard.ZstdError
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Failed to decompress payload. {e}"
+        ) from e
+    return data
+
+
+def maybe_compress(data, codec: Codec = None, threshold: int = DEFAULT_THRESHOLD):
+    """Compress serialized data if a codec is set, it's large enough, and it shrinks.
+
+    Args:
+        data (Union[str, bytes]):
+
+    Returns:
+        The compressed bytes, or `data` unchanged.
+    """
+    if not codec:
+        return data
+    encoded = data.encode("utf-8") if isinstance(data, str) else data
+    if len(encoded) < threshold:
+        return data
+    compressed = compress(encoded, codec)
+    return compressed if len(compressed) < len(encoded) else data
+
+
+def compress_text(data, codec: Codec = None, threshold: int = DEFAULT_THRESHOLD):
+    """Like maybe_compress, but the result is text, for transports which require it.
+
+    Binary data (compressed or not) is base64 encoded behind TEXT_PREFIX.
+    """
+    compressed = maybe_compress(data, codec, threshold)
+    if isinstance(compressed, str):
+        return data
+    text = to_text(compressed)
+    return text if isinstance(data, bytes) or len(text) < len(data) else data
+
+
+def to_text(data: bytes) -> str:
+    """Encode binary data as text, behind TEXT_PREFIX."""
+    return TEXT_PREFIX + base64.b64encode(data).decode("ascii")
+
+
+def from_text(data: str) -> bytes:
+    """Reverse to_text.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the data isn't valid base64
+    """
+    try:
+        return base64.b64decode(data[len(TEXT_PREFIX) :], validate=True)
+    except ValueError as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Failed to decode binary payload. {e}"
+        ) from e
+
+
+def decompress_text(data: str) -> str:
+    """Reverse compress_text, for text data. Text without TEXT_PREFIX is returned as-is."""
+    if not data.startswith(TEXT_PREFIX):
+        return data
+    return decompress(from_text(data)).decode("utf-8")
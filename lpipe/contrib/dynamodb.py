@@ -0,0 +1,53 @@
+import base64
+from functools import lru_cache
+
+
+@lru_cache(maxsize=4096)
+def _number(value: str):
+    # Stream images tend to repeat the same numbers (counts, flags, enums), so cache them.
+    try:
+        return int(value)
+    except ValueError:
+        return float(value)
+
+
+def _binary(value):
+    # Stream events carry binary values base64 encoded; boto3 responses carry bytes.
+    return value if isinstance(value, bytes) else base64.b64decode(value)
+
+
+_DESERIALIZERS = {
+    "S": lambda v: v,
+    "N": _number,
+    "B": _binary,
+    "BOOL": lambda v: v,
+    "NULL": lambda v: None,
+    "M": lambda v: {k: deserialize(a) for k, a in v.items()},
+    "L": lambda v: [deserialize(a) for a in v],
+    "SS": list,
+    "NS": lambda v: [_number(n) for n in v],
+    "BS": lambda v: [_binary(b) for b in v],
+}
+
+
+def deserialize(value: dict):
+    """Convert a DynamoDB JSON attribute value (e.g. `{"N": "1"}`) to a plain python value.
+
+    Numbers become int or float, sets become lists, and binary values become bytes,
+    so the result can be serialized like any other record.
+
+    Raises:
+        ValueError: if the attribute's type is unknown
+    """
+    ((tag, v),) = value.items()
+    try:
+        return _DESERIALIZERS[tag](v)
+    except KeyError as e:
+        raise ValueError(f"Unknown DynamoDB attribute type {tag}") from e
+
+
+def deserialize_image(image: dict) -> dict:
+    """Convert a DynamoDB JSON item (e.g. a stream record's NewImage) to a plain dict."""
+    if image is None:
+        return None
+    return {k: deserialize(v) for k, v in image.items()}
@@ -0,0 +1,146 @@
+import json
+import logging
+from functools import wraps
+
+import botocore
+from decouple import config
+
+import lpipe.contrib.boto3
+import lpipe.exceptions
+from lpipe import utils
+from lpipe.retry import Retry
+
+MAX_BATCH_SIZE = 10  # entries per put_events request
+MAX_BATCH_BYTES = 256 * 1024  # total of all entries, per request
+
+DEFAULT_SOURCE = "lpipe"
+
+
+def build(detail, source=DEFAULT_SOURCE, detail_type=None, event_bus_name=None):
+    """Serialize a record as a put_events entry.
+
+    Args:
+        detail (dict):
+        source (str):
+        detail_type (str, optional): Defaults to the source.
+        event_bus_name (str, optional): name or ARN. Defaults to the account's default bus.
+    """
+    entry = {
+        "Source": source,
+        "DetailType": detail_type or source,
+        "Detail": json.dumps(detail, sort_keys=True),
+    }
+    if event_bus_name:
+        entry["EventBusName"] = event_bus_name
+    return entry
+
+
+def entry_size(entry):
+    """Size of a built entry as counted against the put_events limits."""
+    n = 14 if entry.get("Time") else 0
+    for k in ("Source", "DetailType", "Detail"):
+        n += len(entry[k].encode("utf-8"))
+    for r in entry.get("Resources", []):
+        n += len(r.encode("utf-8"))
+    return n
+
+
+def failed_indexes(response, entries=None):
+    """Indexes of the entries put_events rejected."""
+    if not response.get("FailedEntryCount"):
+        return []
+    return [i for i, e in enumerate(response["Entries"]) if e.get("ErrorCode")]
+
+
+def mock_eventbridge(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (
+            botocore.exceptions.NoCredentialsError,
+            botocore.exceptions.ClientError,
+            botocore.exceptions.NoRegionError,
+            botocore.exceptions.ParamValidationError,
+        ):
+            if config("MOCK_AWS", default=False):
+                log = kwargs["logger"] if "logger" in kwargs else logging.getLogger()
+                log.debug(
+                    "Mocked EventBridge",
+                    function=f"{func}",
+                    params={"args": f"{args}", "kwargs": f"{kwargs}"},
+                )
+                return
+            else:
+                raise
+
+    return wrapper
+
+
+@mock_eventbridge
+def batch_put_events(
+    event_bus_name,
+    events,
+    batch_size=MAX_BATCH_SIZE,
+    source=None,
+    detail_type=None,
+    rate_limiter=None,
+    deadline=None,
+    retry=None,
+    **kwargs,
+):
+    """Put events onto an eventbridge event bus, batched by count and request size.
+
+    Entries which eventbridge rejects individually (e.g. when throttled) are resent.
+
+    Args:
+        event_bus_name (str): name or ARN
+        events (list):
+        batch_size (int):
+        source (function, optional): called with each event to get its Source. Defaults to DEFAULT_SOURCE.
+        detail_type (function, optional): called with each event to get its DetailType. Defaults to the source.
+        rate_limiter (lpipe.ratelimit.RateLimiter, optional): throttles each request
+        deadline (float, optional): time (per time.monotonic) after which we stop waiting or resending
+        retry (lpipe.Retry, optional): how to resend rejected entries. Defaults to 3 attempts.
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: if any entry exceeds MAX_BATCH_BYTES
+        lpipe.exceptions.FailCatastrophically: if any entries were still rejected after every attempt
+    """
+    assert batch_size <= MAX_BATCH_SIZE  # put_events will fail otherwise
+    retry = retry or Retry()
+    entries = [
+        build(
+            event,
+            source=source(event) if source else DEFAULT_SOURCE,
+            detail_type=detail_type(event) if detail_type else None,
+            event_bus_name=event_bus_name,
+        )
+        for event in events
+    ]
+    utils.check_sizes(entries, MAX_BATCH_BYTES, size=entry_size)
+    client = lpipe.contrib.boto3.client("events")
+
+    def send(b):
+        return utils.call(client.put_events, Entries=b)
+
+    responses, failed = [], []
+    for b in utils.batch_by_size(entries, batch_size, MAX_BATCH_BYTES, size=entry_size):
+        if rate_limiter:
+            rate_limiter.acquire(
+                len(b), sum([entry_size(e) for e in b]), deadline=deadline
+            )
+        _responses, _failed = retry.resend(
+            send, b, failed_indexes, deadline=deadline, logger=kwargs.get("logger")
+        )
+        responses.extend(_responses)
+        failed.extend(_failed)
+    if failed:
+        raise lpipe.exceptions.FailCatastrophically(
+            f"EventBridge rejected {len(failed)} of {len(entries)} events put onto {event_bus_name}."
+        )
+    return tuple(responses)
+
+
+def put_event(event_bus_name, data, **kwargs):
+    return batch_put_events(event_bus_name=event_bus_name, events=[data], **kwargs)
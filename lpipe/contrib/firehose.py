@@ -0,0 +1,162 @@
+import base64
+import json
+import logging
+from enum import Enum
+from functools import wraps
+
+import botocore
+from decouple import config
+
+import lpipe.contrib.boto3
+import lpipe.exceptions
+from lpipe import utils
+from lpipe.retry import Retry
+
+MAX_BATCH_SIZE = 500  # records per put_record_batch request
+MAX_RECORD_BYTES = 1000 * 1024  # per record, before base64 encoding
+MAX_BATCH_BYTES = 4 * 1024 * 1024  # per request
+
+
+class TransformationResult(Enum):
+    OK = "Ok"
+    DROPPED = "Dropped"
+    PROCESSING_FAILED = "ProcessingFailed"
+
+
+def build(record_data):
+    """Serialize a record as a line of newline-delimited JSON.
+
+    Firehose concatenates records as it delivers them, so each record is framed
+    with a trailing newline.
+    """
+    return {"Data": json.dumps(record_data, sort_keys=True) + "\n"}
+
+
+def record_size(record):
+    """Size of a built record as counted against the firehose limits."""
+    return len(record["Data"].encode("utf-8"))
+
+
+def build_transformation_records(results: list) -> list:
+    """Build the records of a data transformation response.
+
+    A successful record's data is replaced by the output of each lpipe record it held,
+    as newline-delimited JSON. If none of them returned anything, or the record
+    wasn't successful, its data is passed through unchanged.
+
+    Args:
+        results (list): a (record, TransformationResult, outputs) tuple for each record
+            received, where outputs are (input, output) pairs for each lpipe record in it
+    """
+    records = []
+    for record, result, outputs in results:
+        data = record["data"]
+        if result == TransformationResult.OK and any(
+            [o is not None for _, o in outputs]
+        ):
+            lines = [
+                json.dumps(i if o is None else o, sort_keys=True) + "\n"
+                for i, o in outputs
+            ]
+            data = base64.b64encode("".join(lines).encode("utf-8")).decode("ascii")
+        records.append(
+            {"recordId": record["recordId"], "result": result.value, "data": data}
+        )
+    return records
+
+
+def failed_indexes(response, entries=None):
+    """Indexes of the records put_record_batch rejected."""
+    if not response.get("FailedPutCount"):
+        return []
+    return [i for i, r in enumerate(response["RequestResponses"]) if r.get("ErrorCode")]
+
+
+def mock_firehose(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (
+            botocore.exceptions.NoCredentialsError,
+            botocore.exceptions.ClientError,
+            botocore.exceptions.NoRegionError,
+            botocore.exceptions.ParamValidationError,
+        ):
+            if config("MOCK_AWS", default=False):
+                log = kwargs["logger"] if "logger" in kwargs else logging.getLogger()
+                log.debug(
+                    "Mocked Firehose",
+                    function=f"{func}",
+                    params={"args": f"{args}", "kwargs": f"{kwargs}"},
+                )
+                return
+            else:
+                raise
+
+    return wrapper
+
+
+@mock_firehose
+def batch_put_records(
+    delivery_stream_name,
+    records,
+    batch_size=MAX_BATCH_SIZE,
+    rate_limiter=None,
+    deadline=None,
+    retry=None,
+    **kwargs,
+):
+    """Put records into a firehose delivery stream, batched by count and request size.
+
+    Records which firehose rejects individually (e.g. when throttled) are resent.
+
+    Args:
+        delivery_stream_name (str):
+        records (list):
+        batch_size (int):
+        rate_limiter (lpipe.ratelimit.RateLimiter, optional): throttles each request
+        deadline (float, optional): time (per time.monotonic) after which we stop waiting or resending
+        retry (lpipe.Retry, optional): how to resend rejected records. Defaults to 3 attempts.
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: if any record exceeds MAX_RECORD_BYTES
+        lpipe.exceptions.FailCatastrophically: if any records were still rejected after every attempt
+    """
+    assert batch_size <= MAX_BATCH_SIZE  # put_record_batch will fail otherwise
+    retry = retry or Retry()
+    entries = [build(record) for record in records]
+    utils.check_sizes(entries, MAX_RECORD_BYTES, size=record_size)
+    client = lpipe.contrib.boto3.client("firehose")
+
+    def send(b):
+        return utils.call(
+            client.put_record_batch,
+            DeliveryStreamName=delivery_stream_name,
+            Records=b,
+        )
+
+    responses, failed = [], []
+    for b in utils.batch_by_size(
+        entries, batch_size, MAX_BATCH_BYTES, size=record_size
+    ):
+        if rate_limiter:
+            rate_limiter.acquire(
+                len(b), sum([record_size(r) for r in b]), deadline=deadline
+            )
+        _responses, _failed = retry.resend(
+            send, b, failed_indexes, deadline=deadline, logger=kwargs.get("logger")
+        )
+        responses.extend(_responses)
+        failed.extend(_failed)
+    if failed:
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Firehose rejected {len(failed)} of {len(entries)} records sent to {delivery_stream_name}."
+        )
+    return tuple(responses)
+
+
+def put_record(delivery_stream_name, data, **kwargs):
+    return batch_put_records(
+        delivery_stream_name=delivery_stream_name, records=[data], **kwargs
+    )
@@ -1,4 +1,3 @@
-import json
 import logging
 from functools import wraps
 
@@ -6,12 +5,48 @@ import botocore
 from decouple import config
 
 import lpipe.contrib.boto3
-from lpipe import utils
+from lpipe import compression, envelope, kpl, utils, wire
 
+MAX_BATCH_SIZE = 500  # records per put_records request
+MAX_RECORD_BYTES = 1024 * 1024  # data + partition key, per record
+MAX_BATCH_BYTES = 5 * 1024 * 1024  # data + partition keys, per request
+MAX_PARTITION_KEY_BYTES = 256
 
-def build(record_data):
-    data = json.dumps(record_data, sort_keys=True)
-    return {"Data": data, "PartitionKey": utils.hash(data)}
+
+def build(
+    record_data,
+    partition_key=None,
+    explicit_hash_key=None,
+    codec=None,
+    compression_threshold=compression.DEFAULT_THRESHOLD,
+    wire_format=None,
+):
+    """Serialize a record for put_records.
+
+    Args:
+        record_data (dict):
+        partition_key (str, optional): Defaults to a hash of the serialized record.
+        explicit_hash_key (str, optional):
+        codec (lpipe.compression.Codec, optional): compress records of at least `compression_threshold` bytes
+        compression_threshold (int):
+        wire_format (lpipe.wire.WireFormat, optional): Defaults to JSON.
+    """
+    data = wire.dumps(record_data, wire_format)
+    record = {
+        "Data": compression.maybe_compress(data, codec, compression_threshold),
+        "PartitionKey": partition_key or utils.hash(data),
+    }
+    if explicit_hash_key:
+        record["ExplicitHashKey"] = explicit_hash_key
+    return record
+
+
+def record_size(record):
+    """Size of a built record as counted against the kinesis limits."""
+    data = record["Data"]
+    return len(data if isinstance(data, bytes) else data.encode("utf-8")) + len(
+        record["PartitionKey"].encode("utf-8")
+    )
 
 
 def mock_kinesis(func):
@@ -40,20 +75,175 @@ def mock_kinesis(func):
 
 
 @mock_kinesis
-def batch_put_records(stream_name, records, batch_size=500, **kwargs):
-    """Put records into a kinesis stream, batched by the maximum of 500."""
+def batch_put_records(
+    stream_name,
+    records,
+    batch_size=MAX_BATCH_SIZE,
+    partition_key=None,
+    explicit_hash_key=None,
+    rate_limiter=None,
+    deadline=None,
+    envelope_records=False,
+    codec=None,
+    compression_threshold=compression.DEFAULT_THRESHOLD,
+    claim_check=None,
+    aggregate=False,
+    wire_format=None,
+    **kwargs,
+):
+    """Put records into a kinesis stream, batched by count and request size.
+
+    Each record is serialized once, then requests are greedily filled up to
+    `batch_size` records and MAX_BATCH_BYTES.
+
+    If `envelope_records` is set, records are first packed into as few envelopes
+    as will fit under MAX_RECORD_BYTES. Only records which share a partition key
+    (and explicit hash key) are packed together.
+
+    If `aggregate` is set, records are aggregated into KPL-compatible records, so
+    consumers using the KCL (or lpipe) can deaggregate them. Aggregated records
+    only count once against the shard's limit of 1000 records per second.
+
+    Args:
+        stream_name (str):
+        records (list):
+        batch_size (int):
+        partition_key (function, optional): called with each record to get its partition key
+        explicit_hash_key (function, optional): called with each record to get its explicit hash key
+        rate_limiter (lpipe.ratelimit.RateLimiter, optional): throttles each request
+        deadline (float, optional): time (per time.monotonic) after which the rate limiter stops waiting
+        envelope_records (bool): pack many records into each kinesis record
+        codec (lpipe.compression.Codec, optional): compress records of at least `compression_threshold` bytes
+        compression_threshold (int):
+        claim_check (lpipe.claimcheck.ClaimCheck, optional): offload records over MAX_RECORD_BYTES to S3
+        aggregate (bool): aggregate many records into each kinesis record, per the KPL aggregation format
+        wire_format (lpipe.wire.WireFormat, optional): Defaults to JSON.
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: if any record exceeds MAX_RECORD_BYTES (and there's no claim_check)
+    """
+    assert batch_size <= MAX_BATCH_SIZE  # put_records will fail otherwise
+    keyed = [
+        (
+            partition_key(record) if partition_key else None,
+            explicit_hash_key(record) if explicit_hash_key else None,
+            record,
+        )
+        for record in records
+    ]
+    if envelope_records:
+        keyed = pack_by_key(
+            keyed, wire_format=wire_format, keep_oversized=claim_check is not None
+        )
+    entries = [
+        build(
+            record,
+            partition_key=pk,
+            explicit_hash_key=ehk,
+            codec=codec,
+            compression_threshold=compression_threshold,
+            wire_format=wire_format,
+        )
+        for pk, ehk, record in keyed
+    ]
+    if aggregate:
+        entries = aggregate_entries(
+            entries, by_key=partition_key is not None or explicit_hash_key is not None
+        )
+    if claim_check:
+        entries = [
+            (
+                e
+                if record_size(e) <= MAX_RECORD_BYTES
+                else build(
+                    claim_check.offload(e["Data"]),
+                    partition_key=e["PartitionKey"],
+                    explicit_hash_key=e.get("ExplicitHashKey"),
+                )
+            )
+            for e in entries
+        ]
+    utils.check_sizes(entries, MAX_RECORD_BYTES, size=record_size)
     client = lpipe.contrib.boto3.client("kinesis")
     responses = []
-    for b in utils.batch(records, batch_size):
-        responses.append(
-            utils.call(
-                client.put_records,
-                StreamName=stream_name,
-                Records=[build(record) for record in b],
+    for b in utils.batch_by_size(
+        entries, batch_size, MAX_BATCH_BYTES, size=record_size
+    ):
+        if rate_limiter:
+            rate_limiter.acquire(
+                len(b), sum([record_size(r) for r in b]), deadline=deadline
             )
+        responses.append(
+            utils.call(client.put_records, StreamName=stream_name, Records=b)
         )
     return tuple(responses)
 
 
+def aggregate_entries(entries, by_key=True):
+    """Aggregate built records into as few KPL aggregated records as possible.
+
+    Args:
+        entries (list): built records
+        by_key (bool): only aggregate records which share a partition key and
+            explicit hash key. Otherwise, every record is aggregated together, since
+            their keys were arbitrary anyway, and each aggregated record is keyed by
+            a hash of its contents so they still spread across shards.
+    """
+    groups = {}
+    for e in entries:
+        key = (e["PartitionKey"], e.get("ExplicitHashKey")) if by_key else None
+        groups.setdefault(key, []).append(e)
+    aggregated = []
+    for key, group in groups.items():
+        # Only the length of the key matters until the records are aggregated.
+        pk, ehk = key if by_key else (utils.hash(b""), None)
+        max_bytes = MAX_RECORD_BYTES - len(pk.encode("utf-8")) - kpl.overhead(pk, ehk)
+        data = [(e, _bytes(e["Data"])) for e in group]
+
+        def size(item):
+            return kpl.record_size(item[1], ehk=bool(ehk))
+
+        # Records too large to aggregate are left as they are (e.g. for a claim check).
+        aggregated.extend([e for e, d in data if size((e, d)) > max_bytes])
+        data = [item for item in data if size(item) <= max_bytes]
+        for b in utils.batch_by_size(data, len(data), max_bytes, size=size):
+            if len(b) == 1:
+                aggregated.append(b[0][0])
+                continue
+            if not by_key:
+                pk = utils.hash(b"".join([d for _, d in b]))
+            record = {
+                "Data": kpl.aggregate([d for _, d in b], pk, ehk),
+                "PartitionKey": pk,
+            }
+            if ehk:
+                record["ExplicitHashKey"] = ehk
+            aggregated.append(record)
+    return aggregated
+
+
+def _bytes(data):
+    return data if isinstance(data, bytes) else data.encode("utf-8")
+
+
+def pack_by_key(keyed, wire_format=None, keep_oversized=False):
+    """Pack (partition_key, explicit_hash_key, record) tuples into envelopes by key.
+
+    See envelope.pack.
+    """
+    groups = {}
+    for pk, ehk, record in keyed:
+        groups.setdefault((pk, ehk), []).append(record)
+    # Leave room for the partition key, which counts against the record's size.
+    max_bytes = MAX_RECORD_BYTES - MAX_PARTITION_KEY_BYTES
+    return [
+        (pk, ehk, e)
+        for (pk, ehk), group in groups.items()
+        for e in envelope.pack(
+            group, max_bytes, wire_format=wire_format, keep_oversized=keep_oversized
+        )
+    ]
+
+
 def put_record(stream_name, data, **kwargs):
-    return batch_put_records(stream_name=stream_name, records=[data])
+    return batch_put_records(stream_name=stream_name, records=[data], **kwargs)
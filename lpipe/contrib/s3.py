@@ -0,0 +1,233 @@
+import collections
+import csv
+import datetime
+import itertools
+import json
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+
+import botocore
+from decouple import config
+
+import lpipe.contrib.boto3
+import lpipe.exceptions
+from lpipe import compression, utils, wire
+
+EXTENSIONS = {compression.Codec.GZIP: ".gz", compression.Codec.ZSTD: ".zst"}
+
+# Objects are read this many bytes at a time, so memory use doesn't grow with their size.
+DEFAULT_CHUNK_BYTES = 8 * 1024 * 1024
+
+
+def put_object(bucket, key, body, **kwargs):
+    return utils.call(
+        lpipe.contrib.boto3.client("s3").put_object,
+        Bucket=bucket,
+        Key=key,
+        Body=body,
+        **kwargs,
+    )
+
+
+def get_object(bucket, key) -> bytes:
+    return utils.call(
+        lpipe.contrib.boto3.client("s3").get_object, Bucket=bucket, Key=key
+    )["Body"].read()
+
+
+def build(records: list) -> bytes:
+    """Serialize records as newline-delimited JSON."""
+    return "".join([wire.dumps(r) + "\n" for r in records]).encode("utf-8")
+
+
+def object_key(prefix: str, body: bytes, context=None, now=None, codec=None) -> str:
+    """Name the object written for an invocation.
+
+    Keys look like `{prefix}{function name}/YYYY/MM/DD/HHMMSSZ-{request id}.jsonl.gz`,
+    so objects sort by time. Without a lambda context the request id is the body's hash,
+    so rewriting the same records replaces the same object.
+
+    Args:
+        prefix (str):
+        body (bytes): the object's (uncompressed) content
+        context: https://docs.aws.amazon.com/lambda/latest/dg/python-context.html
+        now (datetime.datetime, optional): defaults to the current time (UTC)
+        codec (Codec, optional):
+    """
+    function_name = getattr(
+        context, "function_name", config("FUNCTION_NAME", default="lpipe")
+    )
+    request_id = getattr(context, "aws_request_id", None) or utils.hash(body)
+    now = now or datetime.datetime.now(datetime.timezone.utc)
+    return (
+        f"{prefix}{function_name}/{now:%Y/%m/%d/%H%M%SZ}-{request_id}.jsonl"
+        f"{EXTENSIONS.get(codec, '')}"
+    )
+
+
+def batch_put_records(
+    bucket,
+    records,
+    prefix="",
+    codec=compression.Codec.GZIP,
+    context=None,
+    now=None,
+    **kwargs,
+):
+    """Write records to a single (compressed) JSONL object.
+
+    Args:
+        bucket (str):
+        records (list):
+        prefix (str): prefix for the object's key
+        codec (Codec, optional): Defaults to Codec.GZIP. None writes plain JSONL.
+        context: the lambda context, used to name the object. See object_key.
+        now (datetime.datetime, optional): used to name the object. See object_key.
+
+    Returns:
+        The put_object response, or None if there were no records.
+    """
+    if not records:
+        return None
+    body = build(records)
+    key = object_key(prefix, body, context=context, now=now, codec=codec)
+    if codec:
+        body = compression.compress(body, codec)
+    return put_object(bucket, key, body, ContentType="application/x-ndjson", **kwargs)
+
+
+def iter_chunks(bucket, key, chunk_size=None, max_workers=None, size=None):
+    """Read an object in order, at most `chunk_size` bytes at a time.
+
+    With `max_workers` > 1, chunks are fetched with concurrent byte-range requests.
+    At most `max_workers` chunks are held in memory at once.
+
+    Args:
+        bucket (str):
+        key (str):
+        chunk_size (int, optional): Defaults to S3_READ_CHUNK_BYTES, or 8 MiB.
+        max_workers (int, optional): Defaults to S3_READ_WORKERS, or 1.
+        size (int, optional): the object's size, if known. Saves a head_object request.
+    """
+    chunk_size = chunk_size or config(
+        "S3_READ_CHUNK_BYTES", cast=int, default=DEFAULT_CHUNK_BYTES
+    )
+    max_workers = max_workers or config("S3_READ_WORKERS", cast=int, default=1)
+    client = lpipe.contrib.boto3.client("s3")
+    if max_workers <= 1:
+        body = utils.call(client.get_object, Bucket=bucket, Key=key)["Body"]
+        yield from body.iter_chunks(chunk_size)
+        return
+
+    if size is None:
+        size = utils.call(client.head_object, Bucket=bucket, Key=key)["ContentLength"]
+
+    def fetch(start):
+        end = min(start + chunk_size, size) - 1
+        return utils.call(
+            client.get_object, Bucket=bucket, Key=key, Range=f"bytes={start}-{end}"
+        )["Body"].read()
+
+    starts = iter(range(0, size, chunk_size))
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        pending = collections.deque(
+            [executor.submit(fetch, s) for s in itertools.islice(starts, max_workers)]
+        )
+        while pending:
+            chunk = pending.popleft().result()
+            start = next(starts, None)
+            if start is not None:
+                pending.append(executor.submit(fetch, start))
+            yield chunk
+
+
+def gunzip(chunks, chunk_size=DEFAULT_CHUNK_BYTES):
+    """Decompress a stream of gzip chunks (including concatenated gzip members)."""
+    d = zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+    for data in chunks:
+        while data:
+            # Limit the output, so a highly compressed chunk can't balloon in memory.
+            yield d.decompress(data, chunk_size)
+            if d.eof:
+                data, d = d.unused_data, zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+            else:
+                data = d.unconsumed_tail
+    yield d.flush()
+
+
+def iter_lines(chunks):
+    """Split a stream of chunks into lines, keeping their line endings."""
+    buf = b""
+    for chunk in chunks:
+        lines = (buf + chunk).split(b"\n")
+        buf = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if buf:
+        yield buf
+
+
+def _csv_rows(lines):
+    # Undecodable bytes are kept as surrogates, so one bad row doesn't stop the reader.
+    rows = csv.DictReader(line.decode("utf-8", "surrogateescape") for line in lines)
+    for row in rows:
+        data = json.dumps(row, ensure_ascii=False)
+        try:
+            data.encode("utf-8")
+        except UnicodeEncodeError:
+            # Yielded as the bytes it was read from, so it fails to decode on its own.
+            yield data.encode("utf-8", "surrogateescape")
+            continue
+        yield row
+
+
+def stream_records(bucket, key, chunk_size=None, max_workers=None, size=None):
+    """Stream the records in a (gzipped) JSONL or CSV object, without reading it all into memory.
+
+    CSV objects (named `*.csv` or `*.csv.gz`) yield a dict per row, keyed by the header.
+    Anything else is read as JSONL, and yields each non-blank line as bytes, so
+    each line is decoded (and may fail) on its own. Gzipped objects are detected by
+    their magic number.
+
+    Args:
+        bucket (str):
+        key (str):
+        chunk_size (int, optional): See iter_chunks.
+        max_workers (int, optional): See iter_chunks.
+        size (int, optional): See iter_chunks.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the object is missing or corrupt
+        lpipe.exceptions.FailCatastrophically: if the object couldn't be read
+    """
+    try:
+        chunks = iter_chunks(
+            bucket, key, chunk_size=chunk_size, max_workers=max_workers, size=size
+        )
+        first = next(chunks, b"")
+        chunks = itertools.chain([first], chunks)
+        if first.startswith(compression.MAGIC[compression.Codec.GZIP]):
+            chunks = gunzip(chunks, chunk_size or DEFAULT_CHUNK_BYTES)
+        lines = iter_lines(chunks)
+        name = key[: -len(".gz")] if key.endswith(".gz") else key
+        if name.lower().endswith(".csv"):
+            yield from _csv_rows(lines)
+        else:
+            yield from (line for line in lines if line.strip())
+    except botocore.exceptions.ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            raise lpipe.exceptions.InvalidPayloadError(
+                f"s3://{bucket}/{key} no longer exists."
+            ) from e
+        # e.g. access denied or throttled; the object is still there, so retry it.
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Failed to read s3://{bucket}/{key}"
+        ) from e
+    except botocore.exceptions.BotoCoreError as e:
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Failed to read s3://{bucket}/{key}"
+        ) from e
+    except zlib.error as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"s3://{bucket}/{key} is not valid gzip. {e}"
+        ) from e
@@ -0,0 +1,176 @@
+import json
+import logging
+from functools import wraps
+
+import botocore
+from decouple import config
+
+import lpipe.contrib.boto3
+import lpipe.exceptions
+from lpipe import utils
+from lpipe.contrib.sqs import unique_ids
+from lpipe.retry import Retry
+
+MAX_BATCH_SIZE = 10  # messages per publish_batch request
+MAX_BATCH_BYTES = 256 * 1024  # total of all messages and their attributes, per request
+
+
+def build_attributes(attributes: dict) -> dict:
+    """Convert a dict of python values to SNS message attributes.
+
+    Strings, numbers, lists, and bytes become String, Number, String.Array, and
+    Binary attributes respectively.
+    """
+    built = {}
+    for k, v in (attributes or {}).items():
+        if v is None:
+            continue
+        if isinstance(v, bytes):
+            built[k] = {"DataType": "Binary", "BinaryValue": v}
+        elif isinstance(v, bool):
+            built[k] = {"DataType": "String", "StringValue": str(v).lower()}
+        elif isinstance(v, (int, float)):
+            built[k] = {"DataType": "Number", "StringValue": str(v)}
+        elif isinstance(v, (list, tuple)):
+            built[k] = {"DataType": "String.Array", "StringValue": json.dumps(v)}
+        else:
+            built[k] = {"DataType": "String", "StringValue": str(v)}
+    return built
+
+
+def build(message_data, message_group_id=None, message_attributes=None):
+    """Serialize a message for publish_batch.
+
+    Args:
+        message_data (dict):
+        message_group_id (str, optional): FIFO topics only. Messages are deduplicated by content.
+        message_attributes (dict, optional): python values, see build_attributes
+    """
+    data = json.dumps(message_data, sort_keys=True)
+    msg = {"Id": utils.hash(data), "Message": data}
+    if message_group_id:
+        msg["MessageGroupId"] = str(message_group_id)
+        msg["MessageDeduplicationId"] = utils.hash(data)
+    attributes = build_attributes(message_attributes)
+    if attributes:
+        msg["MessageAttributes"] = attributes
+    return msg
+
+
+def message_size(message):
+    """Size of a built message (and its attributes) as counted against the sns limits."""
+    n = len(message["Message"].encode("utf-8"))
+    for k, v in message.get("MessageAttributes", {}).items():
+        value = v.get("StringValue", v.get("BinaryValue", ""))
+        n += len(k.encode("utf-8")) + len(v["DataType"].encode("utf-8"))
+        n += len(value) if isinstance(value, bytes) else len(value.encode("utf-8"))
+    return n
+
+
+def failed_indexes(response, entries):
+    """Indexes of the entries publish_batch rejected."""
+    failed = set([f["Id"] for f in response.get("Failed", [])])
+    return [i for i, e in enumerate(entries) if e["Id"] in failed]
+
+
+def mock_sns(func):
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        try:
+            return func(*args, **kwargs)
+        except (
+            botocore.exceptions.NoCredentialsError,
+            botocore.exceptions.ClientError,
+            botocore.exceptions.NoRegionError,
+            botocore.exceptions.ParamValidationError,
+        ):
+            if config("MOCK_AWS", default=False):
+                log = kwargs["logger"] if "logger" in kwargs else logging.getLogger()
+                log.debug(
+                    "Mocked SNS",
+                    function=f"{func}",
+                    params={"args": f"{args}", "kwargs": f"{kwargs}"},
+                )
+                return
+            else:
+                raise
+
+    return wrapper
+
+
+@mock_sns
+def batch_publish(
+    topic_arn,
+    messages,
+    batch_size=MAX_BATCH_SIZE,
+    message_group_id=None,
+    message_attributes=None,
+    rate_limiter=None,
+    deadline=None,
+    retry=None,
+    **kwargs,
+):
+    """Publish messages to an sns topic, batched by count and request size.
+
+    Messages which sns rejects individually are republished.
+
+    Args:
+        topic_arn (str):
+        messages (list):
+        batch_size (int):
+        message_group_id (function, optional): called with each message to get its FIFO group id
+        message_attributes (function, optional): called with each message to get its attributes
+        rate_limiter (lpipe.ratelimit.RateLimiter, optional): throttles each request
+        deadline (float, optional): time (per time.monotonic) after which we stop waiting or republishing
+        retry (lpipe.Retry, optional): how to republish rejected messages. Defaults to 3 attempts.
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: if any message exceeds MAX_BATCH_BYTES
+        lpipe.exceptions.FailCatastrophically: if any messages were still rejected after every attempt
+    """
+    assert batch_size <= MAX_BATCH_SIZE  # publish_batch will fail otherwise
+    retry = retry or Retry()
+    entries = [
+        build(
+            message,
+            message_group_id=message_group_id(message) if message_group_id else None,
+            message_attributes=(
+                message_attributes(message) if message_attributes else None
+            ),
+        )
+        for message in messages
+    ]
+    utils.check_sizes(entries, MAX_BATCH_BYTES, size=message_size)
+    client = lpipe.contrib.boto3.client("sns")
+
+    def send(b):
+        return utils.call(
+            client.publish_batch, TopicArn=topic_arn, PublishBatchRequestEntries=b
+        )
+
+    responses, failed = [], []
+    for b in utils.batch_by_size(
+        entries, batch_size, MAX_BATCH_BYTES, size=message_size
+    ):
+        if rate_limiter:
+            rate_limiter.acquire(
+                len(b), sum([message_size(m) for m in b]), deadline=deadline
+            )
+        _responses, _failed = retry.resend(
+            send,
+            unique_ids(b),
+            failed_indexes,
+            deadline=deadline,
+            logger=kwargs.get("logger"),
+        )
+        responses.extend(_responses)
+        failed.extend(_failed)
+    if failed:
+        raise lpipe.exceptions.FailCatastrophically(
+            f"SNS rejected {len(failed)} of {len(entries)} messages published to {topic_arn}."
+        )
+    return tuple(responses)
+
+
+def publish(topic_arn, data, **kwargs):
+    return batch_publish(topic_arn=topic_arn, messages=[data], **kwargs)
@@ -1,4 +1,3 @@
-import json
 import logging
 from functools import wraps
 
@@ -6,18 +5,43 @@ import botocore
 from decouple import config
 
 import lpipe.contrib.boto3
-from lpipe import utils
+from lpipe import compression, envelope, utils, wire
 from lpipe.contrib import mindictive
 
+MAX_BATCH_SIZE = 10  # messages per send_message_batch request
+MAX_BATCH_BYTES = 256 * 1024  # total of all message bodies, per request
 
-def build(message_data, message_group_id=None):
-    data = json.dumps(message_data, sort_keys=True)
-    msg = {"Id": utils.hash(data), "MessageBody": data}
+
+def build(
+    message_data,
+    message_group_id=None,
+    codec=None,
+    compression_threshold=compression.DEFAULT_THRESHOLD,
+    wire_format=None,
+):
+    data = wire.dumps(message_data, wire_format)
+    msg = {
+        "Id": utils.hash(data),
+        "MessageBody": compression.compress_text(data, codec, compression_threshold),
+    }
     if message_group_id:
         msg["MessageGroupId"] = str(message_group_id)
     return msg
 
 
+def message_size(message):
+    """Size of a built message as counted against the sqs limits."""
+    return len(message["MessageBody"].encode("utf-8"))
+
+
+def unique_ids(messages):
+    """Make message Ids unique within a batch, since identical messages share a hash."""
+    ids = [m["Id"] for m in messages]
+    if len(set(ids)) == len(ids):
+        return messages
+    return [{**m, "Id": f"{m['Id']}-{i}"} for i, m in enumerate(messages)]
+
+
 def mock_sqs(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
@@ -45,18 +69,84 @@ def mock_sqs(func):
 
 @mock_sqs
 def batch_put_messages(
-    queue_url, messages, batch_size=10, message_group_id=None, **kwargs
+    queue_url,
+    messages,
+    batch_size=MAX_BATCH_SIZE,
+    message_group_id=None,
+    rate_limiter=None,
+    deadline=None,
+    envelope_messages=False,
+    codec=None,
+    compression_threshold=compression.DEFAULT_THRESHOLD,
+    claim_check=None,
+    wire_format=None,
+    **kwargs,
 ):
-    """Put messages into a sqs queue, batched by the maximum of 10."""
-    assert batch_size <= 10  # send_message_batch will fail otherwise
+    """Put messages into a sqs queue, batched by count and request size.
+
+    Each message is serialized once, then requests are greedily filled up to
+    `batch_size` messages and MAX_BATCH_BYTES.
+
+    If `envelope_messages` is set, messages are first packed into as few
+    envelopes as will fit under MAX_BATCH_BYTES.
+
+    Args:
+        queue_url (str):
+        messages (list):
+        batch_size (int):
+        message_group_id (str, optional):
+        rate_limiter (lpipe.ratelimit.RateLimiter, optional): throttles each request
+        deadline (float, optional): time (per time.monotonic) after which the rate limiter stops waiting
+        envelope_messages (bool): pack many messages into each sqs message
+        codec (lpipe.compression.Codec, optional): compress messages of at least `compression_threshold` bytes
+        compression_threshold (int):
+        claim_check (lpipe.claimcheck.ClaimCheck, optional): offload messages over MAX_BATCH_BYTES to S3
+        wire_format (lpipe.wire.WireFormat, optional): Defaults to JSON. Binary formats are base64 encoded.
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: if any message exceeds MAX_BATCH_BYTES (and there's no claim_check)
+    """
+    assert batch_size <= MAX_BATCH_SIZE  # send_message_batch will fail otherwise
+    if envelope_messages:
+        messages = envelope.pack(
+            messages,
+            MAX_BATCH_BYTES,
+            wire_format=wire_format,
+            text=True,
+            keep_oversized=claim_check is not None,
+        )
+    entries = [
+        build(
+            message,
+            message_group_id,
+            codec=codec,
+            compression_threshold=compression_threshold,
+            wire_format=wire_format,
+        )
+        for message in messages
+    ]
+    if claim_check:
+        entries = [
+            (
+                m
+                if message_size(m) <= MAX_BATCH_BYTES
+                else build(claim_check.offload(m["MessageBody"]), message_group_id)
+            )
+            for m in entries
+        ]
+    utils.check_sizes(entries, MAX_BATCH_BYTES, size=message_size)
     client = lpipe.contrib.boto3.client("sqs")
     responses = []
-    for b in utils.batch(messages, batch_size):
+    for b in utils.batch_by_size(
+        entries, batch_size, MAX_BATCH_BYTES, size=message_size
+    ):
+        if rate_limiter:
+            rate_limiter.acquire(
+                len(b), sum([message_size(m) for m in b]), deadline=deadline
+            )
         responses.append(
             utils.call(
-                client.send_message_batch,
-                QueueUrl=queue_url,
-                Entries=[build(message, message_group_id) for message in b],
+                client.send_message_batch, QueueUrl=queue_url, Entries=unique_ids(b)
             )
         )
     return tuple(responses)
@@ -64,7 +154,10 @@ def batch_put_messages(
 
 def put_message(queue_url, data, message_group_id=None, **kwargs):
     return batch_put_messages(
-        queue_url=queue_url, messages=[data], message_group_id=message_group_id
+        queue_url=queue_url,
+        messages=[data],
+        message_group_id=message_group_id,
+        **kwargs,
     )
 
 
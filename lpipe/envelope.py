@@ -0,0 +1,95 @@
+import itertools
+import json
+from collections.abc import Iterator
+
+import lpipe.exceptions
+from lpipe import compression, utils, wire
+
+# A record is an envelope if it is a dict with this as its only key.
+KEY = "__lpipe_envelope__"
+
+# Size of an empty envelope, once serialized.
+OVERHEAD = len(json.dumps({KEY: []}))
+
+
+def item_size(data) -> int:
+    """Size a serialized record adds to an envelope, including its separator."""
+    if isinstance(data, bytes):
+        # msgpack arrays are just their items concatenated, without the wire magic.
+        return len(data) - len(wire.MSGPACK_MAGIC)
+    return len(data.encode("utf-8")) + 2
+
+
+def overhead(wire_format: wire.WireFormat = None) -> int:
+    """Size of an empty envelope, once serialized."""
+    if wire_format == wire.WireFormat.MSGPACK:
+        # An array's header grows from 1 to at most 5 bytes with its length.
+        return len(wire.dumps({KEY: []}, wire_format)) + 4
+    return OVERHEAD
+
+
+def pack(
+    records: list,
+    max_bytes: int,
+    wire_format: wire.WireFormat = None,
+    text: bool = False,
+    keep_oversized: bool = False,
+) -> list:
+    """Pack records into as few envelopes as possible.
+
+    Records are kept in order. Each envelope serializes (per `wire.dumps(envelope,
+    wire_format)`) to no more than `max_bytes`.
+
+    Args:
+        records (list):
+        max_bytes (int): maximum size of a serialized envelope
+        wire_format (lpipe.wire.WireFormat, optional): Defaults to JSON.
+        text (bool): binary wire formats will be sent base64 encoded (per
+            compression.to_text), which has to fit in `max_bytes` too
+        keep_oversized (bool): return records which can't fit in an envelope on their
+            own as they are, in place, e.g. so they can be claim checked
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: if any record can't fit in an envelope on its own (unless keep_oversized)
+    """
+    serialized = [wire.dumps(r, wire_format) for r in records]
+    if text and wire_format == wire.WireFormat.MSGPACK:
+        max_bytes = (max_bytes - len(compression.TEXT_PREFIX)) // 4 * 3
+    max_bytes -= overhead(wire_format)
+    if not keep_oversized:
+        utils.check_sizes(serialized, max_bytes, size=item_size)
+    packed = []
+    items = zip(records, serialized)
+    for fits, group in itertools.groupby(
+        items, key=lambda item: item_size(item[1]) <= max_bytes
+    ):
+        group = list(group)
+        if not fits:
+            packed.extend([r for r, _ in group])
+            continue
+        i = 0
+        for b in utils.batch_by_size(
+            [d for _, d in group], len(group), max_bytes, size=item_size
+        ):
+            packed.append({KEY: [r for r, _ in group[i : i + len(b)]]})
+            i += len(b)
+    return packed
+
+
+def unpack(record) -> list:
+    """Get the records packed into an envelope.
+
+    Returns:
+        list: the packed records, or None if `record` is not an envelope. Envelopes
+            built by lpipe (e.g. for S3 objects) may hold an iterator instead.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the envelope is malformed
+    """
+    if isinstance(record, dict) and len(record) == 1 and KEY in record:
+        if not isinstance(record[KEY], (list, Iterator)):
+            raise lpipe.exceptions.InvalidPayloadError(
+                f"Envelope should contain a list of records: {record}"
+            )
+        return record[KEY]
+    return None
@@ -24,6 +24,14 @@ class InvalidPayloadError(FailButContinue):
     pass
 
 
+class RecordTooLargeError(InvalidPayloadError):
+    pass
+
+
+class GraphLimitError(FailButContinue):
+    pass
+
+
 # TESTING
 class TestingException(Exception):
     pass
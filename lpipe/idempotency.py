@@ -0,0 +1,147 @@
+import json
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+
+import lpipe.contrib.boto3
+from lpipe import utils
+
+
+class Store(ABC):
+    """Remembers which records were completed, and what they returned.
+
+    Subclass this, implementing get and put, to keep completed records somewhere else.
+    """
+
+    @abstractmethod
+    def get(self, key: str) -> dict:
+        """Get a completed record.
+
+        Returns:
+            dict: {"result": Any} if the record was completed, otherwise None
+        """
+
+    @abstractmethod
+    def put(self, key: str, result):
+        """Mark a record as completed."""
+
+
+class MemoryStore(Store):
+    """An LRU cache of completed records.
+
+    Define this at module level so it survives warm invocations of your lambda.
+
+    Args:
+        maxsize (int): number of records to remember
+        ttl (float): seconds to remember a record for
+        clock (function): returns the current time in seconds
+    """
+
+    def __init__(self, maxsize: int = 4096, ttl: float = 3600, clock=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._items = OrderedDict()
+        # Kafka partitions may be handled concurrently.
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> dict:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expiration, result = item
+            if expiration <= self.clock():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return {"result": result}
+
+    def put(self, key: str, result):
+        with self._lock:
+            self._items[key] = (self.clock() + self.ttl, result)
+            self._items.move_to_end(key)
+            while len(self._items) > self.maxsize:
+                self._items.popitem(last=False)
+
+
+class DynamoDBStore(Store):
+    """Completed records kept in a DynamoDB table.
+
+    The table's partition key must be a string attribute named `key_attribute`. Set
+    `expiration_attribute` as the table's TTL attribute to have DynamoDB clean up
+    old records.
+
+    Args:
+        table_name (str):
+        ttl (float): seconds to remember a record for
+        key_attribute (str):
+        expiration_attribute (str):
+    """
+
+    def __init__(
+        self,
+        table_name: str,
+        ttl: float = 86400,
+        key_attribute: str = "id",
+        expiration_attribute: str = "expiration",
+    ):
+        self.table_name = table_name
+        self.ttl = ttl
+        self.key_attribute = key_attribute
+        self.expiration_attribute = expiration_attribute
+
+    def get(self, key: str) -> dict:
+        item = utils.call(
+            lpipe.contrib.boto3.client("dynamodb").get_item,
+            TableName=self.table_name,
+            Key={self.key_attribute: {"S": key}},
+            ConsistentRead=True,
+        ).get("Item")
+        if not item:
+            return None
+        # DynamoDB may take a while to delete expired items.
+        if int(item[self.expiration_attribute]["N"]) <= time.time():
+            return None
+        result = item.get("result", {}).get("S")
+        return {"result": json.loads(result) if result is not None else None}
+
+    def put(self, key: str, result):
+        item = {
+            self.key_attribute: {"S": key},
+            self.expiration_attribute: {"N": str(int(time.time() + self.ttl))},
+        }
+        try:
+            item["result"] = {"S": json.dumps(result, cls=utils.AutoEncoder)}
+        except TypeError:
+            # The record is still complete, we just can't replay its result.
+            pass
+        utils.call(
+            lpipe.contrib.boto3.client("dynamodb").put_item,
+            TableName=self.table_name,
+            Item=item,
+        )
+
+
+def get_key(payload, identifier: str = None, selector=None) -> str:
+    """Get the idempotency key for a record.
+
+    Args:
+        payload (Payload): the record's parsed payload
+        identifier (str, optional): the record's message ID / sequence number
+        selector (optional): a selector (see Queue.partition_key) for the kwargs which identify the record
+
+    Returns:
+        str: the selected kwargs and path, hashed, if a selector was set. Otherwise the identifier, or a hash of the whole payload.
+    """
+    if identifier is not None and selector is None:
+        if payload.event_source:
+            return f"{payload.event_source}:{identifier}"
+        return identifier
+    path = str(payload.path).split(".")[-1]
+    if selector is not None:
+        data = {"path": path, "key": utils.select(selector, payload.kwargs, "key")}
+    else:
+        data = {"path": path, "kwargs": payload.kwargs}
+    return utils.hash(json.dumps(data, sort_keys=True, cls=utils.AutoEncoder))
@@ -0,0 +1,145 @@
+"""Kinesis Producer Library (KPL) record aggregation.
+
+An aggregated record is the KPL magic number, followed by an `AggregatedRecord`
+protobuf message, followed by the MD5 digest of that message.
+
+https://github.com/awslabs/amazon-kinesis-producer/blob/master/aggregation-format.md
+"""
+
+import hashlib
+from typing import List, NamedTuple, Tuple
+
+import lpipe.exceptions
+from lpipe import utils
+
+MAGIC = b"\xf3\x89\x9a\xc2"
+DIGEST_BYTES = 16
+
+# Protobuf wire types
+VARINT = 0
+LENGTH_DELIMITED = 2
+
+
+class UserRecord(NamedTuple):
+    partition_key: str
+    explicit_hash_key: str
+    data: bytes
+
+
+def _varint(n: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = n & 0x7F
+        n >>= 7
+        if n:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, wire_type: int, value) -> bytes:
+    key = _varint((number << 3) | wire_type)
+    if wire_type == VARINT:
+        return key + _varint(value)
+    return key + _varint(len(value)) + value
+
+
+def _read_varint(buf: bytes, pos: int) -> Tuple[int, int]:
+    n, shift = 0, 0
+    while True:
+        byte = buf[pos]
+        pos += 1
+        n |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return n, pos
+        shift += 7
+
+
+def _read_fields(buf: bytes):
+    """Yield (field number, value) for each field in a protobuf message."""
+    pos = 0
+    while pos < len(buf):
+        key, pos = _read_varint(buf, pos)
+        number, wire_type = key >> 3, key & 0x7
+        if wire_type == VARINT:
+            value, pos = _read_varint(buf, pos)
+        elif wire_type == LENGTH_DELIMITED:
+            length, pos = _read_varint(buf, pos)
+            value, pos = buf[pos : pos + length], pos + length
+        else:
+            raise ValueError(f"Unsupported protobuf wire type {wire_type}")
+        yield number, value
+
+
+def _record(data: bytes, ehk_index: int = None) -> bytes:
+    # Every record in an aggregate built by lpipe shares partition key 0.
+    msg = _field(1, VARINT, 0)
+    if ehk_index is not None:
+        msg += _field(2, VARINT, ehk_index)
+    return msg + _field(3, LENGTH_DELIMITED, data)
+
+
+def record_size(data: bytes, ehk: bool = False) -> int:
+    """Bytes a user record adds to an aggregated record."""
+    msg = len(_record(data, 0 if ehk else None))
+    return 1 + len(_varint(msg)) + msg
+
+
+def overhead(partition_key: str, explicit_hash_key: str = None) -> int:
+    """Bytes an aggregated record takes, before any user records are added."""
+    n = len(MAGIC) + DIGEST_BYTES
+    n += len(_field(1, LENGTH_DELIMITED, partition_key.encode("utf-8")))
+    if explicit_hash_key:
+        n += len(_field(2, LENGTH_DELIMITED, explicit_hash_key.encode("utf-8")))
+    return n
+
+
+def aggregate(
+    data: List[bytes], partition_key: str, explicit_hash_key: str = None
+) -> bytes:
+    """Aggregate user records which share a partition key (and explicit hash key)."""
+    msg = _field(1, LENGTH_DELIMITED, partition_key.encode("utf-8"))
+    if explicit_hash_key:
+        msg += _field(2, LENGTH_DELIMITED, explicit_hash_key.encode("utf-8"))
+    for d in data:
+        msg += _field(3, LENGTH_DELIMITED, _record(d, 0 if explicit_hash_key else None))
+    return MAGIC + msg + hashlib.md5(msg).digest()  # nosec
+
+
+def is_aggregated(data: bytes) -> bool:
+    return data.startswith(MAGIC) and len(data) >= len(MAGIC) + DIGEST_BYTES
+
+
+def deaggregate(data: bytes) -> List[UserRecord]:
+    """Expand an aggregated record into its user records.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the record is corrupt
+    """
+    msg, digest = data[len(MAGIC) : -DIGEST_BYTES], data[-DIGEST_BYTES:]
+    if hashlib.md5(msg).digest() != digest:  # nosec
+        raise lpipe.exceptions.InvalidPayloadError(
+            "Aggregated record failed its checksum."
+        )
+    try:
+        pks, ehks, records = [], [], []
+        for number, value in _read_fields(msg):
+            if number == 1:
+                pks.append(value.decode("utf-8"))
+            elif number == 2:
+                ehks.append(value.decode("utf-8"))
+            elif number == 3:
+                records.append(dict(_read_fields(value)))
+        return [
+            UserRecord(
+                partition_key=pks[r.get(1, 0)],
+                explicit_hash_key=ehks[r[2]] if 2 in r else None,
+                data=r.get(3, b""),
+            )
+            for r in records
+        ]
+    except (IndexError, ValueError) as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Failed to deaggregate record. {utils.exception_to_str(e)}"
+        ) from e
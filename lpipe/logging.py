@@ -1,4 +1,5 @@
 import logging
+import threading
 import time
 from contextlib import ContextDecorator
 
@@ -21,6 +22,8 @@ class LPLogger:
                 structlog.dev.ConsoleRenderer(),
             ]
         )
+        self._owner = threading.current_thread()
+        self._local = threading.local()
         self._logger = wrap_logger(
             structlog.get_logger(),
             processors=[TimeStamper(fmt="iso"), JSONRenderer(sort_keys=True)],
@@ -33,6 +36,22 @@ class LPLogger:
     def _json(self):
         return utils.repr(self)
 
+    @property
+    def _logger(self):
+        """The bound structlog logger.
+
+        Other threads (e.g. concurrent branches) start from the creating thread's
+        bindings, but bind and unbind without affecting it or each other.
+        """
+        return getattr(self._local, "logger", None) or self._shared
+
+    @_logger.setter
+    def _logger(self, value):
+        if threading.current_thread() is self._owner:
+            self._shared = value
+        else:
+            self._local.logger = value
+
     def bind(self, **kwargs):
         """Bind context data to logger by forwarding to structlog.
 
@@ -11,6 +11,7 @@ class Payload:
         path: Union[Enum, str] = None,
         queue: queue.Queue = None,
         event_source=None,
+        metadata: dict = None,
     ):
         try:
             assert bool(path) != bool(queue)
@@ -20,6 +21,8 @@ class Payload:
         self.queue = queue
         self.kwargs = kwargs
         self.event_source = event_source
+        # Details of the record this payload was read from, e.g. a kafka record's key and headers.
+        self.metadata = metadata
 
     def validate(self, path_enum: EnumMeta = None):
         if self.path and path_enum:
@@ -1,18 +1,42 @@
 import base64
 import json
+import time
+import urllib.parse
 import warnings
 from collections import defaultdict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
 from enum import Enum, EnumMeta
+from functools import partial
 from types import FunctionType
-from typing import Any, Generator, NamedTuple, Tuple, Union
+from typing import Any, Generator, List, NamedTuple, Tuple, Union
 
 import lpipe.exceptions
 import lpipe.logging
-from lpipe import normalize, signature, utils
+from lpipe import (
+    claimcheck,
+    compression,
+    envelope,
+    idempotency,
+    kpl,
+    normalize,
+    signature,
+    utils,
+    wire,
+)
 from lpipe.action import Action
-from lpipe.contrib import kinesis, mindictive, sqs
+from lpipe.contrib import (
+    dynamodb,
+    eventbridge,
+    firehose,
+    kinesis,
+    mindictive,
+    s3,
+    sns,
+    sqs,
+)
 from lpipe.payload import Payload
 from lpipe.queue import Queue, QueueType
+from lpipe.scheduler import Branches, Scheduler
 
 RESERVED_KEYWORDS = set(["logger", "state", "payload"])
 
@@ -21,6 +45,13 @@ class EventSourceType(Enum):
     RAW = 1  # This may be a Cloudwatch or manually triggered event
     KINESIS = 2
     SQS = 3
+    DYNAMODB = 4
+    S3 = 5
+    FIREHOSE = 6  # Data transformation
+    SNS = 7
+    EVENTBRIDGE = 8
+    KAFKA = 9  # MSK or self-managed
+    AUTO = 10  # Detected from the event's shape. See detect_event_source_type.
 
 
 class State(NamedTuple):
@@ -34,6 +65,11 @@ class State(NamedTuple):
         logger:
         exception_handler (FunctionType): A function which will be used to capture exceptions (e.g. contrib.sentry.capture)
         debug (bool):
+        deadline (float): time (per time.monotonic) by which this invocation should finish, if known
+        scheduler (Scheduler): runs chained Paths and returned Payloads
+        local_queues (frozenset): keys of the queues consumed by this lambda
+        outbox (dict): records buffered for enveloped (and S3) queues, by Queue.key
+        completed (dict): results of records completed this invocation, by idempotency key
     """
 
     event: Any
@@ -43,13 +79,24 @@ class State(NamedTuple):
     logger: Any
     debug: bool = False
     exception_handler: FunctionType = None
+    deadline: float = None
+    scheduler: Scheduler = None
+    local_queues: frozenset = frozenset()
+    outbox: dict = None
+    completed: dict = None
 
 
-def build_event_response(n_records, n_ok, logger) -> dict:
+def build_event_response(
+    n_records, n_ok, logger, n_unstarted=0, n_dead_letters=0
+) -> dict:
     response = {
         "event": "Finished.",
         "stats": {"received": n_records, "successes": n_ok},
     }
+    if n_unstarted:
+        response["stats"]["unstarted"] = n_unstarted
+    if n_dead_letters:
+        response["stats"]["dead_letters"] = n_dead_letters
     if hasattr(logger, "events") and logger.events:
         response["logs"] = json.dumps(logger.events, cls=utils.AutoEncoder)
     return response
@@ -63,7 +110,11 @@ def log_exception(state: State, e: BaseException):
 
 def parse_event(
     event: Any, event_source_type: EventSourceType
-) -> Generator[Tuple[Any, dict, str], None, None]:
+) -> Generator[Tuple[Any, str], None, None]:
+    """Yield each record of an event, with its event source.
+
+    Records are decoded by handle_record, so one bad record doesn't fail the batch.
+    """
     try:
         records = get_records_from_event(event_source_type, event)
         assert isinstance(records, list)
@@ -72,23 +123,21 @@ def parse_event(
             f"Failed to extract records from event: {event}"
         ) from e
     for record in records:
-        try:
-            yield (
-                record,
-                get_payload_from_record(event_source_type, record),
-                get_event_source(event_source_type, record),
-            )
-        except TypeError as e:
-            raise lpipe.exceptions.InvalidPayloadError(
-                f"Bad record provided for event source type {event_source_type}. {record} {utils.exception_to_str(e)}"
-            ) from e
+        yield record, get_event_source(event_source_type, record)
 
 
 def parse_record(
-    state: State, record: Any, event_source: str, default_path: Union[str, Enum] = None
+    state: State,
+    record: Any,
+    event_source: str,
+    default_path: Union[str, Enum] = None,
+    metadata: dict = None,
 ) -> Payload:
     try:
-        kwargs = {"event_source": event_source}
+        if isinstance(record, bytes):
+            # A line streamed from an S3 object. Decoded here so a bad line only poisons itself.
+            record = get_raw_payload(record.decode("utf-8"))
+        kwargs = {"event_source": event_source, "metadata": metadata}
         if not default_path:
             for field in ["path", "kwargs"]:
                 assert field in record
@@ -100,6 +149,14 @@ def parse_record(
         raise lpipe.exceptions.InvalidPayloadError(
             "'path' or 'kwargs' missing from payload."
         ) from e
+    except json.JSONDecodeError as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Payload contained invalid json. {utils.exception_to_str(e)}"
+        ) from e
+    except UnicodeDecodeError as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Payload contained invalid utf-8. {utils.exception_to_str(e)}"
+        ) from e
 
 
 def process_event(
@@ -113,6 +170,13 @@ def process_event(
     logger: Any = None,
     debug: bool = False,
     exception_handler: FunctionType = None,
+    timeout_margin: float = None,
+    idempotency_store: idempotency.Store = None,
+    idempotency_key=None,
+    dlq: Queue = None,
+    scheduler: Scheduler = None,
+    local_queues: List[Queue] = None,
+    partition_workers: int = 1,
 ) -> dict:
     """Process an AWS Lambda event.
 
@@ -127,6 +191,13 @@ def process_event(
         logger:
         debug (bool):
         exception_handler (FunctionType): A function which will be used to capture exceptions (e.g. contrib.sentry.capture)
+        timeout_margin (float): If set, stop starting new records this many seconds before the lambda times out, and report the unstarted records as batch item failures.
+        idempotency_store (idempotency.Store): If set, skip records which were already completed and return their cached results.
+        idempotency_key: A selector (see Queue.partition_key) for the kwargs which identify a record. Defaults to the record's message ID / sequence number.
+        dlq (Queue): If set, records which raise FailButContinue are sent here (with exception details) at the end of the invocation instead of being dropped.
+        scheduler (Scheduler): Controls the order, limits, and concurrency with which chained Paths and returned Payloads are run. Defaults to depth-first.
+        local_queues (List[Queue]): Queues which trigger this lambda. Records sent to these queues are run inline, in this invocation, instead of being published.
+        partition_workers (int): EventSourceType.KAFKA only. Run up to this many topic-partitions concurrently. Each partition's records always run in order.
     """
     logger = lpipe.logging.setup(logger=logger, context=context, debug=debug)
     logger.debug(
@@ -139,6 +210,9 @@ def process_event(
         raise lpipe.exceptions.InvalidConfigurationError(
             f"Invalid event source type '{event_source_type}'"
         ) from e
+    if event_source_type == EventSourceType.AUTO:
+        event_source_type = detect_event_source_type(event)
+        logger.debug(f"Detected event_source_type: {event_source_type}")
 
     if isinstance(call, FunctionType):
         if not paths:
@@ -158,77 +232,495 @@ def process_event(
         paths=paths,
         path_enum=path_enum,
         exception_handler=exception_handler,
+        deadline=utils.get_deadline(context, timeout_margin or 0),
+        scheduler=scheduler or Scheduler(),
+        local_queues=frozenset(q.key for q in local_queues or []),
+        outbox={},
+        completed={},
+    )
+    handle = partial(
+        handle_record,
+        state=state,
+        event_source_type=event_source_type,
+        default_path=default_path,
+        idempotency_store=idempotency_store,
+        idempotency_key=idempotency_key,
+        dlq=dlq,
     )
-    n_records = 0
-    successful_records = []
-    _output = []
-    _exceptions = []
+    outcomes = []
+    unstarted_records = []
+    skipped_records = []
     try:
-        for encoded_record, record, event_source in parse_event(
-            event, event_source_type
-        ):
-            n_records += 1
-            ret = None
-            try:
-                payload = parse_record(
-                    state=state,
-                    record=record,
-                    event_source=event_source,
-                    default_path=default_path,
-                )
-                with logger.context(bind={"payload": payload.to_dict()}):
-                    logger.log("Record received.")
-
-                # Run your path/action/functions against the payload found in this record.
-                ret = execute_payload(payload=payload, state=state)
-
-                # Will handle cleanup for successful records later, if necessary.
-                successful_records.append(encoded_record)
-            except lpipe.exceptions.FailButContinue as e:
-                """Drop poisoned records on the floor
-
-                Captures:
-                    InvalidPayloadError
-                    InvalidPathError
-                """
-                log_exception(state, e)
-                continue
-            except lpipe.exceptions.FailCatastrophically as e:
-                """Preserve poisoned records, trigger redrive
-
-                Captures:
-                    InvalidConfigurationError
-                """
-                log_exception(state, e)
-                _exceptions.append({"exception": e, "record": record})
-            _output.append(ret)
+        parsed = parse_event(event, event_source_type)
+        if event_source_type == EventSourceType.KAFKA:
+            outcomes, unstarted_records, skipped_records = handle_partitions(
+                parsed,
+                handle,
+                stop=lambda: timeout_margin is not None and past_deadline(state),
+                max_workers=partition_workers,
+            )
+        else:
+            for n_started, (encoded_record, event_source) in enumerate(parsed):
+                if timeout_margin is not None and past_deadline(state):
+                    # Let what already ran finish, but don't start anything new.
+                    records = get_records_from_event(event_source_type, event)
+                    unstarted_records = records[n_started:]
+                    break
+                outcomes.append(handle(encoded_record, event_source))
     except AssertionError as e:
         logger.error(f"'records' is not a list {utils.exception_to_str(e)}")
         return build_event_response(0, 0, logger)
+    if unstarted_records:
+        logger.warning(
+            f"Approaching timeout. Stopped before {len(unstarted_records)} unstarted records."
+        )
+    if skipped_records:
+        logger.warning(
+            f"Skipped {len(skipped_records)} records behind a catastrophic failure in their partition."
+        )
+
+    n_records = sum([o.n_records for o in outcomes])
+    n_ok = sum([o.n_ok for o in outcomes])
+    successful_records = [o.encoded_record for o in outcomes if o.ok]
+    dead_letters = [d for o in outcomes for d in o.dead_letters]
+    _output = [r for o in outcomes for r in o.returned]
+    _exceptions = [e for o in outcomes for e in o.exceptions]
+    transformed = [(o.encoded_record, o.result, o.outputs) for o in outcomes]
 
+    if dead_letters:
+        put_dead_letters(dlq, dead_letters, state)
+
+    flush_outbox(state)
+
+    # If sending the dead letters or buffered records failed, the batch is redriven,
+    # so its records mustn't be skipped as already completed.
+    put_completed(idempotency_store, state)
+
+    n_unstarted = len(unstarted_records) + len(skipped_records)
     response = build_event_response(
-        n_records=n_records, n_ok=len(successful_records), logger=logger
+        n_records=n_records + n_unstarted,
+        n_ok=n_ok,
+        logger=logger,
+        n_unstarted=n_unstarted,
+        n_dead_letters=len(dead_letters),
     )
+    if event_source_type == EventSourceType.FIREHOSE:
+        # Firehose needs a result for every record, and retries the whole batch if we raise.
+        transformed.extend(
+            [
+                (r, firehose.TransformationResult.PROCESSING_FAILED, [])
+                for r in unstarted_records
+            ]
+        )
+        response["records"] = firehose.build_transformation_records(transformed)
+    elif unstarted_records and event_source_type != EventSourceType.KAFKA:
+        response["batchItemFailures"] = build_batch_item_failures(
+            event_source_type, unstarted_records, logger
+        )
 
     # Handle cleanup for successful records, if necessary, before creating an error state.
-    if _exceptions:
+    if _exceptions and event_source_type != EventSourceType.FIREHOSE:
         advanced_cleanup(event_source_type, successful_records, logger)
         raise lpipe.exceptions.FailCatastrophically(
             f"Encountered catastrophic exceptions while handling one or more records: {response}"
         )
+    if unstarted_records and event_source_type == EventSourceType.KAFKA:
+        # Kafka event source mappings can't retry part of a batch.
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Stopped before {len(unstarted_records)} unstarted records, retrying the batch: {response}"
+        )
 
-    if any(_output):
+    # Firehose's records already carry their output.
+    if any(_output) and event_source_type != EventSourceType.FIREHOSE:
         response["output"] = _output
     return response
 
 
+class RecordOutcome:
+    """What happened to one record of an event, and each lpipe record packed into it.
+
+    Attributes:
+        encoded_record: the record as it was received
+        n_records (int): lpipe records found in it
+        n_ok (int): lpipe records which succeeded
+        ok (bool): whether every lpipe record succeeded
+        result (firehose.TransformationResult):
+        outputs (list): (input, output) of each successful lpipe record. EventSourceType.FIREHOSE only.
+        returned (list): return values, for the response's output
+        dead_letters (list):
+        exceptions (list): FailCatastrophically exceptions, with the lpipe record which raised them
+    """
+
+    def __init__(self, encoded_record):
+        self.encoded_record = encoded_record
+        self.n_records = 0
+        self.n_ok = 0
+        self.ok = True
+        self.result = firehose.TransformationResult.OK
+        self.outputs = []
+        self.returned = []
+        self.dead_letters = []
+        self.exceptions = []
+
+    def succeeded(self, part, ret, keep_output: bool):
+        self.n_ok += 1
+        self.returned.append(ret)
+        if keep_output:
+            self.outputs.append((part, ret))
+
+
+def handle_record(
+    encoded_record,
+    event_source,
+    state: State,
+    event_source_type: EventSourceType,
+    default_path: Union[str, Enum] = None,
+    idempotency_store: idempotency.Store = None,
+    idempotency_key=None,
+    dlq: Queue = None,
+) -> RecordOutcome:
+    """Run every lpipe record in one record of an event. See process_event."""
+    outcome = RecordOutcome(encoded_record)
+    # Only firehose responses need each record's output; don't hold onto it otherwise.
+    keep_output = event_source_type == EventSourceType.FIREHOSE
+    # Kept as received if it can't be decoded, so a dead letter can still be repaired.
+    record, decoded = encoded_record, False
+    try:
+        record = get_payload_from_record(event_source_type, encoded_record)
+        decoded = True
+        parts = envelope.unpack(record)
+    except lpipe.exceptions.FailButContinue as e:
+        parts, outcome.ok = [], False
+        # Firehose delivers records which can't be decoded to its error output.
+        outcome.result = (
+            firehose.TransformationResult.DROPPED
+            if decoded
+            else firehose.TransformationResult.PROCESSING_FAILED
+        )
+        outcome.n_records += 1
+        log_exception(state, e)
+        if dlq:
+            outcome.dead_letters.append(
+                build_dead_letter(event_source_type, encoded_record, record, e)
+            )
+    except lpipe.exceptions.FailCatastrophically as e:
+        parts, outcome.ok = [], False
+        outcome.result = firehose.TransformationResult.PROCESSING_FAILED
+        outcome.n_records += 1
+        log_exception(state, e)
+        outcome.exceptions.append({"exception": e, "record": record})
+    # An envelope's records are tracked individually.
+    for i, part in enumerate(_guard([record] if parts is None else parts)):
+        outcome.n_records += 1
+        ret = None
+        try:
+            if isinstance(part, _Interrupted):
+                # e.g. the S3 object being streamed couldn't be read.
+                part, e = encoded_record, part.exception
+                raise e
+            payload = parse_record(
+                state=state,
+                record=part,
+                event_source=event_source,
+                default_path=default_path,
+                metadata=get_record_metadata(event_source_type, encoded_record),
+            )
+            with state.logger.context(bind={"payload": payload.to_dict()}):
+                state.logger.log("Record received.")
+
+            if idempotency_store:
+                identifier = get_record_identifier(event_source_type, encoded_record)
+                if parts is not None and identifier is not None:
+                    identifier = f"{identifier}:{i}"
+                key = idempotency.get_key(
+                    payload, identifier=identifier, selector=idempotency_key
+                )
+                completed = (
+                    {"result": state.completed[key]}
+                    if key in state.completed
+                    else get_completed(idempotency_store, key)
+                )
+                if completed:
+                    state.logger.log("Record already completed; skipping.")
+                    outcome.succeeded(part, completed["result"], keep_output)
+                    continue
+
+            # Run your path/action/functions against the payload found in this record.
+            ret = execute_payload(payload=payload, state=state)
+
+            if idempotency_store:
+                # Written to the store once anything it buffered has been sent.
+                state.completed[key] = ret
+
+            outcome.succeeded(part, ret, keep_output)
+        except lpipe.exceptions.FailButContinue as e:
+            """Drop poisoned records on the floor
+
+            Captures:
+                InvalidPayloadError
+                InvalidPathError
+            """
+            outcome.ok = False
+            if outcome.result == firehose.TransformationResult.OK:
+                outcome.result = firehose.TransformationResult.DROPPED
+            log_exception(state, e)
+            if dlq:
+                outcome.dead_letters.append(
+                    build_dead_letter(event_source_type, encoded_record, part, e)
+                )
+        except lpipe.exceptions.FailCatastrophically as e:
+            """Preserve poisoned records, trigger redrive
+
+            Captures:
+                InvalidConfigurationError
+            """
+            outcome.ok = False
+            outcome.result = firehose.TransformationResult.PROCESSING_FAILED
+            log_exception(state, e)
+            outcome.exceptions.append({"exception": e, "record": part})
+            outcome.returned.append(ret)
+    return outcome
+
+
+class _Interrupted:
+    """Marks where an envelope's records stopped, because iterating them raised."""
+
+    def __init__(self, exception: lpipe.exceptions.LPBaseException):
+        self.exception = exception
+
+
+def _guard(parts):
+    """Yield an envelope's records, then an _Interrupted if iterating them raised."""
+    try:
+        yield from parts
+    except lpipe.exceptions.LPBaseException as e:
+        yield _Interrupted(e)
+
+
+def handle_partitions(
+    parsed, handle, stop, max_workers: int = 1
+) -> Tuple[List[RecordOutcome], list, list]:
+    """Run each partition's records in order, and up to `max_workers` partitions at once.
+
+    A partition stops at its first catastrophic failure, so none of its later records
+    run ahead of the failed one when the batch is redriven.
+
+    Args:
+        parsed: (encoded record, event source) for each record, as from parse_event
+        handle (function): called with each of those to run it, returns a RecordOutcome
+        stop (function): returns True once no more records should be started
+        max_workers (int):
+
+    Returns:
+        tuple: the outcome of each record which ran, the records which never started
+            because of `stop`, and those skipped after a failure in their partition
+    """
+    partitions = defaultdict(list)
+    for parsed_record in parsed:
+        partitions[get_partition(parsed_record[0])].append(parsed_record)
+
+    def run(records):
+        outcomes = []
+        for encoded_record, event_source in records:
+            if stop():
+                return outcomes, [r[0] for r in records[len(outcomes) :]], []
+            outcomes.append(handle(encoded_record, event_source))
+            if outcomes[-1].exceptions:
+                return outcomes, [], [r[0] for r in records[len(outcomes) :]]
+        return outcomes, [], []
+
+    if max_workers > 1 and len(partitions) > 1:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(run, partitions.values()))
+    else:
+        results = [run(records) for records in partitions.values()]
+    return (
+        [o for outcomes, _, _ in results for o in outcomes],
+        [r for _, unstarted, _ in results for r in unstarted],
+        [r for _, _, skipped in results for r in skipped],
+    )
+
+
+def build_dead_letter(
+    event_source_type: EventSourceType, encoded_record: Any, record: Any, e: Exception
+) -> dict:
+    """Describe a poisoned record, and why it failed, so it can be replayed later.
+
+    Args:
+        event_source_type (EventSourceType):
+        encoded_record: the record as it was received
+        record: the record's decoded payload
+        e (Exception): the exception raised while handling the record
+    """
+    return {
+        "record": record,
+        "identifier": get_record_identifier(event_source_type, encoded_record),
+        "event_source": get_event_source(event_source_type, encoded_record),
+        "event_source_type": event_source_type.name,
+        "exception": {
+            "type": e.__class__.__name__,
+            "message": str(e),
+            "cause": utils.exception_to_str(e.__cause__) if e.__cause__ else None,
+        },
+    }
+
+
+def put_dead_letters(dlq: Queue, dead_letters: list, state: State):
+    """Send every poisoned record from this invocation to the dead-letter queue in full batches."""
+    if dlq.path:
+        dead_letters = [{"path": dlq.path, "kwargs": d} for d in dead_letters]
+    with state.logger.context(
+        bind={"queue_type": dlq.type, "queue_name": dlq.name or dlq.url}
+    ):
+        state.logger.log(
+            f"Sending {len(dead_letters)} records to the dead-letter queue."
+        )
+    put_records(queue=dlq, records=dead_letters, deadline=state.deadline)
+
+
+def flush_outbox(state: State):
+    """Send the records buffered for enveloped (and S3) queues, in as few messages as possible."""
+    for queue, records in (state.outbox or {}).values():
+        try:
+            put_records(queue, records, deadline=state.deadline, context=state.context)
+        except lpipe.exceptions.LPBaseException:
+            raise
+        except Exception as e:
+            # Every record in the batch may have contributed, so redrive them all.
+            raise lpipe.exceptions.FailCatastrophically(
+                f"Failed to send {len(records)} buffered records to {queue}"
+            ) from e
+
+
+def get_completed(store: idempotency.Store, key: str) -> dict:
+    """Look up a completed record, failing it (for a retry) if the store can't be read."""
+    try:
+        return store.get(key)
+    except lpipe.exceptions.LPBaseException:
+        raise
+    except Exception as e:
+        raise lpipe.exceptions.FailCatastrophically(
+            f"Failed to check {store.__class__.__name__} for a completed record"
+        ) from e
+
+
+def put_completed(store: idempotency.Store, state: State):
+    """Mark this invocation's completed records in the store."""
+    for key, ret in state.completed.items():
+        try:
+            store.put(key, ret)
+        except Exception as e:
+            # The record's already done; redriving it would run it again.
+            state.logger.error(
+                f"Failed to mark a record completed in {store.__class__.__name__}; it may run again if it's redelivered."
+            )
+            log_exception(state, e)
+
+
+def past_deadline(state: State) -> bool:
+    return state.deadline is not None and time.monotonic() >= state.deadline
+
+
+def build_batch_item_failures(
+    event_source_type: EventSourceType, records: list, logger
+) -> list:
+    """Build a partial batch response so only the given records will be retried.
+
+    Requires ReportBatchItemFailures to be enabled on the event source mapping.
+
+    Args:
+        event_source_type (EventSourceType):
+        records (list): records which should be retried
+        logger:
+    """
+    identifiers = [
+        (
+            get_record_identifier(event_source_type, r)
+            if event_source_type in _BATCH_ITEM_FAILURE_SOURCES
+            else None
+        )
+        for r in records
+    ]
+    failures = [{"itemIdentifier": i} for i in identifiers if i is not None]
+    if len(failures) < len(records):
+        logger.error(
+            f"Unable to report {len(records) - len(failures)} {event_source_type} records as batch item failures; they will not be retried."
+        )
+    return failures
+
+
 def execute_payload(payload: Payload, state: State) -> Any:
     """Given a Payload, execute Actions in a Path and fire off messages to the payload's Queues.
 
+    Chained Paths and returned Payloads are run from a work queue by `state.scheduler`.
+
     Args:
         payload (Payload):
         state (State):
     """
+    return run_graph(_execute_payload(payload=payload, state=state), state)
+
+
+def execute_action(payload: Payload, action: Action, state: State) -> Any:
+    """Execute functions, paths, and queues (shortcuts) in an Action.
+
+    Args:
+        payload (Payload):
+        action: (Action):
+        state (State):
+    """
+    return run_graph(
+        _execute_action(payload=payload, action=action, state=state), state
+    )
+
+
+def return_handler(ret: Any, state: State) -> Any:
+    """Execute any Payloads returned by a function."""
+    return run_graph(_return_handler(ret=ret, state=state), state)
+
+
+def run_graph(root, state: State) -> Any:
+    scheduler = state.scheduler or Scheduler()
+    return scheduler.run(
+        root,
+        spawn=lambda p: _execute_payload(payload=p, state=state),
+        on_error=lambda e: _log_skipped(state, e),
+    )
+
+
+def _log_skipped(state: State, e: Exception):
+    state.logger.error(
+        f"Skipped a deferred payload due to unhandled Exception {e.__class__.__name__}."
+    )
+    log_exception(state, e)
+
+
+class _InlinePayload(Payload):
+    """A record sent to one of `state.local_queues`, run rather than published."""
+
+    def __init__(self, kwargs: dict, queue: Queue, event_source=None):
+        super().__init__(kwargs=kwargs, path=queue.path, event_source=event_source)
+        self.local_queue = queue
+
+
+def _execute_payload(payload: Payload, state: State) -> Generator:
+    """Execute a Payload, yielding lists of child Payloads to the scheduler."""
+    if not isinstance(payload, _InlinePayload):
+        return (yield from _run_payload(payload=payload, state=state))
+    try:
+        return (yield from _run_payload(payload=payload, state=state))
+    except Exception as e:
+        # Don't fail the current record for the downstream one; publish it instead,
+        # where it gets the queue's own retries and dead-letter handling.
+        state.logger.warning(
+            f"Failed to run record inline due to {e.__class__.__name__}, publishing it."
+        )
+        log_exception(state, e)
+        _publish(queue=payload.local_queue, kwargs=payload.kwargs, state=state)
+        return None
+
+
+def _run_payload(payload: Payload, state: State) -> Generator:
     ret = None
 
     if payload.path is not None and not isinstance(payload.path, state.path_enum):
@@ -240,25 +732,33 @@ def execute_payload(payload: Payload, state: State) -> Any:
         )
 
         for action in state.paths[payload.path]:
-            ret = execute_action(payload=payload, action=action, state=state)
+            ret = yield from _execute_action(
+                payload=payload, action=action, state=state
+            )
 
     elif isinstance(payload.queue, Queue):  # QUEUE (aka SHORTCUT)
         queue = payload.queue
         assert isinstance(queue.type, QueueType)
-        if queue.path:
-            record = {"path": queue.path, "kwargs": payload.kwargs}
-        else:
-            record = payload.kwargs
-        with state.logger.context(
-            bind={
-                "path": queue.path,
-                "queue_type": queue.type,
-                "queue_name": queue.name,
-                "record": record,
-            }
-        ):
-            state.logger.log("Pushing record.")
-        put_record(queue=queue, record=record)
+        if queue.path and queue.key in state.local_queues:
+            # This lambda would receive the record anyway, so skip the round trip.
+            with state.logger.context(
+                bind={
+                    "path": queue.path,
+                    "queue_type": queue.type,
+                    "queue_name": queue.name,
+                }
+            ):
+                state.logger.log("Running record inline.")
+            # Serialize the kwargs anyway, so the path receives what it would from the queue.
+            kwargs = wire.loads(wire.dumps(payload.kwargs, queue.wire_format))
+            yield [
+                _InlinePayload(
+                    kwargs=kwargs, queue=queue, event_source=payload.event_source
+                ).validate(state.path_enum)
+            ]
+            # Publishing returns nothing, so neither does running inline.
+            return ret
+        _publish(queue=queue, kwargs=payload.kwargs, state=state)
     else:
         state.logger.info(
             f"Path should be a string (path name), Path (path Enum), or Queue: {payload.path})"
@@ -267,14 +767,29 @@ def execute_payload(payload: Payload, state: State) -> Any:
     return ret
 
 
-def execute_action(payload: Payload, action: Action, state: State) -> Any:
-    """Execute functions, paths, and queues (shortcuts) in an Action.
+def _publish(queue: Queue, kwargs: dict, state: State):
+    if queue.path:
+        record = {"path": queue.path, "kwargs": kwargs}
+    else:
+        record = kwargs
+    with state.logger.context(
+        bind={
+            "path": queue.path,
+            "queue_type": queue.type,
+            "queue_name": queue.name,
+            "record": record,
+        }
+    ):
+        state.logger.log("Pushing record.")
+    if queue.buffered and state.outbox is not None:
+        # Sent, packed with the rest of the invocation's records, by flush_outbox.
+        state.outbox.setdefault(queue.key, (queue, []))[1].append(record)
+    else:
+        put_record(queue=queue, record=record, deadline=state.deadline)
 
-    Args:
-        payload (Payload):
-        action: (Action):
-        state (State):
-    """
+
+def _execute_action(payload: Payload, action: Action, state: State) -> Generator:
+    """Execute an Action, yielding lists of child Payloads to the scheduler."""
     assert isinstance(action, Action)
     ret = None
 
@@ -305,8 +820,16 @@ def execute_action(payload: Payload, action: Action, state: State) -> Any:
             with state.logger.context(bind={**_log_context, "kwargs": action_kwargs}):
                 state.logger.log("Executing function.")
             with state.logger.context(bind=_log_context):
-                ret = f(**{**action_kwargs, **default_kwargs})
-            ret = return_handler(ret=ret, state=state)
+                if action.retry:
+                    ret = action.retry.call(
+                        f,
+                        kwargs={**action_kwargs, **default_kwargs},
+                        deadline=state.deadline,
+                        logger=state.logger,
+                    )
+                else:
+                    ret = f(**{**action_kwargs, **default_kwargs})
+            ret = yield from _return_handler(ret=ret, state=state)
         except lpipe.exceptions.LPBaseException:
             # CAPTURES:
             #    lpipe.exceptions.FailButContinue
@@ -335,13 +858,16 @@ def execute_action(payload: Payload, action: Action, state: State) -> Any:
             ).validate()
         )
 
-    for p in payloads:
-        ret = execute_payload(payload=p, state=state)
+    if payloads:
+        # Sibling branches are independent, so they may run concurrently.
+        results = yield Branches(payloads, max_workers=action.max_workers)
+        ret = results[-1]
 
     return ret
 
 
-def return_handler(ret: Any, state: State) -> Any:
+def _return_handler(ret: Any, state: State) -> Generator:
+    """Yield any Payloads returned by a function to the scheduler."""
     if not ret:
         return ret
     _payloads = []
@@ -360,12 +886,11 @@ def return_handler(ret: Any, state: State) -> Any:
 
     if _payloads:
         state.logger.debug(f"{len(_payloads)} dynamic payloads received")
-    for p in _payloads:
-        state.logger.debug(f"executing dynamic payload: {p}")
         try:
-            ret = execute_payload(payload=p, state=state)
+            results = yield _payloads
+            ret = results[-1]
         except Exception:
-            state.logger.error(f"Failed to execute returned {p}")
+            state.logger.error(f"Failed to execute returned {_payloads}")
             raise
     return ret
 
@@ -484,15 +1009,164 @@ def get_raw_payload(record) -> dict:
 
 
 def get_kinesis_payload(record) -> dict:
-    """Decode and validate a kinesis record."""
+    """Decode and validate a kinesis record.
+
+    KPL aggregated records are expanded into an envelope of their user records.
+    """
     assert record["kinesis"]["data"] is not None
-    return json.loads(base64.b64decode(bytearray(record["kinesis"]["data"], "utf-8")))
+    data = base64.b64decode(bytearray(record["kinesis"]["data"], "utf-8"))
+    if kpl.is_aggregated(data):
+        records = []
+        for r in kpl.deaggregate(data):
+            record = wire.loads(r.data)
+            packed = envelope.unpack(record)
+            records.extend([record] if packed is None else packed)
+        return {envelope.KEY: records}
+    return wire.loads(data)
 
 
 def get_sqs_payload(record) -> dict:
-    """Decode and validate an sqs record."""
+    """Decode and validate an sqs record.
+
+    Messages an SNS topic delivered to the queue (without raw message delivery) are unwrapped.
+    """
     assert record["body"] is not None
-    return json.loads(record["body"])
+    payload = wire.loads(record["body"])
+    if (
+        isinstance(payload, dict)
+        and payload.get("Type") == "Notification"
+        and "TopicArn" in payload
+        and "Message" in payload
+    ):
+        return wire.loads(payload["Message"])
+    return payload
+
+
+def get_sns_payload(record) -> dict:
+    """Decode and validate an sns record."""
+    assert record["Sns"]["Message"] is not None
+    return wire.loads(record["Sns"]["Message"])
+
+
+def get_eventbridge_payload(record) -> dict:
+    """Get an eventbridge event's detail, which lambda has already decoded."""
+    assert record["detail"] is not None
+    return record["detail"]
+
+
+def get_dynamodb_payload(record) -> dict:
+    """Decode a dynamodb stream record's keys and images into plain python values."""
+    data = record["dynamodb"]
+    try:
+        return {
+            "event_name": record["eventName"],
+            "keys": dynamodb.deserialize_image(data.get("Keys")),
+            "new_image": dynamodb.deserialize_image(data.get("NewImage")),
+            "old_image": dynamodb.deserialize_image(data.get("OldImage")),
+        }
+    except ValueError as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Failed to deserialize dynamodb stream record. {utils.exception_to_str(e)}"
+        ) from e
+
+
+def get_s3_payload(record) -> dict:
+    """Stream the records in the object an s3 notification refers to, as an envelope.
+
+    The records are read lazily, in bounded chunks, as the envelope is iterated.
+    """
+    if not record["eventName"].startswith("ObjectCreated:"):
+        return {envelope.KEY: []}
+    obj = record["s3"]["object"]
+    return {
+        envelope.KEY: s3.stream_records(
+            bucket=record["s3"]["bucket"]["name"],
+            key=urllib.parse.unquote_plus(obj["key"]),
+            size=obj.get("size"),
+        )
+    }
+
+
+def get_firehose_payload(record) -> dict:
+    """Decode a firehose data transformation record."""
+    assert record["data"] is not None
+    return wire.loads(base64.b64decode(record["data"]))
+
+
+def get_kafka_payload(record) -> dict:
+    """Decode and validate a kafka record's value."""
+    assert record["value"] is not None
+    return wire.loads(base64.b64decode(record["value"]))
+
+
+def _decode_bytes(data: bytes):
+    try:
+        return data.decode("utf-8")
+    except UnicodeDecodeError:
+        return data
+
+
+def get_kafka_metadata(record) -> dict:
+    """Get a kafka record's topic, partition, offset, timestamp, key, and headers.
+
+    The key and header values are decoded as utf-8 strings where possible, otherwise bytes.
+    """
+    key = record.get("key")
+    headers = {}
+    for header in record.get("headers") or []:
+        for name, value in header.items():
+            headers[name] = _decode_bytes(bytes(value))
+    return {
+        "topic": record["topic"],
+        "partition": record["partition"],
+        "offset": record["offset"],
+        "timestamp": record.get("timestamp"),
+        "key": None if key is None else _decode_bytes(base64.b64decode(key)),
+        "headers": headers,
+    }
+
+
+# Record eventSource values, and a key which only that source's records have.
+_RECORD_SOURCES = [
+    ("aws:sqs", "body", EventSourceType.SQS),
+    ("aws:kinesis", "kinesis", EventSourceType.KINESIS),
+    ("aws:dynamodb", "dynamodb", EventSourceType.DYNAMODB),
+    ("aws:s3", "s3", EventSourceType.S3),
+    ("aws:sns", "Sns", EventSourceType.SNS),
+]
+
+
+def detect_event_source_type(event) -> EventSourceType:
+    """Identify an event's source from its shape, falling back to RAW.
+
+    Only the event's top level and its first record are inspected. Scheduled events
+    are RAW, as they always have been, rather than EVENTBRIDGE. So is an empty batch,
+    since there's no record to tell its source by.
+    """
+    if not isinstance(event, dict):
+        return EventSourceType.RAW
+    if isinstance(event.get("records"), dict):
+        return EventSourceType.KAFKA
+    if isinstance(event.get("records"), list) and "deliveryStreamArn" in event:
+        return EventSourceType.FIREHOSE
+    if (
+        "detail-type" in event
+        and "detail" in event
+        and event["detail-type"] != "Scheduled Event"
+    ):
+        return EventSourceType.EVENTBRIDGE
+    records = event.get("Records")
+    if isinstance(records, list) and records:
+        first = records[0]
+        if isinstance(first, dict):
+            source = first.get("eventSource") or first.get("EventSource")
+            for event_source, _, event_source_type in _RECORD_SOURCES:
+                if source == event_source:
+                    return event_source_type
+            for _, key, event_source_type in _RECORD_SOURCES:
+                if key in first:
+                    return event_source_type
+    return EventSourceType.RAW
 
 
 def get_records_from_event(event_source_type: EventSourceType, event):
@@ -502,6 +1176,65 @@ def get_records_from_event(event_source_type: EventSourceType, event):
         return event["Records"]
     if event_source_type == EventSourceType.SQS:
         return event["Records"]
+    if event_source_type == EventSourceType.DYNAMODB:
+        return event["Records"]
+    if event_source_type == EventSourceType.S3:
+        return event["Records"]
+    if event_source_type == EventSourceType.FIREHOSE:
+        return event["records"]
+    if event_source_type == EventSourceType.SNS:
+        return event["Records"]
+    if event_source_type == EventSourceType.EVENTBRIDGE:
+        # Lambda is invoked with one event at a time.
+        return [event]
+    if event_source_type == EventSourceType.KAFKA:
+        # Keyed by topic-partition, each in offset order.
+        return [r for records in event["records"].values() for r in records]
+
+
+# Sources whose event source mappings accept a partial batch response.
+_BATCH_ITEM_FAILURE_SOURCES = (
+    EventSourceType.SQS,
+    EventSourceType.KINESIS,
+    EventSourceType.DYNAMODB,
+)
+
+
+def get_record_identifier(event_source_type: EventSourceType, record) -> str:
+    """Get the identifier of a record, for partial batch responses (where the source
+    supports them), dead letters, and idempotency keys."""
+    if event_source_type == EventSourceType.KINESIS:
+        return mindictive.get_nested(record, ["kinesis", "sequenceNumber"], None)
+    if event_source_type == EventSourceType.SQS:
+        return mindictive.get_nested(record, ["messageId"], None)
+    if event_source_type == EventSourceType.DYNAMODB:
+        return mindictive.get_nested(record, ["dynamodb", "SequenceNumber"], None)
+    if event_source_type == EventSourceType.FIREHOSE:
+        return mindictive.get_nested(record, ["recordId"], None)
+    if event_source_type == EventSourceType.KAFKA:
+        return f"{get_partition(record)}:{record['offset']}"
+    if event_source_type == EventSourceType.SNS:
+        return mindictive.get_nested(record, ["Sns", "MessageId"], None)
+    if event_source_type == EventSourceType.EVENTBRIDGE:
+        return mindictive.get_nested(record, ["id"], None)
+    if event_source_type == EventSourceType.S3:
+        # The object's lines are numbered on top of this, as an envelope's records are.
+        bucket = mindictive.get_nested(record, ["s3", "bucket", "name"], None)
+        obj = mindictive.get_nested(record, ["s3", "object"], {})
+        return f"{bucket}/{obj.get('key')}:{obj.get('eTag')}"
+    return None
+
+
+def get_partition(record) -> str:
+    """Get the topic-partition of a kafka record, as keyed in the event (e.g. "my-topic-0")."""
+    return f"{record['topic']}-{record['partition']}"
+
+
+def get_record_metadata(event_source_type: EventSourceType, record) -> dict:
+    """Get source-specific details of a record, which don't belong in its kwargs."""
+    if event_source_type == EventSourceType.KAFKA:
+        return get_kafka_metadata(record)
+    return None
 
 
 def get_event_source(event_source_type: EventSourceType, record):
@@ -509,8 +1242,19 @@ def get_event_source(event_source_type: EventSourceType, record):
         EventSourceType.RAW,
         EventSourceType.KINESIS,
         EventSourceType.SQS,
+        EventSourceType.FIREHOSE,
     ):
         return mindictive.get_nested(record, ["event_source_arn"], None)
+    if event_source_type == EventSourceType.DYNAMODB:
+        return mindictive.get_nested(record, ["eventSourceARN"], None)
+    if event_source_type == EventSourceType.S3:
+        return mindictive.get_nested(record, ["s3", "bucket", "arn"], None)
+    if event_source_type == EventSourceType.SNS:
+        return mindictive.get_nested(record, ["Sns", "TopicArn"], None)
+    if event_source_type == EventSourceType.EVENTBRIDGE:
+        return mindictive.get_nested(record, ["source"], None)
+    if event_source_type == EventSourceType.KAFKA:
+        return get_partition(record)
     warnings.warn(f"Unable to fetch event_source for {event_source_type} record.")
     return None
 
@@ -523,22 +1267,133 @@ def get_payload_from_record(event_source_type: EventSourceType, record) -> dict:
             payload = get_kinesis_payload(record)
         if event_source_type == EventSourceType.SQS:
             payload = get_sqs_payload(record)
+        if event_source_type == EventSourceType.DYNAMODB:
+            payload = get_dynamodb_payload(record)
+        if event_source_type == EventSourceType.S3:
+            payload = get_s3_payload(record)
+        if event_source_type == EventSourceType.FIREHOSE:
+            payload = get_firehose_payload(record)
+        if event_source_type == EventSourceType.SNS:
+            payload = get_sns_payload(record)
+        if event_source_type == EventSourceType.EVENTBRIDGE:
+            payload = get_eventbridge_payload(record)
+        if event_source_type == EventSourceType.KAFKA:
+            payload = get_kafka_payload(record)
+        # Fetch records which were too large to send from S3.
+        payload = claimcheck.retrieve(payload)
     except json.JSONDecodeError as e:
         raise lpipe.exceptions.InvalidPayloadError(
             f"Payload contained invalid json. {utils.exception_to_str(e)}"
         ) from e
+    except (AssertionError, KeyError, TypeError, ValueError) as e:
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Bad record provided for event source type {event_source_type}. {record} {utils.exception_to_str(e)}"
+        ) from e
     return payload
 
 
-def put_record(queue: Queue, record: dict):
+def put_record(queue: Queue, record: dict, deadline: float = None):
+    """Send a record to a queue.
+
+    Args:
+        queue (Queue):
+        record (dict):
+        deadline (float, optional): time (per time.monotonic) after which a rate limited queue stops waiting
+    """
+    return put_records(queue=queue, records=[record], deadline=deadline)
+
+
+def put_records(queue: Queue, records: list, deadline: float = None, context=None):
+    """Send records to a queue in as few requests as possible.
+
+    Args:
+        queue (Queue):
+        records (list):
+        deadline (float, optional): time (per time.monotonic) after which a rate limited queue stops waiting
+        context (optional): the lambda context, used to name the objects written to S3 queues
+    """
     if queue.type == QueueType.KINESIS:
-        return kinesis.put_record(stream_name=queue.name, data=record)
+        try:
+            return kinesis.batch_put_records(
+                stream_name=queue.name,
+                records=records,
+                partition_key=queue.get_partition_key if queue.partition_key else None,
+                explicit_hash_key=(
+                    queue.get_explicit_hash_key if queue.explicit_hash_key else None
+                ),
+                rate_limiter=queue.rate_limiter,
+                deadline=deadline,
+                envelope_records=queue.envelope,
+                codec=queue.codec,
+                compression_threshold=queue.compression_threshold,
+                claim_check=queue.claim_check,
+                aggregate=queue.aggregate,
+                wire_format=queue.wire_format,
+            )
+        except lpipe.exceptions.LPBaseException:
+            raise
+        except Exception as e:
+            raise lpipe.exceptions.FailCatastrophically(
+                f"Failed to send records to {queue}"
+            ) from e
     if queue.type == QueueType.SQS:
         if not queue.url:
             queue.url = sqs.get_queue_url(queue.name)
         try:
-            return sqs.put_message(queue_url=queue.url, data=record)
+            return sqs.batch_put_messages(
+                queue_url=queue.url,
+                messages=records,
+                rate_limiter=queue.rate_limiter,
+                deadline=deadline,
+                envelope_messages=queue.envelope,
+                codec=queue.codec,
+                compression_threshold=queue.compression_threshold,
+                claim_check=queue.claim_check,
+                wire_format=queue.wire_format,
+            )
+        except lpipe.exceptions.LPBaseException:
+            raise
         except Exception as e:
             raise lpipe.exceptions.FailCatastrophically(
                 f"Failed to send message to {queue}"
             ) from e
+    if queue.type == QueueType.FIREHOSE:
+        return firehose.batch_put_records(
+            delivery_stream_name=queue.name,
+            records=records,
+            rate_limiter=queue.rate_limiter,
+            deadline=deadline,
+        )
+    if queue.type == QueueType.SNS:
+        return sns.batch_publish(
+            topic_arn=queue.url,
+            messages=records,
+            message_group_id=(
+                queue.get_message_group_id if queue.message_group_id else None
+            ),
+            message_attributes=(
+                queue.get_message_attributes if queue.message_attributes else None
+            ),
+            rate_limiter=queue.rate_limiter,
+            deadline=deadline,
+        )
+    if queue.type == QueueType.EVENTBRIDGE:
+        return eventbridge.batch_put_events(
+            event_bus_name=queue.name or queue.url,
+            events=records,
+            source=queue.get_source,
+            detail_type=queue.get_detail_type,
+            rate_limiter=queue.rate_limiter,
+            deadline=deadline,
+        )
+    if queue.type == QueueType.S3:
+        bucket, _, prefix = (
+            queue.url[len("s3://") :] if queue.url else queue.name
+        ).partition("/")
+        return s3.batch_put_records(
+            bucket=bucket,
+            records=records,
+            prefix=prefix,
+            codec=queue.codec or compression.Codec.GZIP,
+            context=context,
+        )
@@ -1,11 +1,17 @@
 from enum import Enum
 
-from lpipe import queue, utils
+import lpipe.exceptions
+from lpipe import claimcheck, compression, queue, ratelimit, utils, wire
+from lpipe.contrib import eventbridge
 
 
 class QueueType(Enum):
     KINESIS = 1
     SQS = 2
+    FIREHOSE = 3
+    SNS = 4
+    EVENTBRIDGE = 5
+    S3 = 6
 
 
 class Queue:
@@ -14,30 +20,190 @@ class Queue:
     Note:
         Kinesis uses name.
         SQS uses name or url.
+        Firehose uses name (the delivery stream's name), and sends newline-delimited JSON.
+        SNS uses url (the topic's ARN).
+        EventBridge uses name (the event bus' name or ARN).
+        S3 uses url (s3://bucket/prefix/) or name (the bucket), and writes one JSONL object per invocation.
+        Firehose, SNS, and EventBridge send JSON as-is, so they don't support envelope, codec, claim_check, or wire_format.
+
+    Selectors may be a dotted field path into the kwargs (e.g. "user.id"), a list
+    of keys, or a function which is called with the kwargs and returns a value.
 
     Args:
         type (QueueType)
         path (str): Value of the "path" field set on the message we'll send to this queue.
         name (str, optional): Queue name
         url (str, optional): Queue URL/URI
+        partition_key (optional): Kinesis only. Selector for the record's partition key. Defaults to a hash of the record.
+        explicit_hash_key (optional): Kinesis only. Selector for the record's explicit hash key.
+        records_per_second (float, optional): Limit the rate of records sent to this queue.
+        bytes_per_second (float, optional): Limit the rate of bytes sent to this queue.
+        envelope (bool): Buffer records sent to this queue until the end of the invocation, then pack many into each message.
+        codec (compression.Codec, optional): Compress records sent to this queue.
+        compression_threshold (int): Don't compress records smaller than this many bytes.
+        claim_check (claimcheck.ClaimCheck, optional): Offload records too large for this queue to S3.
+        aggregate (bool): Kinesis only. Aggregate records sent together, per the KPL aggregation format.
+        wire_format (wire.WireFormat, optional): Serialize records sent to this queue with this format. Defaults to JSON.
+        message_group_id (optional): SNS only. Selector for a FIFO topic's message group id.
+        message_attributes (optional): SNS only. A dict of message attributes, or a function which is called with the kwargs and returns one.
+        source (optional): EventBridge only. The events' Source, or a function which is called with the kwargs and returns one. Defaults to "lpipe".
+        detail_type (optional): EventBridge only. The events' DetailType, or a function which is called with the kwargs and returns one. Defaults to the path.
 
     Attributes:
         type (QueueType)
         path (str)
         name (str)
         url (str)
+        partition_key
+        explicit_hash_key
+        records_per_second
+        bytes_per_second
+        envelope
+        codec
+        compression_threshold
+        claim_check
+        aggregate
+        wire_format
+        message_group_id
+        message_attributes
+        source
+        detail_type
 
     """
 
     def __init__(
-        self, type: queue.QueueType, path: str = None, name: str = None, url: str = None
+        self,
+        type: queue.QueueType,
+        path: str = None,
+        name: str = None,
+        url: str = None,
+        partition_key=None,
+        explicit_hash_key=None,
+        records_per_second: float = None,
+        bytes_per_second: float = None,
+        envelope: bool = False,
+        codec: compression.Codec = None,
+        compression_threshold: int = compression.DEFAULT_THRESHOLD,
+        claim_check: claimcheck.ClaimCheck = None,
+        aggregate: bool = False,
+        wire_format: wire.WireFormat = None,
+        message_group_id=None,
+        message_attributes=None,
+        source=None,
+        detail_type=None,
     ):
         assert name or url
         assert isinstance(type, queue.QueueType)
+        assert codec is None or isinstance(codec, compression.Codec)
+        assert claim_check is None or isinstance(claim_check, claimcheck.ClaimCheck)
+        assert wire_format is None or isinstance(wire_format, wire.WireFormat)
+        assert type != QueueType.SNS or url
+        assert (
+            message_attributes is None
+            or isinstance(message_attributes, dict)
+            or callable(message_attributes)
+        )
+        for value in (source, detail_type):
+            assert value is None or isinstance(value, str) or callable(value)
+        for selector in (partition_key, explicit_hash_key, message_group_id):
+            assert (
+                selector is None
+                or isinstance(selector, (str, list, tuple))
+                or callable(selector)
+            )
+        if type in (QueueType.FIREHOSE, QueueType.SNS, QueueType.EVENTBRIDGE):
+            unsupported = [
+                arg
+                for arg, value in (
+                    ("envelope", envelope),
+                    ("codec", codec),
+                    ("claim_check", claim_check),
+                    ("wire_format", wire_format not in (None, wire.WireFormat.JSON)),
+                )
+                if value
+            ]
+            if unsupported:
+                raise lpipe.exceptions.InvalidConfigurationError(
+                    f"{type} queues don't support {', '.join(unsupported)}"
+                )
         self.type = type
         self.path = path
         self.name = name
         self.url = url
+        self.partition_key = partition_key
+        self.explicit_hash_key = explicit_hash_key
+        self.records_per_second = records_per_second
+        self.bytes_per_second = bytes_per_second
+        self.envelope = envelope
+        self.codec = codec
+        self.compression_threshold = compression_threshold
+        self.claim_check = claim_check
+        self.aggregate = aggregate
+        self.wire_format = wire_format
+        self.message_group_id = message_group_id
+        self.message_attributes = message_attributes
+        self.source = source
+        self.detail_type = detail_type
+
+    @property
+    def key(self) -> tuple:
+        """Identifies the underlying queue, whether it was configured by name or url."""
+        if self.type == QueueType.S3:
+            return (self.type, self.url or self.name)
+        return (self.type, self.name or self.url.rstrip("/").split("/")[-1])
+
+    @property
+    def buffered(self) -> bool:
+        """Whether records sent to this queue are held until the end of the invocation."""
+        return self.envelope or self.type == QueueType.S3
+
+    @property
+    def rate_limiter(self) -> ratelimit.RateLimiter:
+        """The rate limiter shared by every Queue with this type and name/url."""
+        if not (self.records_per_second or self.bytes_per_second):
+            return None
+        return ratelimit.get_limiter(
+            (self.type, self.name or self.url),
+            records_per_second=self.records_per_second,
+            bytes_per_second=self.bytes_per_second,
+        )
+
+    def get_partition_key(self, record: dict) -> str:
+        """Select the partition key for a record sent to this queue."""
+        return utils.select(self.partition_key, self._kwargs(record), "partition_key")
+
+    def get_explicit_hash_key(self, record: dict) -> str:
+        """Select the explicit hash key for a record sent to this queue."""
+        return utils.select(
+            self.explicit_hash_key, self._kwargs(record), "explicit_hash_key"
+        )
+
+    def get_message_group_id(self, record: dict) -> str:
+        """Select the message group id for a record sent to this queue."""
+        return utils.select(
+            self.message_group_id, self._kwargs(record), "message_group_id"
+        )
+
+    def get_message_attributes(self, record: dict) -> dict:
+        """Get the message attributes for a record sent to this queue."""
+        if callable(self.message_attributes):
+            return self.message_attributes(self._kwargs(record))
+        return self.message_attributes
+
+    def get_source(self, record: dict) -> str:
+        """Get the EventBridge Source for a record sent to this queue."""
+        if callable(self.source):
+            return utils.select(self.source, self._kwargs(record), "source")
+        return self.source or eventbridge.DEFAULT_SOURCE
+
+    def get_detail_type(self, record: dict) -> str:
+        """Get the EventBridge DetailType for a record sent to this queue."""
+        if callable(self.detail_type):
+            return utils.select(self.detail_type, self._kwargs(record), "detail_type")
+        return self.detail_type or self.path
+
+    def _kwargs(self, record: dict) -> dict:
+        return record["kwargs"] if self.path else record
 
     def __repr__(self):
         return utils.repr(self, ["type", "name", "url"])
@@ -0,0 +1,114 @@
+import threading
+import time
+
+# Limiters are kept at module level so their state survives warm invocations.
+_LIMITERS = {}
+
+
+class TokenBucket:
+    """A token bucket which may be overdrawn.
+
+    Reserving more tokens than are available puts the bucket into debt, and the
+    caller is told how long to wait before the reservation is covered. This lets a
+    single request larger than the bucket's capacity through, at the rate allowed.
+
+    Args:
+        rate (float): tokens added per second
+        capacity (float, optional): maximum tokens held (burst size). Defaults to `rate`.
+        clock (function): returns the current time in seconds
+    """
+
+    def __init__(self, rate: float, capacity: float = None, clock=time.monotonic):
+        assert rate > 0
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.clock = clock
+        self.timestamp = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self.timestamp) * self.rate
+        )
+        self.timestamp = now
+
+    def reserve(self, n: float) -> float:
+        """Take `n` tokens and return the seconds to wait before using them."""
+        self._refill()
+        self.tokens -= n
+        return max(0.0, -self.tokens / self.rate)
+
+
+class RateLimiter:
+    """Limit the records and bytes per second sent to a single queue.
+
+    Args:
+        records_per_second (float, optional):
+        bytes_per_second (float, optional):
+        clock (function): returns the current time in seconds
+        sleep (function): sleeps for a number of seconds
+    """
+
+    def __init__(
+        self,
+        records_per_second: float = None,
+        bytes_per_second: float = None,
+        clock=time.monotonic,
+        sleep=time.sleep,
+    ):
+        self.buckets = {}
+        if records_per_second:
+            self.buckets["records"] = TokenBucket(records_per_second, clock=clock)
+        if bytes_per_second:
+            self.buckets["bytes"] = TokenBucket(bytes_per_second, clock=clock)
+        self.clock = clock
+        self.sleep = sleep
+        self._lock = threading.Lock()
+
+    def acquire(self, records: int, nbytes: int = 0, deadline: float = None) -> float:
+        """Block until `records` and `nbytes` may be sent.
+
+        Args:
+            records (int): number of records about to be sent
+            nbytes (int): number of bytes about to be sent
+            deadline (float, optional): time (per `clock`) after which we stop waiting
+
+        Returns:
+            float: seconds spent waiting
+        """
+        wait = 0.0
+        with self._lock:
+            if "records" in self.buckets:
+                wait = max(wait, self.buckets["records"].reserve(records))
+            if "bytes" in self.buckets:
+                wait = max(wait, self.buckets["bytes"].reserve(nbytes))
+        if deadline is not None:
+            # Spread the burst over the time we have left, but never past it.
+            wait = min(wait, max(0.0, deadline - self.clock()))
+        if wait > 0:
+            self.sleep(wait)
+        return wait
+
+
+def get_limiter(key, records_per_second=None, bytes_per_second=None) -> RateLimiter:
+    """Get the shared RateLimiter for a queue, creating it if necessary.
+
+    Args:
+        key: identifies the queue (e.g. (QueueType.KINESIS, "my-stream"))
+        records_per_second (float, optional):
+        bytes_per_second (float, optional):
+    """
+    limiter = _LIMITERS.get(key)
+    if limiter is None or (
+        _rate(limiter, "records") != records_per_second
+        or _rate(limiter, "bytes") != bytes_per_second
+    ):
+        limiter = RateLimiter(records_per_second, bytes_per_second)
+        _LIMITERS[key] = limiter
+    return limiter
+
+
+def _rate(limiter: RateLimiter, name: str):
+    bucket = limiter.buckets.get(name)
+    return bucket.rate if bucket else None
@@ -0,0 +1,130 @@
+import random
+import time
+from typing import Tuple, Type
+
+import lpipe.exceptions
+from lpipe import utils
+
+
+class Retry:
+    """Retry a function in-process when it raises a transient exception.
+
+    Waits between attempts grow exponentially, with full jitter. A retry is given up
+    early if its wait would run past `max_time` or the invocation's deadline.
+
+    Args:
+        exceptions (tuple): exception classes to retry. Nothing is retried by default, so bugs aren't. lpipe's own exceptions are never retried.
+        attempts (int): maximum number of calls, including the first
+        base (float): seconds to wait (before jitter) after the first failure
+        max_backoff (float): maximum seconds to wait between attempts
+        max_time (float, optional): maximum seconds to spend retrying
+        sleep (function): sleeps for a number of seconds
+    """
+
+    def __init__(
+        self,
+        exceptions: Tuple[Type[BaseException], ...] = (),
+        attempts: int = 3,
+        base: float = 0.1,
+        max_backoff: float = 5,
+        max_time: float = None,
+        sleep=time.sleep,
+    ):
+        assert attempts >= 1
+        self.exceptions = tuple(exceptions)
+        self.attempts = attempts
+        self.base = base
+        self.max_backoff = max_backoff
+        self.max_time = max_time
+        self.sleep = sleep
+
+    def __repr__(self):
+        return utils.repr(self, ["exceptions", "attempts"])
+
+    def backoff(self, attempt: int) -> float:
+        """Seconds to wait after the `attempt`th failed call."""
+        return random.uniform(  # nosec
+            0, min(self.max_backoff, self.base * 2 ** (attempt - 1))
+        )
+
+    def call(
+        self,
+        func,
+        args: tuple = (),
+        kwargs: dict = None,
+        deadline: float = None,
+        logger=None,
+    ):
+        """Call func(*args, **kwargs), retrying on `exceptions`.
+
+        Args:
+            func (function):
+            args (tuple):
+            kwargs (dict):
+            deadline (float, optional): time (per time.monotonic) after which we stop retrying
+            logger (optional):
+
+        Raises:
+            The last exception raised by `func` if every attempt failed.
+        """
+        start = time.monotonic()
+        attempt = 1
+        while True:
+            try:
+                return func(*args, **(kwargs or {}))
+            except lpipe.exceptions.LPBaseException:
+                raise
+            except self.exceptions as e:
+                if attempt >= self.attempts:
+                    raise
+                wait = self.backoff(attempt)
+                resume = time.monotonic() + wait
+                if (self.max_time is not None and resume - start > self.max_time) or (
+                    deadline is not None and resume >= deadline
+                ):
+                    raise
+                if logger:
+                    logger.warning(
+                        f"Retrying {getattr(func, '__name__', func)} in {wait:.3f}s after attempt {attempt} raised {e.__class__.__name__}."
+                    )
+                self.sleep(wait)
+                attempt += 1
+
+    def resend(self, send, entries: list, failed, deadline: float = None, logger=None):
+        """Send a batch, then resend any entries which failed individually.
+
+        Batch APIs (e.g. firehose put_record_batch) may succeed while rejecting some
+        of their entries. Only the rejected entries are resent, with the same backoff
+        as `call`.
+
+        Args:
+            send (function): called with a list of entries, returns the response
+            entries (list):
+            failed (function): called with a response and the entries sent, returns the indexes of the entries which failed
+            deadline (float, optional): time (per time.monotonic) after which we stop retrying
+            logger (optional):
+
+        Returns:
+            tuple: (responses, entries which still failed after every attempt)
+        """
+        start = time.monotonic()
+        responses = []
+        attempt = 1
+        while True:
+            response = send(entries)
+            responses.append(response)
+            entries = [entries[i] for i in failed(response, entries)]
+            if not entries or attempt >= self.attempts:
+                return responses, entries
+            wait = self.backoff(attempt)
+            resume = time.monotonic() + wait
+            if (self.max_time is not None and resume - start > self.max_time) or (
+                deadline is not None and resume >= deadline
+            ):
+                return responses, entries
+            if logger:
+                logger.warning(
+                    f"Resending {len(entries)} failed entries in {wait:.3f}s after attempt {attempt}."
+                )
+            self.sleep(wait)
+            attempt += 1
@@ -0,0 +1,262 @@
+import heapq
+import itertools
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from enum import Enum
+from typing import Any, Generator
+
+import lpipe.exceptions
+from lpipe import utils
+
+
+class Order(Enum):
+    DFS = 1  # Run each branch to completion before its siblings (the default).
+    BFS = 2  # Run branches level by level.
+    PRIORITY = 3  # Run the branch with the lowest Scheduler.priority(payload) first.
+
+
+class Branches(list):
+    """A list of payloads whose branches may run concurrently.
+
+    Under Order.DFS, up to `max_workers` of these branches are run at once. Their
+    results are sent back to the parent in order, and the first failure (in order)
+    is raised inside it, just as if the branches had run one after another.
+
+    Args:
+        payloads (list):
+        max_workers (int):
+    """
+
+    def __init__(self, payloads: list, max_workers: int = 1):
+        super().__init__(payloads)
+        self.max_workers = max_workers
+
+
+class Scheduler:
+    """Executes a record's graph of Paths and returned Payloads from a work queue.
+
+    Executing a payload is a generator which yields lists of child payloads. With
+    Order.DFS, each yield waits for its children to finish and receives their
+    results, exactly like a recursive call but without growing the Python stack.
+    With Order.BFS or Order.PRIORITY, children are deferred to a work queue, the
+    parent continues immediately (receiving None for each child), and independent
+    branches may run concurrently on up to `max_workers` threads. The record's
+    output is then the result of whichever branch finished last.
+
+    Args:
+        order (Order):
+        max_depth (int, optional): maximum number of hops from the record's payload
+        max_fan_out (int, optional): maximum number of payloads a single action or function may spawn
+        max_workers (int): threads used to run deferred branches (Order.BFS and Order.PRIORITY)
+        priority (function, optional): Order.PRIORITY only. Called with a payload, lower runs first.
+    """
+
+    def __init__(
+        self,
+        order: Order = Order.DFS,
+        max_depth: int = None,
+        max_fan_out: int = None,
+        max_workers: int = 1,
+        priority=None,
+    ):
+        assert isinstance(order, Order)
+        assert max_workers >= 1
+        self.order = order
+        self.max_depth = max_depth
+        self.max_fan_out = max_fan_out
+        self.max_workers = max_workers
+        self.priority = priority or (lambda payload: 0)
+
+    def __repr__(self):
+        return utils.repr(self, ["order", "max_depth", "max_fan_out", "max_workers"])
+
+    def check(self, payloads: list, depth: int):
+        """Enforce max_depth and max_fan_out on a list of payloads spawned at `depth`.
+
+        Raises:
+            lpipe.exceptions.GraphLimitError:
+        """
+        if self.max_fan_out is not None and len(payloads) > self.max_fan_out:
+            raise lpipe.exceptions.GraphLimitError(
+                f"Tried to spawn {len(payloads)} payloads; max_fan_out is {self.max_fan_out}."
+            )
+        if self.max_depth is not None and depth + 1 > self.max_depth:
+            raise lpipe.exceptions.GraphLimitError(
+                f"Tried to spawn payloads at depth {depth + 1}; max_depth is {self.max_depth}."
+            )
+
+    def run(self, root: Generator, spawn, on_error=None) -> Any:
+        """Run a payload's generator, and everything it spawns, to completion.
+
+        Args:
+            root (Generator): yields lists of payloads, returns a result
+            spawn (function): called with a payload, returns its generator
+            on_error (function, optional): Order.BFS and Order.PRIORITY only. Called with
+                non-lpipe exceptions raised by deferred branches, which would otherwise
+                have been handled by the (already finished) parent.
+
+        Returns:
+            The result of the root generator (Order.DFS), or of the last branch to finish.
+        """
+        if self.order == Order.DFS:
+            return self._run_dfs(root, spawn)
+        return self._run_deferred(root, spawn, on_error)
+
+    def _run_dfs(self, root: Generator, spawn, depth: int = 0) -> Any:
+        # Each frame is [generator, depth, children, results]
+        stack = [[root, depth, None, None]]
+        value, error = None, None
+        while stack:
+            frame = stack[-1]
+            gen, depth, children, results = frame
+            if error is None and children is not None and len(results) < len(children):
+                stack.append([spawn(children[len(results)]), depth + 1, None, None])
+                continue
+            try:
+                if error is not None:
+                    e, error = error, None
+                    request = gen.throw(e)
+                else:
+                    frame[2], frame[3] = None, None
+                    request = gen.send(results)
+            except StopIteration as stop:
+                stack.pop()
+                value = stop.value
+                if stack:
+                    stack[-1][3].append(value)
+                continue
+            except BaseException as e:
+                # Propagate to the parent, as if raised from a recursive call.
+                stack.pop()
+                if not stack:
+                    raise
+                error = e
+                continue
+            try:
+                self.check(request, depth)
+            except lpipe.exceptions.GraphLimitError as e:
+                # Raise limit errors inside the generator which spawned the payloads.
+                error = e
+                continue
+            if isinstance(request, Branches) and request.max_workers > 1:
+                try:
+                    frame[2], frame[3] = list(request), self._gather(
+                        request, depth + 1, spawn
+                    )
+                except BaseException as e:
+                    error = e
+            else:
+                frame[2], frame[3] = list(request), []
+        return value
+
+    def _gather(self, branches: Branches, depth: int, spawn) -> list:
+        """Run sibling branches concurrently, returning their results in order."""
+        if len(branches) == 1:
+            return [self._run_dfs(spawn(branches[0]), spawn, depth)]
+        # Each fan-out gets its own pool, so nested fan-outs can't starve each other.
+        with ThreadPoolExecutor(
+            max_workers=min(branches.max_workers, len(branches))
+        ) as executor:
+            futures = [
+                executor.submit(self._run_dfs, spawn(p), spawn, depth) for p in branches
+            ]
+            wait(futures)
+        return [future.result() for future in futures]
+
+    def _run_deferred(self, root: Generator, spawn, on_error=None) -> Any:
+        frontier = _Frontier(self.order, self.priority)
+        value = None
+
+        def _drive(gen, depth):
+            """Run a generator to completion, collecting the payloads it spawns."""
+            spawned = []
+            results, error = None, None
+            while True:
+                try:
+                    if error is not None:
+                        e, error = error, None
+                        request = gen.throw(e)
+                    else:
+                        request = gen.send(results)
+                except StopIteration as stop:
+                    return stop.value, spawned
+                try:
+                    self.check(request, depth)
+                except lpipe.exceptions.GraphLimitError as e:
+                    error = e
+                    continue
+                spawned.extend([(p, depth + 1) for p in request])
+                results = [None] * len(request)
+
+        def _finish(result):
+            nonlocal value
+            value, spawned = result
+            for p, depth in spawned:
+                frontier.push(p, depth)
+
+        _finish(_drive(root, 0))
+        if self.max_workers == 1:
+            while frontier:
+                payload, depth = frontier.pop()
+                try:
+                    _finish(_drive(spawn(payload), depth))
+                except lpipe.exceptions.LPBaseException:
+                    raise
+                except Exception as e:
+                    if not on_error:
+                        raise
+                    on_error(e)
+            return value
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            running = set()
+            try:
+                while frontier or running:
+                    while frontier and len(running) < self.max_workers:
+                        payload, depth = frontier.pop()
+                        running.add(executor.submit(_drive, spawn(payload), depth))
+                    done, running = wait(running, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        try:
+                            _finish(future.result())
+                        except lpipe.exceptions.LPBaseException:
+                            raise
+                        except Exception as e:
+                            if not on_error:
+                                raise
+                            on_error(e)
+            finally:
+                for future in running:
+                    future.cancel()
+        return value
+
+
+class _Frontier:
+    """The work queue of deferred payloads, ordered per `Order`."""
+
+    def __init__(self, order: Order, priority):
+        self.order = order
+        self.priority = priority
+        self._counter = itertools.count()
+        self._items = deque() if order == Order.BFS else []
+
+    def __bool__(self):
+        return bool(self._items)
+
+    def __len__(self):
+        return len(self._items)
+
+    def push(self, payload, depth: int):
+        if self.order == Order.BFS:
+            self._items.append((payload, depth))
+        else:
+            heapq.heappush(
+                self._items,
+                (self.priority(payload), next(self._counter), payload, depth),
+            )
+
+    def pop(self):
+        if self.order == Order.BFS:
+            return self._items.popleft()
+        _, _, payload, depth = heapq.heappop(self._items)
+        return payload, depth
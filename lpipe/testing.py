@@ -1,5 +1,6 @@
 import base64
 import json
+from urllib.parse import quote_plus
 
 
 def raw_payload(payloads):
@@ -11,18 +12,134 @@ def raw_payload(payloads):
 
 
 def kinesis_payload(payloads):
-    def fmt(p):
+    def fmt(i, p):
         return {
-            "kinesis": {"data": str(base64.b64encode(json.dumps(p).encode()), "utf-8")}
+            "kinesis": {
+                "data": str(base64.b64encode(json.dumps(p).encode()), "utf-8"),
+                "sequenceNumber": str(i),
+            }
         }
 
-    records = [fmt(p) for p in payloads]
+    records = [fmt(i, p) for i, p in enumerate(payloads)]
     return {"Records": records}
 
 
 def sqs_payload(payloads):
-    def fmt(p):
-        return {"body": json.dumps(p)}
+    def fmt(i, p):
+        return {"body": json.dumps(p), "messageId": str(i)}
 
-    records = [fmt(p) for p in payloads]
+    records = [fmt(i, p) for i, p in enumerate(payloads)]
     return {"Records": records}
+
+
+def dynamodb_payload(images, event_name="INSERT"):
+    from boto3.dynamodb.types import TypeSerializer
+
+    serializer = TypeSerializer()
+
+    def fmt(i, p):
+        image = {k: serializer.serialize(v) for k, v in p.items()}
+        return {
+            "eventName": event_name,
+            "eventSourceARN": "arn:aws:dynamodb:us-east-2:123456789012:table/my-table/stream/2020-01-01T00:00:00.000",
+            "dynamodb": {
+                "Keys": {k: image[k] for k in list(image)[:1]},
+                "NewImage": image,
+                "SequenceNumber": str(i),
+            },
+        }
+
+    records = [fmt(i, p) for i, p in enumerate(images)]
+    return {"Records": records}
+
+
+def s3_payload(bucket, keys, event_name="ObjectCreated:Put"):
+    def fmt(i, key):
+        return {
+            "eventName": event_name,
+            "s3": {
+                "bucket": {"name": bucket, "arn": f"arn:aws:s3:::{bucket}"},
+                "object": {"key": quote_plus(key), "eTag": str(i)},
+            },
+        }
+
+    records = [fmt(i, k) for i, k in enumerate(keys)]
+    return {"Records": records}
+
+
+def firehose_payload(payloads):
+    def fmt(i, p):
+        return {
+            "recordId": str(i),
+            "approximateArrivalTimestamp": 1577836800000,
+            "data": str(base64.b64encode(json.dumps(p).encode()), "utf-8"),
+        }
+
+    records = [fmt(i, p) for i, p in enumerate(payloads)]
+    return {
+        "invocationId": "invocation",
+        "deliveryStreamArn": "arn:aws:firehose:us-east-2:123456789012:deliverystream/my-delivery-stream",
+        "region": "us-east-2",
+        "records": records,
+    }
+
+
+def sns_payload(payloads, via_sqs=False):
+    topic_arn = "arn:aws:sns:us-east-2:123456789012:my-topic"
+
+    def fmt(i, p):
+        return {
+            "Type": "Notification",
+            "MessageId": str(i),
+            "TopicArn": topic_arn,
+            "Message": json.dumps(p),
+        }
+
+    if via_sqs:
+        # Delivered to an SQS queue without raw message delivery.
+        return sqs_payload([fmt(i, p) for i, p in enumerate(payloads)])
+    records = [
+        {"EventSource": "aws:sns", "Sns": fmt(i, p)} for i, p in enumerate(payloads)
+    ]
+    return {"Records": records}
+
+
+def eventbridge_payload(payload, source="lpipe", detail_type="EXAMPLE", event_id="1"):
+    return {
+        "version": "0",
+        "id": event_id,
+        "detail-type": detail_type,
+        "source": source,
+        "account": "123456789012",
+        "time": "2020-01-01T00:00:00Z",
+        "region": "us-east-2",
+        "resources": [],
+        "detail": payload,
+    }
+
+
+def kafka_payload(payloads, topic="my-topic", partitions=1, key=None, headers=None):
+    """Build a kafka event, spreading the payloads over partitions round-robin."""
+
+    def fmt(i, p):
+        record = {
+            "topic": topic,
+            "partition": i % partitions,
+            "offset": i // partitions,
+            "timestamp": 1577836800000,
+            "timestampType": "CREATE_TIME",
+            "value": str(base64.b64encode(json.dumps(p).encode()), "utf-8"),
+            "headers": [{k: list(v.encode()) for k, v in (headers or {}).items()}],
+        }
+        if key is not None:
+            record["key"] = str(base64.b64encode(key.encode()), "utf-8")
+        return record
+
+    records = {}
+    for i, p in enumerate(payloads):
+        records.setdefault(f"{topic}-{i % partitions}", []).append(fmt(i, p))
+    return {
+        "eventSource": "aws:kafka",
+        "eventSourceArn": "arn:aws:kafka:us-east-2:123456789012:cluster/my-cluster/abc",
+        "records": records,
+    }
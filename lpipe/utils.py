@@ -2,6 +2,7 @@ import hashlib
 import json
 import logging
 import os
+import time
 from contextlib import contextmanager
 from enum import Enum, EnumMeta
 
@@ -10,8 +11,10 @@ from lpipe.contrib import mindictive
 
 
 def hash(encoded_data):
+    if isinstance(encoded_data, str):
+        encoded_data = encoded_data.encode("utf-8")
     # Flagging this as nosec for bandit because this function is for hashing, not security
-    return hashlib.sha1(encoded_data.encode("utf-8")).hexdigest()  # nosec
+    return hashlib.sha1(encoded_data).hexdigest()  # nosec
 
 
 def batch(iterable, n=1):
@@ -25,6 +28,87 @@ def batch(iterable, n=1):
         yield iterable[ndx : min(ndx + n, iter_len)]
 
 
+def batch_by_size(items, max_count, max_bytes, size=len):
+    """Greedily pack items into batches bounded by both count and total size.
+
+    Items are kept in order. A new batch is started whenever adding the next item
+    would exceed either `max_count` items or `max_bytes` total bytes.
+
+    Args:
+        items (list): items to pack
+        max_count (int): maximum number of items per batch
+        max_bytes (int): maximum total size of a batch
+        size (function): returns the encoded size of an item in bytes
+
+    Raises:
+        ValueError: if a single item is larger than `max_bytes`
+    """
+    _batch, _bytes = [], 0
+    for item in items:
+        n = size(item)
+        if n > max_bytes:
+            raise ValueError(f"Item of {n} bytes exceeds batch limit of {max_bytes}.")
+        if _batch and (len(_batch) >= max_count or _bytes + n > max_bytes):
+            yield _batch
+            _batch, _bytes = [], 0
+        _batch.append(item)
+        _bytes += n
+    if _batch:
+        yield _batch
+
+
+def check_sizes(items, max_bytes, size=len):
+    """Reject any item larger than `max_bytes` before anything is sent.
+
+    Raises:
+        lpipe.exceptions.RecordTooLargeError: lists every oversized item by index
+    """
+    oversized = [
+        (i, n) for i, n in enumerate(size(item) for item in items) if n > max_bytes
+    ]
+    if oversized:
+        desc = ", ".join([f"record {i} is {n} bytes" for i, n in oversized])
+        raise lpipe.exceptions.RecordTooLargeError(
+            f"{len(oversized)} record(s) exceed the limit of {max_bytes} bytes: {desc}"
+        )
+
+
+def get_deadline(context, margin: float = 0):
+    """Get the time (per time.monotonic) at which a lambda invocation will time out.
+
+    Args:
+        context: https://docs.aws.amazon.com/lambda/latest/dg/python-context.html
+        margin (float): seconds to subtract from the deadline
+
+    Returns:
+        float: None if the context can't tell us how much time remains
+    """
+    get_remaining = getattr(context, "get_remaining_time_in_millis", None)
+    if not callable(get_remaining):
+        return None
+    return time.monotonic() + get_remaining() / 1000 - margin
+
+
+def select(selector, kwargs: dict, name: str = "value") -> str:
+    """Resolve a selector (field path or function) against a message's kwargs.
+
+    Raises:
+        lpipe.exceptions.InvalidPayloadError: if the selector did not yield a value
+    """
+    if selector is None:
+        return None
+    if callable(selector):
+        value = selector(kwargs)
+    else:
+        keys = selector.split(".") if isinstance(selector, str) else selector
+        value = mindictive.get_nested(kwargs, keys, None)
+    if value is None or value == "":
+        raise lpipe.exceptions.InvalidPayloadError(
+            f"Unable to select a {name} with {selector} from {kwargs}"
+        )
+    return str(value)
+
+
 def _set_env(env):
     state = {}
     for k, v in env.items():
@@ -0,0 +1,83 @@
+import json
+from enum import Enum
+
+import lpipe.exceptions
+from lpipe import compression
+
+# Never used by msgpack (or JSON, gzip, zstd, or KPL), so it can't be mistaken for one.
+MSGPACK_MAGIC = b"\xc1\x01"
+
+
+class WireFormat(Enum):
+    JSON = 1
+    MSGPACK = 2  # Requires the msgpack package
+
+
+def _msgpack():
+    try:
+        import msgpack
+    except ImportError as e:
+        raise lpipe.exceptions.InvalidConfigurationError(
+            "WireFormat.MSGPACK requires the msgpack package, please install it to proceed"
+        ) from e
+    return msgpack
+
+
+def _default(o):
+    # Mirrors utils.AutoEncoder, so records decode the same as they would from JSON.
+    if isinstance(o, Enum):
+        return str(o)
+    if hasattr(o, "_json"):
+        return o._json()
+    raise TypeError(
+        f"Object of type {o.__class__.__name__} is not msgpack serializable"
+    )
+
+
+def dumps(record, wire_format: WireFormat = None):
+    """Serialize a record.
+
+    Returns:
+        str for WireFormat.JSON (the default), otherwise bytes
+    """
+    if wire_format in (None, WireFormat.JSON):
+        return json.dumps(record, sort_keys=True)
+    if wire_format == WireFormat.MSGPACK:
+        # use_bin_type=False packs bytes as strings, which decode as utf-8 like AutoEncoder.
+        return MSGPACK_MAGIC + _msgpack().packb(
+            record, default=_default, use_bin_type=False
+        )
+    raise lpipe.exceptions.InvalidConfigurationError(
+        f"Unknown wire format {wire_format}"
+    )
+
+
+def loads(data):
+    """Deserialize a record, whatever its wire format and compression.
+
+    Args:
+        data (Union[str, bytes]): as sent, e.g. a kinesis record's data or an sqs message's body
+
+    Raises:
+        json.JSONDecodeError:
+        lpipe.exceptions.InvalidPayloadError:
+    """
+    if isinstance(data, str):
+        if not data.startswith(compression.TEXT_PREFIX):
+            return json.loads(data)
+        data = compression.from_text(data)
+    elif data.startswith(compression.TEXT_PREFIX.encode("ascii")):
+        data = compression.from_text(data.decode("ascii"))
+    data = compression.decompress(data)
+    if data.startswith(MSGPACK_MAGIC):
+        try:
+            return _msgpack().unpackb(
+                data[len(MSGPACK_MAGIC) :], raw=False, strict_map_key=False
+            )
+        except lpipe.exceptions.LPBaseException:
+            raise
+        except Exception as e:
+            raise lpipe.exceptions.InvalidPayloadError(
+                f"Payload contained invalid msgpack. {e}"
+            ) from e
+    return json.loads(data)
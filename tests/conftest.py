@@ -4,6 +4,8 @@ import boto3_fixtures as b3f
 import pytest
 
 import lpipe
+import lpipe.contrib.boto3
+from lpipe.retry import Retry
 from tests import fixtures
 
 logger = logging.getLogger()
@@ -39,3 +41,66 @@ def environment():
 def set_environment(environment):
     with lpipe.utils.set_env(environment()):
         yield
+
+
+class FlakyClient:
+    """A boto3 client whose batch `method` rejects the first entry of every request, `failures` times.
+
+    Args:
+        method (str): e.g. "put_events"
+        entries (str): the method's argument holding the request's entries, e.g. "Entries"
+        respond (function): called with the entries and whether the first was rejected, returns the response
+        failures (int):
+    """
+
+    def __init__(self, method, entries, respond, failures=0):
+        self.entries = entries
+        self.respond = respond
+        self.failures = failures
+        self.requests = []
+        setattr(self, method, self._call)
+
+    def _call(self, **kwargs):
+        entries = kwargs[self.entries]
+        self.requests.append(entries)
+        rejected = self.failures > 0
+        if rejected:
+            self.failures -= 1
+        return {
+            **self.respond(entries, rejected),
+            "ResponseMetadata": {"HTTPStatusCode": 200},
+        }
+
+
+@pytest.fixture
+def flaky_client(monkeypatch):
+    """Patch lpipe's boto3 clients with a FlakyClient, called like its constructor."""
+
+    def _flaky_client(*args, **kwargs):
+        client = FlakyClient(*args, **kwargs)
+        monkeypatch.setattr(lpipe.contrib.boto3, "client", lambda service: client)
+        return client
+
+    return _flaky_client
+
+
+@pytest.fixture(params=[(1, False), (3, True)], ids=["retried", "exhausted"])
+def partial_failure(request, flaky_client):
+    """Check that a batch put resends only the entries a FlakyClient rejected.
+
+    Called with the FlakyClient's method, entries, and respond arguments, and a function
+    sending three records with a given Retry.
+    """
+    failures, raises = request.param
+
+    def _partial_failure(method, entries, respond, send):
+        client = flaky_client(method, entries, respond, failures)
+        retry = Retry(attempts=3, sleep=lambda s: None)
+        if raises:
+            with pytest.raises(lpipe.exceptions.FailCatastrophically):
+                send(retry)
+        else:
+            send(retry)
+            assert [len(r) for r in client.requests] == [3, 1]
+
+    return _partial_failure
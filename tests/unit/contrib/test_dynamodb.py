@@ -0,0 +1,42 @@
+import pytest
+from boto3.dynamodb.types import Binary, TypeSerializer
+
+from lpipe.contrib import dynamodb
+
+
+@pytest.mark.parametrize(
+    "value,expected",
+    [
+        ({"S": "foo"}, "foo"),
+        ({"N": "1"}, 1),
+        ({"N": "1.5"}, 1.5),
+        ({"B": "Zm9v"}, b"foo"),
+        ({"BOOL": False}, False),
+        ({"NULL": True}, None),
+        ({"SS": ["a", "b"]}, ["a", "b"]),
+        ({"NS": ["1", "2.5"]}, [1, 2.5]),
+        ({"BS": ["Zm9v"]}, [b"foo"]),
+        ({"L": [{"S": "a"}, {"N": "1"}]}, ["a", 1]),
+        ({"M": {"a": {"M": {"b": {"L": [{"NULL": True}]}}}}}, {"a": {"b": [None]}}),
+    ],
+)
+def test_deserialize(value, expected):
+    assert dynamodb.deserialize(value) == expected
+
+
+def test_deserialize_unknown_type():
+    with pytest.raises(ValueError):
+        dynamodb.deserialize({"XX": "foo"})
+
+
+def test_deserialize_image():
+    item = {"id": "a", "n": 3, "bin": Binary(b"foo"), "m": {"l": [1, "b"]}}
+    serializer = TypeSerializer()
+    image = {k: serializer.serialize(v) for k, v in item.items()}
+    assert dynamodb.deserialize_image(image) == {
+        "id": "a",
+        "n": 3,
+        "bin": b"foo",
+        "m": {"l": [1, "b"]},
+    }
+    assert dynamodb.deserialize_image(None) is None
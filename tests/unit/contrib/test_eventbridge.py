@@ -0,0 +1,91 @@
+import json
+
+import boto3
+import moto
+import pytest
+
+from lpipe import exceptions, utils
+from lpipe.contrib import eventbridge
+from lpipe.pipeline import put_records
+from lpipe.queue import Queue, QueueType
+
+BUS = "my-event-bus"
+
+
+def test_mock(environment):
+    with utils.set_env(environment(MOCK_AWS=True)):
+        eventbridge.put_event("foobar", {"foo": "bar"})
+
+
+def test_build():
+    assert eventbridge.build({"foo": "bar"}, detail_type="FOO") == {
+        "Source": "lpipe",
+        "DetailType": "FOO",
+        "Detail": '{"foo": "bar"}',
+    }
+
+
+def test_entry_size():
+    entry = eventbridge.build({"foo": "bar"}, source="src", detail_type="FOO")
+    assert eventbridge.entry_size(entry) == len("src") + len("FOO") + len(
+        '{"foo": "bar"}'
+    )
+
+
+@pytest.fixture
+def event_bus(set_environment):
+    with moto.mock_events():
+        boto3.client("events").create_event_bus(Name=BUS)
+        yield BUS
+
+
+def test_batch_put_events(event_bus):
+    responses = eventbridge.batch_put_events(event_bus, [{"i": i} for i in range(15)])
+    assert len(responses) == 2
+    assert [r["FailedEntryCount"] for r in responses] == [0, 0]
+
+
+def test_batch_put_events_too_large(event_bus):
+    with pytest.raises(exceptions.RecordTooLargeError):
+        eventbridge.batch_put_events(
+            event_bus, [{"blob": "x" * eventbridge.MAX_BATCH_BYTES}]
+        )
+
+
+def respond(entries, rejected):
+    results = [{"EventId": str(i)} for i in range(len(entries))]
+    if rejected:
+        results[0] = {"ErrorCode": "ThrottlingException"}
+    return {"FailedEntryCount": int(rejected), "Entries": results}
+
+
+def test_batch_put_events_partial_failure(partial_failure):
+    events = [{"i": i} for i in range(3)]
+    partial_failure(
+        "put_events",
+        "Entries",
+        respond,
+        lambda retry: eventbridge.batch_put_events(BUS, events, retry=retry),
+    )
+
+
+@pytest.mark.parametrize(
+    "kwargs,expected",
+    [
+        ({}, ("lpipe", "FOO")),
+        (
+            {"source": "my.service", "detail_type": "Thing Happened"},
+            ("my.service", "Thing Happened"),
+        ),
+        ({"detail_type": lambda kwargs: kwargs["kind"]}, ("lpipe", "created")),
+    ],
+    ids=["default", "static", "function"],
+)
+def test_queue(flaky_client, kwargs, expected):
+    client = flaky_client("put_events", "Entries", respond)
+    queue = Queue(QueueType.EVENTBRIDGE, path="FOO", name=BUS, **kwargs)
+    put_records(queue, [{"path": "FOO", "kwargs": {"kind": "created"}}])
+    ((entry,),) = client.requests
+    assert (entry["Source"], entry["DetailType"]) == expected
+    assert entry["EventBusName"] == BUS
+    assert json.loads(entry["Detail"]) == {"path": "FOO", "kwargs": {"kind": "created"}}
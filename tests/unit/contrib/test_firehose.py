@@ -0,0 +1,92 @@
+import base64
+
+import boto3
+import moto
+import pytest
+
+from lpipe import exceptions, utils
+from lpipe.contrib import firehose
+from lpipe.pipeline import put_records
+from lpipe.queue import Queue, QueueType
+from tests import fixtures
+
+STREAM = "my-delivery-stream"
+
+
+def test_mock(environment):
+    with utils.set_env(environment(MOCK_AWS=True)):
+        firehose.put_record("foobar", {"foo": "bar"})
+
+
+def test_build():
+    assert firehose.build({"foo": "bar"}) == {"Data": '{"foo": "bar"}\n'}
+
+
+@pytest.fixture
+def delivery_stream(set_environment):
+    with moto.mock_s3(), moto.mock_firehose():
+        boto3.client("s3").create_bucket(
+            Bucket="firehose",
+            CreateBucketConfiguration={
+                "LocationConstraint": fixtures.ENV["AWS_DEFAULT_REGION"]
+            },
+        )
+        boto3.client("firehose").create_delivery_stream(
+            DeliveryStreamName=STREAM,
+            ExtendedS3DestinationConfiguration={
+                "RoleARN": "arn:aws:iam::123456789012:role/firehose",
+                "BucketARN": "arn:aws:s3:::firehose",
+            },
+        )
+        yield STREAM
+
+
+def test_batch_put_records(delivery_stream):
+    responses = firehose.batch_put_records(
+        delivery_stream, [{"i": i} for i in range(5)], batch_size=2
+    )
+    assert len(responses) == 3
+    assert all([utils.check_status(r) for r in responses])
+
+
+def test_batch_put_records_too_large(delivery_stream):
+    with pytest.raises(exceptions.RecordTooLargeError):
+        firehose.batch_put_records(
+            delivery_stream, [{"blob": "x" * firehose.MAX_RECORD_BYTES}]
+        )
+
+
+def respond(records, rejected):
+    results = [{"RecordId": str(i)} for i in range(len(records))]
+    if rejected:
+        results[0] = {"ErrorCode": "ServiceUnavailableException"}
+    return {"FailedPutCount": int(rejected), "RequestResponses": results}
+
+
+def test_batch_put_records_partial_failure(partial_failure):
+    records = [{"i": i} for i in range(3)]
+    partial_failure(
+        "put_record_batch",
+        "Records",
+        respond,
+        lambda retry: firehose.batch_put_records(STREAM, records, retry=retry),
+    )
+
+
+def test_queue(delivery_stream):
+    queue = Queue(QueueType.FIREHOSE, name=delivery_stream)
+    responses = put_records(queue, [{"foo": "bar"}, {"foo": "baz"}])
+    assert responses[0]["FailedPutCount"] == 0
+
+
+def test_build_transformation_records():
+    record = {"recordId": "1", "data": "original"}
+    outputs = [({"foo": "bar"}, None), ({"foo": "baz"}, {"foo": "BAZ"})]
+    ((built,),) = [
+        firehose.build_transformation_records(
+            [(record, firehose.TransformationResult.OK, outputs)]
+        )
+    ]
+    assert built["result"] == "Ok"
+    # Inputs which returned nothing are kept alongside the transformed ones.
+    assert base64.b64decode(built["data"]) == b'{"foo": "bar"}\n{"foo": "BAZ"}\n'
@@ -1,6 +1,6 @@
 import pytest
 
-from lpipe import utils
+from lpipe import envelope, exceptions, kpl, utils
 from lpipe.contrib import kinesis
 from tests import fixtures
 
@@ -14,6 +14,15 @@ class TestBuild:
     def test_build(self):
         result = kinesis.build(record_data={"foo": "bar"})
         assert result["Data"] == '{"foo": "bar"}'
+        assert result["PartitionKey"] == utils.hash(result["Data"])
+        assert "ExplicitHashKey" not in result
+
+    def test_build_with_keys(self):
+        result = kinesis.build(
+            record_data={"foo": "bar"}, partition_key="foo", explicit_hash_key="42"
+        )
+        assert result["PartitionKey"] == "foo"
+        assert result["ExplicitHashKey"] == "42"
 
 
 @pytest.mark.usefixtures("kinesis", "sqs")
@@ -50,3 +59,102 @@ class TestPutRecords:
         )
         assert len(responses) == 1
         assert all([r["ResponseMetadata"]["HTTPStatusCode"] == 200 for r in responses])
+
+    def test_batch_put_records_by_size(self):
+        kinesis_streams = fixtures.KINESIS
+        blob = "x" * (kinesis.MAX_RECORD_BYTES // 2)
+        responses = kinesis.batch_put_records(
+            stream_name=kinesis_streams[0],
+            records=[{"blob": blob, "i": i} for i in range(12)],
+        )
+        # Only 9 half-megabyte records fit under the 5 MB request limit
+        assert [len(r["Records"]) for r in responses] == [9, 3]
+
+    def test_batch_put_records_too_large(self):
+        kinesis_streams = fixtures.KINESIS
+        with pytest.raises(exceptions.RecordTooLargeError):
+            kinesis.batch_put_records(
+                stream_name=kinesis_streams[0],
+                records=[{"foo": "bar"}, {"blob": "x" * kinesis.MAX_RECORD_BYTES}],
+            )
+
+    def test_batch_put_records_partition_key(self):
+        kinesis_streams = fixtures.KINESIS
+        responses = kinesis.batch_put_records(
+            stream_name=kinesis_streams[0],
+            records=[{"id": 1}, {"id": 2}],
+            partition_key=lambda r: str(r["id"]),
+        )
+        assert len(responses) == 1
+        assert all([r["ResponseMetadata"]["HTTPStatusCode"] == 200 for r in responses])
+
+    def test_batch_put_records_rate_limited(self):
+        kinesis_streams = fixtures.KINESIS
+        acquired = []
+
+        class Limiter:
+            def acquire(self, records, nbytes, deadline=None):
+                acquired.append((records, nbytes))
+
+        kinesis.batch_put_records(
+            stream_name=kinesis_streams[0],
+            records=[{"foo": "bar"}, {"lorem": "ipsum"}, {"wiz": "bang"}],
+            batch_size=2,
+            rate_limiter=Limiter(),
+        )
+        assert [records for records, _ in acquired] == [2, 1]
+        assert all([nbytes > 0 for _, nbytes in acquired])
+
+    def test_batch_put_records_envelope(self):
+        kinesis_streams = fixtures.KINESIS
+        responses = kinesis.batch_put_records(
+            stream_name=kinesis_streams[0],
+            records=[{"id": i % 2, "i": i} for i in range(10)],
+            partition_key=lambda r: str(r["id"]),
+            envelope_records=True,
+        )
+        # One envelope per partition key
+        assert len(responses[0]["Records"]) == 2
+
+    def test_pack_by_key(self):
+        packed = kinesis.pack_by_key(
+            [("a", None, {"i": 0}), ("b", None, {"i": 1}), ("a", None, {"i": 2})]
+        )
+        assert packed == [
+            ("a", None, {envelope.KEY: [{"i": 0}, {"i": 2}]}),
+            ("b", None, {envelope.KEY: [{"i": 1}]}),
+        ]
+
+    def test_batch_put_records_aggregate(self):
+        kinesis_streams = fixtures.KINESIS
+        responses = kinesis.batch_put_records(
+            stream_name=kinesis_streams[0],
+            records=[{"i": i} for i in range(10)],
+            aggregate=True,
+        )
+        assert len(responses[0]["Records"]) == 1
+
+    def test_aggregate_entries(self):
+        entries = [
+            kinesis.build({"i": i}, partition_key=str(i % 2)) for i in range(4)
+        ] + [kinesis.build({"blob": "x" * kinesis.MAX_RECORD_BYTES})]
+        aggregated = kinesis.aggregate_entries(entries)
+        # Records are aggregated by key, and the oversized record is left alone.
+        assert [isinstance(e["Data"], bytes) for e in aggregated] == [
+            True,
+            True,
+            False,
+        ]
+        assert [e["PartitionKey"] for e in aggregated[:2]] == ["0", "1"]
+        records = kpl.deaggregate(aggregated[0]["Data"])
+        assert [r.data for r in records] == [b'{"i": 0}', b'{"i": 2}']
+
+    def test_aggregate_entries_without_key(self):
+        blob = "x" * (kinesis.MAX_RECORD_BYTES // 3)
+        entries = [kinesis.build({"i": i, "blob": blob}) for i in range(4)]
+        aggregated = kinesis.aggregate_entries(entries, by_key=False)
+        # Each aggregated record has its own key, so they aren't all sent to one shard.
+        assert len(aggregated) == 2
+        assert len({e["PartitionKey"] for e in aggregated}) == 2
+        for e in aggregated:
+            assert kinesis.record_size(e) <= kinesis.MAX_RECORD_BYTES
@@ -0,0 +1,239 @@
+import datetime
+import gzip
+import json
+from types import SimpleNamespace
+
+import boto3
+import botocore
+import moto
+import pytest
+
+from lpipe import Codec, exceptions, idempotency, process_event, testing, utils
+from lpipe.action import Action
+from lpipe.contrib import s3
+from lpipe.pipeline import EventSourceType
+from lpipe.queue import Queue, QueueType
+from tests import fixtures
+
+BUCKET = "my-archive"
+CONTEXT = SimpleNamespace(function_name="my-function", aws_request_id="abc-123")
+NOW = datetime.datetime(2020, 1, 2, 3, 4, 5, tzinfo=datetime.timezone.utc)
+
+
+@pytest.fixture
+def bucket(set_environment):
+    with moto.mock_s3():
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET,
+            CreateBucketConfiguration={
+                "LocationConstraint": fixtures.ENV["AWS_DEFAULT_REGION"]
+            },
+        )
+        yield BUCKET
+
+
+def list_keys(bucket):
+    return [
+        o["Key"]
+        for o in boto3.client("s3").list_objects_v2(Bucket=bucket).get("Contents", [])
+    ]
+
+
+def read_jsonl(bucket, key):
+    body = gzip.decompress(s3.get_object(bucket, key)).decode("utf-8")
+    return [json.loads(line) for line in body.splitlines()]
+
+
+def test_build():
+    assert s3.build([{"foo": "bar"}, {"foo": "baz"}]) == (
+        b'{"foo": "bar"}\n{"foo": "baz"}\n'
+    )
+
+
+@pytest.mark.parametrize(
+    "context,codec,expected",
+    [
+        (
+            CONTEXT,
+            Codec.GZIP,
+            "archive/my-function/2020/01/02/030405Z-abc-123.jsonl.gz",
+        ),
+        (
+            None,
+            None,
+            f"archive/lpipe/2020/01/02/030405Z-{utils.hash(b'body')}.jsonl",
+        ),
+    ],
+    ids=["context", "no-context"],
+)
+def test_object_key(context, codec, expected):
+    with utils.set_env({"FUNCTION_NAME": "lpipe"}):
+        key = s3.object_key("archive/", b"body", context=context, now=NOW, codec=codec)
+    assert key == expected
+
+
+def test_batch_put_records(bucket):
+    records = [{"i": i} for i in range(5)]
+    s3.batch_put_records(bucket, records, prefix="archive/", context=CONTEXT, now=NOW)
+    (key,) = list_keys(bucket)
+    assert key == "archive/my-function/2020/01/02/030405Z-abc-123.jsonl.gz"
+    assert read_jsonl(bucket, key) == records
+
+
+def test_batch_put_records_empty(bucket):
+    assert s3.batch_put_records(bucket, []) is None
+    assert list_keys(bucket) == []
+
+
+@pytest.mark.parametrize(
+    "queue",
+    [
+        Queue(QueueType.S3, path="LEAF", url=f"s3://{BUCKET}/archive/"),
+        Queue(QueueType.S3, path="LEAF", name=BUCKET),
+    ],
+    ids=["url", "name"],
+)
+def test_process_event(bucket, queue):
+    response = process_event(
+        event=testing.raw_payload(
+            [{"path": "ROOT", "kwargs": {"foo": i}} for i in range(20)]
+        ),
+        context=CONTEXT,
+        paths={"ROOT": [Action(queues=[queue], required_params=["foo"])]},
+        event_source_type=EventSourceType.RAW,
+    )
+    assert response["stats"] == {"received": 20, "successes": 20}
+    # Every record routed to the queue during the invocation was written to one object.
+    (key,) = list_keys(bucket)
+    assert key.startswith("archive/" if queue.url else "my-function/")
+    assert key.endswith("-abc-123.jsonl.gz")
+    assert [r["kwargs"]["foo"] for r in read_jsonl(bucket, key)] == list(range(20))
+
+
+RECORDS = [{"i": i, "name": f"record {i}"} for i in range(50)]
+JSONL = "".join([json.dumps(r) + "\n" for r in RECORDS]).encode("utf-8")
+
+
+@pytest.mark.parametrize(
+    "body",
+    [
+        JSONL,
+        JSONL.replace(b"\n", b"\n\n"),
+        gzip.compress(JSONL),
+        # Concatenated gzip members are one valid gzip file.
+        gzip.compress(JSONL[:500]) + gzip.compress(JSONL[500:]),
+    ],
+    ids=["jsonl", "blank-lines", "gzip", "gzip-members"],
+)
+@pytest.mark.parametrize("max_workers", [1, 3])
+def test_stream_records(bucket, body, max_workers):
+    s3.put_object(bucket, "data.jsonl", body)
+    lines = s3.stream_records(
+        bucket, "data.jsonl", chunk_size=64, max_workers=max_workers
+    )
+    assert [json.loads(line) for line in lines] == RECORDS
+
+
+@pytest.mark.parametrize("key", ["data.csv", "data.csv.gz"])
+def test_stream_records_csv(bucket, key):
+    body = b'id,note\n1,plain\n2,"multi\nline, quoted"\n'
+    s3.put_object(bucket, key, gzip.compress(body) if key.endswith(".gz") else body)
+    assert list(s3.stream_records(bucket, key, chunk_size=8)) == [
+        {"id": "1", "note": "plain"},
+        {"id": "2", "note": "multi\nline, quoted"},
+    ]
+
+
+def test_iter_chunks_bounded(bucket):
+    s3.put_object(bucket, "data.jsonl", JSONL)
+    chunks = list(s3.iter_chunks(bucket, "data.jsonl", chunk_size=100, max_workers=4))
+    assert max([len(c) for c in chunks]) == 100
+    assert b"".join(chunks) == JSONL
+
+
+def test_process_event_s3_source(bucket):
+    calls = []
+
+    def _handle(i, name, **kwargs):
+        calls.append(i)
+
+    s3.put_object(bucket, "in/part 1.jsonl.gz", gzip.compress(JSONL + b"not json\n"))
+    response = process_event(
+        event=testing.s3_payload(bucket, ["in/part 1.jsonl.gz"]),
+        context=CONTEXT,
+        paths={"HANDLE": [_handle]},
+        default_path="HANDLE",
+        event_source_type=EventSourceType.S3,
+    )
+    # Each line is tracked as its own record; the bad line is dropped on its own.
+    assert response["stats"] == {"received": 51, "successes": 50}
+    assert calls == list(range(50))
+
+
+@pytest.mark.parametrize(
+    "key,body",
+    [
+        ("in/data.jsonl", JSONL + b'{"i": "\xff"}\n'),
+        ("in/data.csv", b"i,name\n1,a\n2,\xff\n3,c\n"),
+    ],
+    ids=["jsonl", "csv"],
+)
+def test_process_event_s3_source_invalid_utf8(bucket, key, body):
+    s3.put_object(bucket, key, body)
+    response = process_event(
+        event=testing.s3_payload(bucket, [key]),
+        context=CONTEXT,
+        paths={"HANDLE": [lambda i, name, **kwargs: None]},
+        default_path="HANDLE",
+        event_source_type=EventSourceType.S3,
+    )
+    # Only the undecodable line is dropped.
+    n_lines = len(body.strip().split(b"\n")) - (1 if key.endswith(".csv") else 0)
+    assert response["stats"] == {"received": n_lines, "successes": n_lines - 1}
+
+
+def test_process_event_s3_source_missing(bucket):
+    s3.put_object(bucket, "in/data.jsonl", JSONL)
+    response = process_event(
+        event=testing.s3_payload(bucket, ["in/missing.jsonl", "in/data.jsonl"]),
+        context=CONTEXT,
+        paths={"HANDLE": [lambda i, name, **kwargs: None]},
+        default_path="HANDLE",
+        event_source_type=EventSourceType.S3,
+    )
+    assert response["stats"] == {"received": 51, "successes": 50}
+
+
+def test_process_event_s3_source_unavailable(bucket, monkeypatch):
+    def _iter_chunks(bucket, key, **kwargs):
+        raise botocore.exceptions.ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "GetObject"
+        )
+        yield
+
+    monkeypatch.setattr(s3, "iter_chunks", _iter_chunks)
+    with pytest.raises(exceptions.FailCatastrophically):
+        process_event(
+            event=testing.s3_payload(bucket, ["in/data.jsonl"]),
+            context=CONTEXT,
+            paths={"HANDLE": [lambda i, name, **kwargs: None]},
+            default_path="HANDLE",
+            event_source_type=EventSourceType.S3,
+        )
+
+
+def test_process_event_s3_source_idempotency(bucket):
+    calls = []
+    s3.put_object(bucket, "in/data.csv", b"name\nfoo\nfoo\n")
+    store = idempotency.MemoryStore()
+    for _ in range(2):
+        process_event(
+            event=testing.s3_payload(bucket, ["in/data.csv"]),
+            context=CONTEXT,
+            paths={"HANDLE": [lambda name, **kwargs: calls.append(name)]},
+            default_path="HANDLE",
+            event_source_type=EventSourceType.S3,
+            idempotency_store=store,
+        )
+    # Identical rows are distinct records, but aren't run again on a redrive.
+    assert calls == ["foo", "foo"]
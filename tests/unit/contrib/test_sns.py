@@ -0,0 +1,150 @@
+import json
+
+import boto3
+import boto3_fixtures as b3f
+import moto
+import pytest
+from decouple import config
+
+from lpipe import exceptions, utils
+from lpipe.contrib import sns
+from lpipe.pipeline import EventSourceType, process_event, put_records
+from lpipe.queue import Queue, QueueType
+
+
+def test_mock(environment):
+    with utils.set_env(environment(MOCK_AWS=True)):
+        sns.publish("arn:aws:sns:us-east-2:123456789012:foobar", {"foo": "bar"})
+
+
+def test_build_attributes():
+    assert sns.build_attributes(
+        {"s": "foo", "n": 1, "b": True, "l": ["a", "b"], "bin": b"x", "none": None}
+    ) == {
+        "s": {"DataType": "String", "StringValue": "foo"},
+        "n": {"DataType": "Number", "StringValue": "1"},
+        "b": {"DataType": "String", "StringValue": "true"},
+        "l": {"DataType": "String.Array", "StringValue": '["a", "b"]'},
+        "bin": {"DataType": "Binary", "BinaryValue": b"x"},
+    }
+
+
+def test_build_fifo():
+    msg = sns.build({"foo": "bar"}, message_group_id="g")
+    assert msg["MessageGroupId"] == "g"
+    assert msg["MessageDeduplicationId"] == utils.hash(msg["Message"])
+
+
+def test_message_size():
+    msg = sns.build({"foo": "bar"}, message_attributes={"color": "red"})
+    assert sns.message_size(msg) == len('{"foo": "bar"}') + len("color") + len(
+        "String"
+    ) + len("red")
+
+
+@pytest.fixture
+def topic(set_environment):
+    """A topic with an sqs queue subscribed to it."""
+    with moto.mock_sns(), moto.mock_sqs():
+        topic_arn = boto3.client("sns").create_topic(Name="topic")["TopicArn"]
+        queue_url = boto3.client("sqs").create_queue(QueueName="subscriber")["QueueUrl"]
+        queue_arn = boto3.client("sqs").get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=["QueueArn"]
+        )["Attributes"]["QueueArn"]
+        boto3.client("sns").subscribe(
+            TopicArn=topic_arn, Protocol="sqs", Endpoint=queue_arn
+        )
+        yield topic_arn, queue_url
+
+
+def receive(queue_url):
+    """Receive every notification delivered to a queue, in order."""
+    messages = []
+    client = boto3.client("sqs")
+    while True:
+        resp = client.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10)
+        if not resp.get("Messages"):
+            return messages
+        for m in resp["Messages"]:
+            messages.append(m)
+            client.delete_message(QueueUrl=queue_url, ReceiptHandle=m["ReceiptHandle"])
+
+
+def attributes(notification):
+    # moto delivers a batch's message attributes as they were sent, as Name/Value pairs.
+    return {
+        a["Name"]: a["Value"]["StringValue"]
+        for a in notification.get("MessageAttributes", [])
+    }
+
+
+def test_batch_publish(topic):
+    topic_arn, queue_url = topic
+    records = [{"i": i, "color": "red" if i % 2 else "blue"} for i in range(15)]
+    responses = sns.batch_publish(
+        topic_arn, records, message_attributes=lambda r: {"color": r["color"]}
+    )
+    assert [len(r["Successful"]) for r in responses] == [10, 5]
+    notifications = [json.loads(m["Body"]) for m in receive(queue_url)]
+    assert sorted([json.loads(n["Message"])["i"] for n in notifications]) == list(
+        range(15)
+    )
+    for n in notifications:
+        assert attributes(n) == {"color": json.loads(n["Message"])["color"]}
+
+
+def test_queue(topic):
+    topic_arn, queue_url = topic
+    queue = Queue(
+        QueueType.SNS,
+        path="FOO",
+        url=topic_arn,
+        message_attributes=lambda kwargs: {"color": kwargs["color"]},
+    )
+    put_records(
+        queue,
+        [
+            {"path": "FOO", "kwargs": {"color": "red"}},
+            {"path": "FOO", "kwargs": {"color": "blue"}},
+        ],
+    )
+    messages = receive(queue_url)
+    assert sorted([attributes(json.loads(m["Body"]))["color"] for m in messages]) == [
+        "blue",
+        "red",
+    ]
+    # The subscriber receives them as lpipe messages.
+    calls = []
+    process_event(
+        event={
+            "Records": [
+                {"body": m["Body"], "messageId": m["MessageId"]} for m in messages
+            ]
+        },
+        context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+        paths={"FOO": [lambda color, **kwargs: calls.append(color)]},
+        event_source_type=EventSourceType.SQS,
+    )
+    assert sorted(calls) == ["blue", "red"]
+
+
+def respond(entries, rejected):
+    failed = []
+    if rejected:
+        failed = [
+            {"Id": entries[0]["Id"], "Code": "InternalError", "SenderFault": False}
+        ]
+    return {"Failed": failed}
+
+
+TOPIC_ARN = "arn:aws:sns:us-east-2:123456789012:topic"
+
+
+def test_batch_publish_partial_failure(partial_failure):
+    records = [{"i": i} for i in range(3)]
+    partial_failure(
+        "publish_batch",
+        "PublishBatchRequestEntries",
+        respond,
+        lambda retry: sns.batch_publish(TOPIC_ARN, records, retry=retry),
+    )
@@ -1,8 +1,10 @@
 import boto3
 import pytest
 
+from lpipe import exceptions
 from lpipe.contrib import sqs
 from lpipe.utils import check_status, set_env
+from lpipe.wire import WireFormat
 from tests import fixtures
 
 
@@ -60,3 +62,55 @@ class TestPutMessages:
         )
         assert len(responses) == 1
         assert all([check_status(r) for r in responses])
+
+    def test_batch_put_messages_by_size(self):
+        sqs_queues = fixtures.SQS
+        queue_url = sqs.get_queue_url(sqs_queues[0])
+        blob = "x" * (sqs.MAX_BATCH_BYTES // 3)
+        responses = sqs.batch_put_messages(
+            queue_url=queue_url, messages=[{"blob": blob, "i": i} for i in range(4)]
+        )
+        # Only two messages of a third of the limit (plus json overhead) fit per batch
+        assert len(responses) == 2
+        assert all([check_status(r) for r in responses])
+
+    def test_batch_put_messages_too_large(self):
+        sqs_queues = fixtures.SQS
+        queue_url = sqs.get_queue_url(sqs_queues[0])
+        with pytest.raises(exceptions.RecordTooLargeError):
+            sqs.batch_put_messages(
+                queue_url=queue_url, messages=[{"blob": "x" * sqs.MAX_BATCH_BYTES}]
+            )
+
+    def test_batch_put_messages_duplicates(self):
+        sqs_queues = fixtures.SQS
+        queue_url = sqs.get_queue_url(sqs_queues[0])
+        responses = sqs.batch_put_messages(
+            queue_url=queue_url, messages=[{"foo": "bar"}, {"foo": "bar"}]
+        )
+        assert len(responses[0]["Successful"]) == 2
+
+    def test_batch_put_messages_envelope(self):
+        sqs_queues = fixtures.SQS
+        queue_url = sqs.get_queue_url(sqs_queues[0])
+        responses = sqs.batch_put_messages(
+            queue_url=queue_url,
+            messages=[{"i": i} for i in range(25)],
+            envelope_messages=True,
+        )
+        assert len(responses) == 1
+        assert len(responses[0]["Successful"]) == 1
+
+    def test_batch_put_messages_envelope_msgpack(self):
+        pytest.importorskip("msgpack")
+        sqs_queues = fixtures.SQS
+        queue_url = sqs.get_queue_url(sqs_queues[0])
+        messages = [{"blob": "x" * 1000, "i": i} for i in range(300)]
+        responses = sqs.batch_put_messages(
+            queue_url=queue_url,
+            messages=messages,
+            envelope_messages=True,
+            wire_format=WireFormat.MSGPACK,
+        )
+        # Envelopes leave room for the base64 encoding of msgpack message bodies.
+        assert [len(r["Successful"]) for r in responses] == [1, 1]
@@ -0,0 +1,187 @@
+import json
+
+import boto3
+import boto3_fixtures as b3f
+import botocore
+import moto
+import pytest
+from decouple import config
+
+from lpipe import claimcheck, compression, exceptions, testing
+from lpipe.claimcheck import ClaimCheck
+from lpipe.compression import Codec
+from lpipe.contrib import sqs
+from lpipe.pipeline import EventSourceType, process_event
+from lpipe.queue import Queue, QueueType
+from tests import fixtures
+
+BUCKET = "claim-check"
+RECORD = {"path": "ECHO", "kwargs": {"blob": "x" * (sqs.MAX_BATCH_BYTES + 1)}}
+
+
+@pytest.fixture
+def bucket(set_environment):
+    with moto.mock_s3():
+        boto3.client("s3").create_bucket(
+            Bucket=BUCKET,
+            CreateBucketConfiguration={
+                "LocationConstraint": fixtures.ENV["AWS_DEFAULT_REGION"]
+            },
+        )
+        claimcheck._get_object.cache_clear()
+        yield BUCKET
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        json.dumps(RECORD),
+        compression.maybe_compress(json.dumps(RECORD), Codec.GZIP),
+        compression.compress_text(json.dumps(RECORD), Codec.GZIP),
+    ],
+    ids=["json", "gzip", "gzip_text"],
+)
+def test_round_trip(bucket, data):
+    pointer = ClaimCheck(bucket).offload(data)
+    assert len(json.dumps(pointer)) < 1024
+    assert claimcheck.retrieve(pointer) == RECORD
+
+
+def test_not_a_claim_check():
+    assert claimcheck.retrieve(RECORD) == RECORD
+
+
+def test_missing(bucket):
+    with pytest.raises(exceptions.InvalidPayloadError):
+        claimcheck.retrieve(
+            {claimcheck.KEY: {"bucket": bucket, "key": "lpipe/claim-check/missing"}}
+        )
+
+
+def test_unavailable(monkeypatch):
+    def _get_object(bucket, key):
+        raise botocore.exceptions.ClientError(
+            {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}}, "GetObject"
+        )
+
+    monkeypatch.setattr(claimcheck, "_get_object", _get_object)
+    with pytest.raises(exceptions.FailCatastrophically):
+        claimcheck.retrieve(
+            {claimcheck.KEY: {"bucket": BUCKET, "key": "lpipe/claim-check/foo"}}
+        )
+
+
+def test_malformed():
+    with pytest.raises(exceptions.InvalidPayloadError):
+        claimcheck.retrieve({claimcheck.KEY: "foo"})
+
+
+def test_cached(bucket):
+    pointer = ClaimCheck(bucket).offload(json.dumps(RECORD))
+    claimcheck.retrieve(pointer)
+    boto3.client("s3").delete_object(Bucket=bucket, Key=pointer[claimcheck.KEY]["key"])
+    assert claimcheck.retrieve(pointer) == RECORD
+
+
+@pytest.mark.usefixtures("sqs")
+class TestQueue:
+    def test_sqs(self, bucket):
+        queue_url = sqs.get_queue_url(fixtures.SQS[0])
+        queue = Queue(QueueType.SQS, url=queue_url, claim_check=ClaimCheck(bucket))
+        sqs.batch_put_messages(
+            queue_url,
+            [RECORD, {"path": "ECHO", "kwargs": {"blob": "small"}}],
+            claim_check=queue.claim_check,
+        )
+        messages = boto3.client("sqs").receive_message(
+            QueueUrl=queue_url, MaxNumberOfMessages=10
+        )["Messages"]
+        response = process_event(
+            event={
+                "Records": [
+                    {"body": m["Body"], "messageId": str(i)}
+                    for i, m in enumerate(messages)
+                ]
+            },
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"ECHO": [lambda blob, **kwargs: len(blob)]},
+            event_source_type=EventSourceType.SQS,
+        )
+        assert sorted(response["output"]) == [5, len(RECORD["kwargs"]["blob"])]
+
+    def test_sqs_envelope(self, bucket):
+        queue_url = sqs.get_queue_url(fixtures.SQS[0])
+        small = [{"path": "ECHO", "kwargs": {"blob": str(i)}} for i in range(3)]
+        sqs.batch_put_messages(
+            queue_url,
+            small + [RECORD],
+            envelope_messages=True,
+            claim_check=ClaimCheck(bucket),
+        )
+        messages = boto3.client("sqs").receive_message(
+            QueueUrl=queue_url, MaxNumberOfMessages=10
+        )["Messages"]
+        # The small records are enveloped; the large one is claim checked on its own.
+        assert len(messages) == 2
+        response = process_event(
+            event={
+                "Records": [
+                    {"body": m["Body"], "messageId": str(i)}
+                    for i, m in enumerate(messages)
+                ]
+            },
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"ECHO": [lambda blob, **kwargs: len(blob)]},
+            event_source_type=EventSourceType.SQS,
+        )
+        assert sorted(response["output"]) == [1, 1, 1, len(RECORD["kwargs"]["blob"])]
+
+    def test_missing(self, bucket):
+        queue_url = sqs.get_queue_url(fixtures.SQS[0])
+        missing = {claimcheck.KEY: {"bucket": bucket, "key": "lpipe/claim-check/gone"}}
+        response = process_event(
+            event=testing.sqs_payload(
+                [missing, {"path": "ECHO", "kwargs": {"blob": "small"}}]
+            ),
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"ECHO": [lambda blob, **kwargs: len(blob)]},
+            event_source_type=EventSourceType.SQS,
+            dlq=Queue(QueueType.SQS, url=queue_url),
+        )
+        assert response["output"] == [5]
+        assert response["stats"]["dead_letters"] == 1
+        messages = boto3.client("sqs").receive_message(QueueUrl=queue_url)["Messages"]
+        assert (
+            json.loads(messages[0]["Body"])["record"]
+            == testing.sqs_payload([missing])["Records"][0]
+        )
+
+    def test_unavailable(self, bucket, monkeypatch):
+        calls = []
+        pointer = ClaimCheck(bucket).offload(json.dumps(RECORD))
+
+        def _get_object(bucket, key):
+            raise botocore.exceptions.ClientError(
+                {"Error": {"Code": "AccessDenied", "Message": "Access Denied"}},
+                "GetObject",
+            )
+
+        monkeypatch.setattr(claimcheck, "_get_object", _get_object)
+        with pytest.raises(exceptions.FailCatastrophically):
+            process_event(
+                event=testing.sqs_payload(
+                    [pointer, {"path": "ECHO", "kwargs": {"blob": "small"}}]
+                ),
+                context=b3f.awslambda.MockContext(
+                    function_name=config("FUNCTION_NAME")
+                ),
+                paths={"ECHO": [lambda blob, **kwargs: calls.append(blob)]},
+                event_source_type=EventSourceType.SQS,
+            )
+        # The rest of the batch still ran.
+        assert calls == ["small"]
+
+    def test_too_large_without_claim_check(self, set_environment):
+        queue_url = sqs.get_queue_url(fixtures.SQS[0])
+        with pytest.raises(exceptions.RecordTooLargeError):
+            sqs.batch_put_messages(queue_url, [RECORD])
@@ -0,0 +1,72 @@
+import json
+
+import pytest
+
+from lpipe import compression, exceptions
+from lpipe.compression import Codec
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+DATA = json.dumps([{"foo": "bar", "i": i} for i in range(100)])
+
+
+def test_gzip():
+    compressed = compression.maybe_compress(DATA, Codec.GZIP, threshold=0)
+    assert isinstance(compressed, bytes)
+    assert len(compressed) < len(DATA)
+    assert compression.decompress(compressed).decode("utf-8") == DATA
+
+
+def test_gzip_deterministic():
+    compressed = compression.compress(DATA.encode("utf-8"), Codec.GZIP)
+    # The header's mtime is zeroed, so the same data always compresses the same.
+    assert compressed[4:8] == b"\x00\x00\x00\x00"
+    assert compression.compress(DATA.encode("utf-8"), Codec.GZIP) == compressed
+
+
+def test_threshold():
+    assert compression.maybe_compress(DATA, Codec.GZIP, threshold=len(DATA) + 1) == DATA
+
+
+def test_no_codec():
+    assert compression.maybe_compress(DATA, None, threshold=0) == DATA
+
+
+def test_incompressible():
+    assert compression.maybe_compress('"x"', Codec.GZIP, threshold=0) == '"x"'
+
+
+def test_text():
+    text = compression.compress_text(DATA, Codec.GZIP, threshold=0)
+    assert text.startswith(compression.TEXT_PREFIX)
+    assert compression.decompress_text(text) == DATA
+
+
+@pytest.mark.parametrize("data", [DATA.encode("utf-8"), b""])
+def test_decompress_passthrough(data):
+    assert compression.decompress(data) == data
+
+
+def test_decompress_text_passthrough():
+    assert compression.decompress_text(DATA) == DATA
+
+
+def test_decompress_corrupt():
+    with pytest.raises(exceptions.InvalidPayloadError):
+        compression.decompress(compression.MAGIC[Codec.GZIP] + b"garbage")
+
+
+@pytest.mark.skipif(zstandard is None, reason="zstandard is not installed")
+def test_zstd():
+    compressed = compression.maybe_compress(DATA, Codec.ZSTD, threshold=0)
+    assert compressed.startswith(compression.MAGIC[Codec.ZSTD])
+    assert compression.decompress(compressed).decode("utf-8") == DATA
+
+
+@pytest.mark.skipif(zstandard is not None, reason="zstandard is installed")
+def test_zstd_not_installed():
+    with pytest.raises(exceptions.InvalidConfigurationError):
+        compression.compress(DATA.encode("utf-8"), Codec.ZSTD)
@@ -0,0 +1,67 @@
+import json
+
+import pytest
+
+from lpipe import compression, envelope, exceptions, wire
+from lpipe.wire import WireFormat
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def test_pack_unpack():
+    records = [{"i": i} for i in range(5)]
+    envelopes = envelope.pack(records, max_bytes=1024)
+    assert len(envelopes) == 1
+    assert envelope.unpack(envelopes[0]) == records
+
+
+def test_pack_by_size():
+    records = [{"blob": "x" * 100, "i": i} for i in range(10)]
+    envelopes = envelope.pack(records, max_bytes=400)
+    assert all([len(json.dumps(e, sort_keys=True)) <= 400 for e in envelopes])
+    assert [len(envelope.unpack(e)) for e in envelopes] == [3, 3, 3, 1]
+    # Records keep their order.
+    assert [r for e in envelopes for r in envelope.unpack(e)] == records
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+@pytest.mark.parametrize("text", [False, True])
+def test_pack_msgpack(text):
+    records = [{"f": 0.5, "i": i} for i in range(100)] + [{"blob": "x" * 700}]
+    envelopes = envelope.pack(records, 1024, wire_format=WireFormat.MSGPACK, text=text)
+    for e in envelopes:
+        data = wire.dumps(e, WireFormat.MSGPACK)
+        assert len(compression.to_text(data) if text else data) <= 1024
+    assert [r for e in envelopes for r in envelope.unpack(e)] == records
+
+
+def test_pack_keep_oversized():
+    records = [{"i": 0}, {"i": 1}, {"blob": "x" * 400}, {"i": 2}]
+    packed = envelope.pack(records, max_bytes=400, keep_oversized=True)
+    # The oversized record is left out of the envelopes, in place.
+    assert packed == [
+        {envelope.KEY: records[:2]},
+        records[2],
+        {envelope.KEY: records[3:]},
+    ]
+
+
+def test_pack_too_large():
+    with pytest.raises(exceptions.RecordTooLargeError):
+        envelope.pack([{"blob": "x" * 400}], max_bytes=400)
+
+
+@pytest.mark.parametrize(
+    "record",
+    [{"path": "FOO", "kwargs": {}}, {"foo": "bar"}, [1, 2], None, "envelope"],
+)
+def test_unpack_not_envelope(record):
+    assert envelope.unpack(record) is None
+
+
+def test_unpack_malformed():
+    with pytest.raises(exceptions.InvalidPayloadError):
+        envelope.unpack({envelope.KEY: "foo"})
@@ -0,0 +1,276 @@
+import boto3
+import boto3_fixtures as b3f
+import moto
+import pytest
+from decouple import config
+
+from lpipe import exceptions, idempotency, pipeline, testing
+from lpipe.payload import Payload
+from lpipe.pipeline import EventSourceType, process_event
+from lpipe.queue import Queue, QueueType
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_incomplete_store():
+    class GetOnly(idempotency.Store):
+        def get(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnly()
+
+
+class BrokenStore(idempotency.Store):
+    def __init__(self, get=False, put=False):
+        self.fail = {"get": get, "put": put}
+
+    def get(self, key):
+        if self.fail["get"]:
+            raise ConnectionResetError()
+        return None
+
+    def put(self, key, result):
+        if self.fail["put"]:
+            raise ConnectionResetError()
+
+
+class TestMemoryStore:
+    def test_get_put(self):
+        store = idempotency.MemoryStore()
+        assert store.get("foo") is None
+        store.put("foo", "bar")
+        assert store.get("foo") == {"result": "bar"}
+        store.put("none", None)
+        assert store.get("none") == {"result": None}
+
+    def test_lru(self):
+        store = idempotency.MemoryStore(maxsize=2)
+        store.put("a", 1)
+        store.put("b", 2)
+        store.get("a")
+        store.put("c", 3)
+        assert store.get("b") is None
+        assert store.get("a") == {"result": 1}
+        assert store.get("c") == {"result": 3}
+
+    def test_ttl(self):
+        clock = FakeClock()
+        store = idempotency.MemoryStore(ttl=10, clock=clock)
+        store.put("foo", "bar")
+        clock.now = 9
+        assert store.get("foo")
+        clock.now = 10
+        assert store.get("foo") is None
+
+
+@pytest.fixture
+def dynamodb_table(set_environment):
+    with moto.mock_dynamodb2():
+        boto3.client("dynamodb").create_table(
+            TableName="idempotency",
+            KeySchema=[{"AttributeName": "id", "KeyType": "HASH"}],
+            AttributeDefinitions=[{"AttributeName": "id", "AttributeType": "S"}],
+            BillingMode="PAY_PER_REQUEST",
+        )
+        yield "idempotency"
+
+
+class TestDynamoDBStore:
+    def test_get_put(self, dynamodb_table):
+        store = idempotency.DynamoDBStore(dynamodb_table)
+        assert store.get("foo") is None
+        store.put("foo", {"bar": [1, 2]})
+        assert store.get("foo") == {"result": {"bar": [1, 2]}}
+
+    def test_unserializable_result(self, dynamodb_table):
+        store = idempotency.DynamoDBStore(dynamodb_table)
+        store.put("foo", object())
+        assert store.get("foo") == {"result": None}
+
+    def test_expired(self, dynamodb_table):
+        store = idempotency.DynamoDBStore(dynamodb_table, ttl=-1)
+        store.put("foo", "bar")
+        assert store.get("foo") is None
+
+
+class TestGetKey:
+    def test_identifier(self):
+        payload = Payload(path="FOO", kwargs={"foo": "bar"})
+        assert idempotency.get_key(payload, identifier="abc") == "abc"
+
+    def test_identifier_with_event_source(self):
+        payload = Payload(path="FOO", kwargs={}, event_source="arn:foo")
+        assert idempotency.get_key(payload, identifier="abc") == "arn:foo:abc"
+
+    def test_selector(self):
+        a = Payload(path="FOO", kwargs={"id": 1, "foo": "bar"})
+        b = Payload(path="FOO", kwargs={"id": 1, "foo": "wiz"})
+        c = Payload(path="BAR", kwargs={"id": 1, "foo": "bar"})
+        assert idempotency.get_key(a, "1", selector="id") == idempotency.get_key(
+            b, "2", selector="id"
+        )
+        assert idempotency.get_key(a, selector="id") != idempotency.get_key(
+            c, selector="id"
+        )
+
+    def test_hash(self):
+        a = Payload(path="FOO", kwargs={"foo": "bar"})
+        b = Payload(path="FOO", kwargs={"foo": "wiz"})
+        assert idempotency.get_key(a) == idempotency.get_key(a)
+        assert idempotency.get_key(a) != idempotency.get_key(b)
+
+
+class TestProcessEvent:
+    def run(self, store, payloads, event_source_type, encoder, **kwargs):
+        calls = []
+
+        def _count(foo, **kwargs):
+            calls.append(foo)
+            return foo.upper()
+
+        response = process_event(
+            event=encoder(payloads),
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"COUNT": [_count]},
+            default_path="COUNT",
+            event_source_type=event_source_type,
+            idempotency_store=store,
+            **kwargs,
+        )
+        return response, calls
+
+    def test_message_id(self, set_environment):
+        store = idempotency.MemoryStore()
+        payloads = [{"foo": "bar"}, {"foo": "wiz"}]
+        args = (store, payloads, EventSourceType.SQS, testing.sqs_payload)
+        response, calls = self.run(*args)
+        assert calls == ["bar", "wiz"]
+        assert response["output"] == ["BAR", "WIZ"]
+        response, calls = self.run(*args)
+        assert calls == []
+        assert response["stats"] == {"received": 2, "successes": 2}
+        assert response["output"] == ["BAR", "WIZ"]
+
+    @pytest.mark.parametrize(
+        "event_source_type,encoder",
+        [
+            (EventSourceType.SNS, testing.sns_payload),
+            (EventSourceType.KAFKA, testing.kafka_payload),
+        ],
+    )
+    def test_identical_messages(self, set_environment, event_source_type, encoder):
+        # Distinct messages with identical contents are each run once.
+        store = idempotency.MemoryStore()
+        payloads = [{"foo": "bar"}, {"foo": "bar"}]
+        response, calls = self.run(store, payloads, event_source_type, encoder)
+        assert calls == ["bar", "bar"]
+        response, calls = self.run(store, payloads, event_source_type, encoder)
+        assert calls == []
+
+    def test_eventbridge_id(self, set_environment):
+        store = idempotency.MemoryStore()
+        for event_id, expected in [("1", ["bar"]), ("2", ["bar"]), ("1", [])]:
+            response, calls = self.run(
+                store,
+                {"foo": "bar"},
+                EventSourceType.EVENTBRIDGE,
+                lambda p: testing.eventbridge_payload(p, event_id=event_id),
+            )
+            assert calls == expected
+
+    def test_selector(self, set_environment):
+        store = idempotency.MemoryStore()
+        payloads = [{"foo": "bar"}, {"foo": "bar"}, {"foo": "wiz"}]
+        response, calls = self.run(
+            store,
+            payloads,
+            EventSourceType.RAW,
+            testing.raw_payload,
+            idempotency_key="foo",
+        )
+        assert calls == ["bar", "wiz"]
+        assert response["output"] == ["BAR", "BAR", "WIZ"]
+
+    def test_get_failure(self, set_environment):
+        # The record is retried, rather than run without knowing if it's completed.
+        with pytest.raises(exceptions.FailCatastrophically):
+            self.run(
+                BrokenStore(get=True),
+                [{"foo": "bar"}],
+                EventSourceType.SQS,
+                testing.sqs_payload,
+            )
+
+    def test_put_failure(self, set_environment):
+        # The record is done, so redriving it would only run it again.
+        response, calls = self.run(
+            BrokenStore(put=True),
+            [{"foo": "bar"}],
+            EventSourceType.SQS,
+            testing.sqs_payload,
+        )
+        assert calls == ["bar"]
+        assert response["stats"] == {"received": 1, "successes": 1}
+
+    def test_buffered_queue_redrive(self, set_environment, monkeypatch):
+        # Records aren't marked completed until their buffered output is sent, so a
+        # redrive after a failed flush sends them again rather than skipping them.
+        calls, sent = [], []
+
+        def _put_records(queue, records, **kwargs):
+            if not sent:
+                sent.append(None)
+                raise RuntimeError("send failed")
+            sent.append(records)
+
+        def _forward(foo, **kwargs):
+            calls.append(foo)
+            return Payload(queue=queue, kwargs={"foo": foo})
+
+        monkeypatch.setattr(pipeline, "put_records", _put_records)
+        store = idempotency.MemoryStore()
+        queue = Queue(
+            QueueType.SQS, url="https://queue.amazonaws.com/1/foo", envelope=True
+        )
+
+        def run():
+            return process_event(
+                event=testing.sqs_payload([{"foo": "bar"}, {"foo": "wiz"}]),
+                context=b3f.awslambda.MockContext(
+                    function_name=config("FUNCTION_NAME")
+                ),
+                paths={"FORWARD": [_forward]},
+                default_path="FORWARD",
+                event_source_type=EventSourceType.SQS,
+                idempotency_store=store,
+            )
+
+        with pytest.raises(exceptions.FailCatastrophically):
+            run()
+        run()
+        assert calls == ["bar", "wiz", "bar", "wiz"]
+        assert sent[1] == [{"foo": "bar"}, {"foo": "wiz"}]
+        # Once sent, the records are completed.
+        response = run()
+        assert calls == ["bar", "wiz", "bar", "wiz"]
+        assert response["stats"] == {"received": 2, "successes": 2}
+
+    def test_dynamodb(self, dynamodb_table):
+        store = idempotency.DynamoDBStore(dynamodb_table)
+        args = (
+            store,
+            [{"foo": "bar"}],
+            EventSourceType.KINESIS,
+            testing.kinesis_payload,
+        )
+        self.run(*args)
+        response, calls = self.run(*args)
+        assert calls == []
+        assert response["output"] == ["BAR"]
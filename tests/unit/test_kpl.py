@@ -0,0 +1,46 @@
+import hashlib
+
+import pytest
+
+from lpipe import exceptions, kpl
+
+
+def test_aggregate():
+    msg = b"\x0a\x02pk" + b"\x1a\x05\x08\x00\x1a\x01a"
+    assert kpl.aggregate([b"a"], "pk") == kpl.MAGIC + msg + hashlib.md5(msg).digest()
+
+
+@pytest.mark.parametrize("explicit_hash_key", [None, "42"])
+def test_round_trip(explicit_hash_key):
+    data = [b"foo", b"", b"x" * 300]
+    aggregated = kpl.aggregate(data, "pk", explicit_hash_key)
+    assert kpl.is_aggregated(aggregated)
+    records = kpl.deaggregate(aggregated)
+    assert [r.data for r in records] == data
+    assert all([r.partition_key == "pk" for r in records])
+    assert all([r.explicit_hash_key == explicit_hash_key for r in records])
+
+
+def test_sizes():
+    data = [b"foo", b"x" * 300]
+    aggregated = kpl.aggregate(data, "pk", "42")
+    assert len(aggregated) == kpl.overhead("pk", "42") + sum(
+        [kpl.record_size(d, ehk=True) for d in data]
+    )
+
+
+def test_not_aggregated():
+    assert not kpl.is_aggregated(b'{"foo": "bar"}')
+
+
+def test_checksum():
+    aggregated = bytearray(kpl.aggregate([b"a"], "pk"))
+    aggregated[-1] ^= 0xFF
+    with pytest.raises(exceptions.InvalidPayloadError):
+        kpl.deaggregate(bytes(aggregated))
+
+
+def test_corrupt():
+    msg = b"\x1a\x05\x08\x07\x1a\x01a"  # partition key index out of range
+    with pytest.raises(exceptions.InvalidPayloadError):
+        kpl.deaggregate(kpl.MAGIC + msg + hashlib.md5(msg).digest())
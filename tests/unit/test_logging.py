@@ -1,4 +1,5 @@
 import json
+import threading
 
 from boto3_fixtures.utils import emit_logs
 
@@ -85,3 +86,21 @@ def test_logger_bind_unbind():
 def test_encode_logger():
     logger = LPLogger()
     json.dumps(logger, cls=AutoEncoder)
+
+
+def test_logger_context_threads():
+    logger = LPLogger()
+    logger.bind(main="yes")
+    seen = {}
+
+    def worker():
+        with logger.context(bind={"worker": "yes"}):
+            seen["inside"] = dict(logger._logger._context)
+        seen["after"] = dict(logger._logger._context)
+
+    thread = threading.Thread(target=worker)
+    thread.start()
+    thread.join()
+    assert seen["inside"] == {"main": "yes", "worker": "yes"}
+    assert seen["after"] == {"main": "yes"}
+    assert logger._logger._context == {"main": "yes"}
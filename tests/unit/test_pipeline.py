@@ -1,17 +1,27 @@
+import base64
+import json
+import threading
+import time
+from collections import defaultdict
 from copy import deepcopy
 from enum import Enum
 
+import boto3
 import boto3_fixtures as b3f
 import botocore
 import pytest
 from decouple import config
 
-from lpipe import exceptions, testing
+from lpipe import envelope, exceptions, idempotency, testing, wire
 from lpipe.action import Action
+from lpipe.claimcheck import ClaimCheck
+from lpipe.compression import Codec
+from lpipe.contrib import kinesis
 from lpipe.contrib.sqs import get_queue_url
 from lpipe.payload import Payload
 from lpipe.pipeline import (
     EventSourceType,
+    detect_event_source_type,
     get_event_source,
     get_kinesis_payload,
     get_payload_from_record,
@@ -21,6 +31,7 @@ from lpipe.pipeline import (
     put_record,
 )
 from lpipe.queue import Queue, QueueType
+from lpipe.wire import WireFormat
 from tests import fixtures
 
 
@@ -116,6 +127,20 @@ def test_get_event_source_invalid():
                 "event_source_type": EventSourceType.RAW,
             },
         ),
+        (
+            "sns",
+            {
+                "encode_func": testing.sns_payload,
+                "event_source_type": EventSourceType.SNS,
+            },
+        ),
+        (
+            "sns-via-sqs",
+            {
+                "encode_func": lambda p: testing.sns_payload(p, via_sqs=True),
+                "event_source_type": EventSourceType.SQS,
+            },
+        ),
     ],
 )
 def test_get_payload_from_record(fixture_name, fixture):
@@ -128,6 +153,62 @@ def test_get_payload_from_record(fixture_name, fixture):
     assert payload_records == records
 
 
+def test_get_payload_from_record_eventbridge():
+    record = {"path": "foo", "kwargs": {}}
+    event = testing.eventbridge_payload(record, source="my.service")
+    (event_record,) = get_records_from_event(EventSourceType.EVENTBRIDGE, event)
+    assert get_payload_from_record(EventSourceType.EVENTBRIDGE, event_record) == record
+    assert get_event_source(EventSourceType.EVENTBRIDGE, event_record) == "my.service"
+
+
+@pytest.mark.parametrize(
+    "event,expected",
+    [
+        (testing.raw_payload([{"foo": "bar"}]), EventSourceType.RAW),
+        ({"foo": "bar"}, EventSourceType.RAW),
+        ({"Records": [{"foo": "bar"}]}, EventSourceType.RAW),
+        (testing.sqs_payload([{"foo": "bar"}]), EventSourceType.SQS),
+        (testing.sns_payload([{"foo": "bar"}], via_sqs=True), EventSourceType.SQS),
+        ({"Records": []}, EventSourceType.RAW),
+        (testing.kinesis_payload([{"foo": "bar"}]), EventSourceType.KINESIS),
+        (testing.dynamodb_payload([{"foo": "bar"}]), EventSourceType.DYNAMODB),
+        (testing.s3_payload("bucket", ["key"]), EventSourceType.S3),
+        (testing.sns_payload([{"foo": "bar"}]), EventSourceType.SNS),
+        (testing.firehose_payload([{"foo": "bar"}]), EventSourceType.FIREHOSE),
+        (testing.eventbridge_payload({"foo": "bar"}), EventSourceType.EVENTBRIDGE),
+        (
+            testing.eventbridge_payload(
+                {}, source="aws.events", detail_type="Scheduled Event"
+            ),
+            EventSourceType.RAW,
+        ),
+        (testing.kafka_payload([{"foo": "bar"}]), EventSourceType.KAFKA),
+        ({"Records": [{"eventSource": "aws:kinesis"}]}, EventSourceType.KINESIS),
+    ],
+)
+def test_detect_event_source_type(event, expected):
+    assert detect_event_source_type(event) == expected
+
+
+@pytest.mark.parametrize(
+    "event",
+    [
+        testing.raw_payload([{"path": "ECHO", "kwargs": {"foo": "bar"}}]),
+        testing.sqs_payload([{"path": "ECHO", "kwargs": {"foo": "bar"}}]),
+        testing.kinesis_payload([{"path": "ECHO", "kwargs": {"foo": "bar"}}]),
+    ],
+    ids=["raw", "sqs", "kinesis"],
+)
+def test_process_event_auto(set_environment, event):
+    response = process_event(
+        event=event,
+        context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+        paths={"ECHO": [lambda foo, **kwargs: foo]},
+        event_source_type=EventSourceType.AUTO,
+    )
+    assert response["output"] == ["bar"]
+
+
 def test_get_payload_from_record_invalid():
     with pytest.raises(exceptions.InvalidPayloadError):
         get_payload_from_record(EventSourceType.RAW, "badjsonstring")
@@ -142,6 +223,52 @@ def test_queue(fixture_name, fixture):
     assert q
 
 
+@pytest.mark.parametrize(
+    "fixture_name,selector",
+    [
+        ("field", "user.id"),
+        ("keys", ["user", "id"]),
+        ("function", lambda kwargs: kwargs["user"]["id"]),
+    ],
+)
+@pytest.mark.parametrize("path", ["FOO", None])
+def test_queue_partition_key(fixture_name, selector, path):
+    q = Queue(QueueType.KINESIS, path, name="foo", partition_key=selector)
+    kwargs = {"user": {"id": 42}}
+    record = {"path": path, "kwargs": kwargs} if path else kwargs
+    assert q.get_partition_key(record) == "42"
+    assert q.get_explicit_hash_key(record) is None
+
+
+def test_queue_partition_key_missing():
+    q = Queue(QueueType.KINESIS, "FOO", name="foo", partition_key="user.id")
+    with pytest.raises(exceptions.InvalidPayloadError):
+        q.get_partition_key({"path": "FOO", "kwargs": {}})
+
+
+@pytest.mark.parametrize(
+    "queue_type,url",
+    [
+        (QueueType.FIREHOSE, None),
+        (QueueType.SNS, "arn:aws:sns:us-east-2:123456789012:topic"),
+        (QueueType.EVENTBRIDGE, None),
+    ],
+)
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"envelope": True},
+        {"codec": Codec.GZIP},
+        {"claim_check": ClaimCheck("bucket")},
+        {"wire_format": WireFormat.MSGPACK},
+    ],
+    ids=["envelope", "codec", "claim_check", "wire_format"],
+)
+def test_queue_unsupported(queue_type, url, kwargs):
+    with pytest.raises(exceptions.InvalidConfigurationError):
+        Queue(queue_type, "FOO", name="foo", url=url, **kwargs)
+
+
 class Path(Enum):
     FOO = 1
 
@@ -178,6 +305,17 @@ class TestPutRecord:
         fixture = {"path": queue.path, "kwargs": {}}
         put_record(queue=queue, record=fixture)
 
+    def test_kinesis_partition_key(self, set_environment):
+        kinesis_streams = fixtures.KINESIS
+        queue = Queue(
+            type=QueueType.KINESIS,
+            path="FOO",
+            name=kinesis_streams[0],
+            partition_key="id",
+        )
+        fixture = {"path": queue.path, "kwargs": {"id": "bar"}}
+        put_record(queue=queue, record=fixture)
+
     def test_sqs_by_url(self, set_environment):
         sqs_queues = fixtures.SQS
         queue_url = get_queue_url(sqs_queues[0])
@@ -333,3 +471,560 @@ class TestProcessEvents:
         fixture_response = {"stats": {"received": 1, "successes": 1}}
         for k, v in fixture_response.items():
             assert response[k] == v
+
+
+class TestTimeout:
+    class Context:
+        function_name = "my_lambda"
+
+        def __init__(self, remaining_ms):
+            self.remaining_ms = remaining_ms
+
+        def get_remaining_time_in_millis(self):
+            return self.remaining_ms
+
+    @pytest.fixture
+    def clock(self, monkeypatch):
+        now = [1000.0]
+        monkeypatch.setattr(time, "monotonic", lambda: now[0])
+        return now
+
+    def run(self, clock, event, remaining_ms=10000, **kwargs):
+        def _tick(**kwargs):
+            clock[0] += 3
+
+        return process_event(
+            event=event["encoder"]([{"foo": "bar"}] * 4),
+            context=self.Context(remaining_ms),
+            paths={"TICK": [_tick]},
+            default_path="TICK",
+            event_source_type=event["type"],
+            **kwargs,
+        )
+
+    @pytest.mark.parametrize(
+        "event,identifiers",
+        [
+            ({"type": EventSourceType.SQS, "encoder": testing.sqs_payload}, ["2", "3"]),
+            (
+                {"type": EventSourceType.KINESIS, "encoder": testing.kinesis_payload},
+                ["2", "3"],
+            ),
+            (
+                {"type": EventSourceType.DYNAMODB, "encoder": testing.dynamodb_payload},
+                ["2", "3"],
+            ),
+            ({"type": EventSourceType.SNS, "encoder": testing.sns_payload}, []),
+            ({"type": EventSourceType.RAW, "encoder": testing.raw_payload}, []),
+        ],
+    )
+    def test_stop_near_deadline(self, set_environment, clock, event, identifiers):
+        # 10s remaining, 5s margin, each record takes 3s: 2 records are started
+        response = self.run(clock, event, timeout_margin=5)
+        assert response["stats"] == {"received": 4, "successes": 2, "unstarted": 2}
+        assert response.get("batchItemFailures", []) == [
+            {"itemIdentifier": i} for i in identifiers
+        ]
+
+    def test_kafka(self, set_environment, clock):
+        # Kafka can't retry part of a batch, so the whole batch is retried.
+        event = {"type": EventSourceType.KAFKA, "encoder": testing.kafka_payload}
+        with pytest.raises(exceptions.FailCatastrophically) as e:
+            self.run(clock, event, timeout_margin=5)
+        assert "'unstarted': 2" in str(e.value)
+
+    def test_disabled(self, set_environment, clock):
+        event = {"type": EventSourceType.SQS, "encoder": testing.sqs_payload}
+        response = self.run(clock, event)
+        assert response["stats"] == {"received": 4, "successes": 4}
+        assert "batchItemFailures" not in response
+
+
+class TestFirehoseTransformation:
+    @staticmethod
+    def _transform(foo, **kwargs):
+        if foo == "drop":
+            raise exceptions.FailButContinue("dropped")
+        if foo == "fail":
+            raise exceptions.FailCatastrophically("failed")
+        if foo == "same":
+            return None
+        return {"foo": foo.upper()}
+
+    def test_results(self, set_environment):
+        event = testing.firehose_payload(
+            [{"foo": "bar"}, {"foo": "same"}, {"foo": "drop"}, {"foo": "fail"}]
+        )
+        response = process_event(
+            event=event,
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"TRANSFORM": [self._transform]},
+            default_path="TRANSFORM",
+            event_source_type=EventSourceType.FIREHOSE,
+        )
+        # FailCatastrophically is reported per record rather than raised.
+        assert response["stats"] == {"received": 4, "successes": 2}
+        records = response["records"]
+        assert [r["recordId"] for r in records] == ["0", "1", "2", "3"]
+        assert [r["result"] for r in records] == [
+            "Ok",
+            "Ok",
+            "Dropped",
+            "ProcessingFailed",
+        ]
+        assert base64.b64decode(records[0]["data"]) == b'{"foo": "BAR"}\n'
+        assert "output" not in response
+        # Records which weren't transformed are passed through unchanged.
+        for i in (1, 2, 3):
+            assert records[i]["data"] == event["records"][i]["data"]
+
+    @pytest.mark.parametrize(
+        "data", [b"{not json", wire.MSGPACK_MAGIC + b"\xc1"], ids=["json", "msgpack"]
+    )
+    def test_undecodable(self, set_environment, data):
+        event = testing.firehose_payload([{"foo": "bar"}, {"foo": "bar"}])
+        event["records"][1]["data"] = base64.b64encode(data).decode("ascii")
+        response = process_event(
+            event=event,
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"TRANSFORM": [self._transform]},
+            default_path="TRANSFORM",
+            event_source_type=EventSourceType.FIREHOSE,
+        )
+        assert response["stats"] == {"received": 2, "successes": 1}
+        records = response["records"]
+        assert [r["result"] for r in records] == ["Ok", "ProcessingFailed"]
+        assert records[1]["data"] == event["records"][1]["data"]
+
+
+class TestKafka:
+    def run(self, event, paths, **kwargs):
+        return process_event(
+            event=event,
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths=paths,
+            default_path="HANDLE",
+            event_source_type=EventSourceType.KAFKA,
+            **kwargs,
+        )
+
+    def test_metadata(self, set_environment):
+        calls = []
+
+        def _handle(foo, payload, **kwargs):
+            calls.append((foo, payload.metadata))
+
+        event = testing.kafka_payload(
+            [{"foo": "bar"}], key="user-1", headers={"trace": "abc"}
+        )
+        response = self.run(event, {"HANDLE": [_handle]})
+        assert response["stats"] == {"received": 1, "successes": 1}
+        assert calls == [
+            (
+                "bar",
+                {
+                    "topic": "my-topic",
+                    "partition": 0,
+                    "offset": 0,
+                    "timestamp": 1577836800000,
+                    "key": "user-1",
+                    "headers": {"trace": "abc"},
+                },
+            )
+        ]
+
+    def test_partitions_run_concurrently_in_order(self, set_environment):
+        barrier = threading.Barrier(2, timeout=5)
+        calls = defaultdict(list)
+
+        def _handle(i, payload, **kwargs):
+            if payload.metadata["offset"] == 0:
+                # Only passes if both partitions are running at the same time.
+                barrier.wait()
+            calls[payload.metadata["partition"]].append(i)
+
+        event = testing.kafka_payload([{"i": i} for i in range(6)], partitions=2)
+        response = self.run(event, {"HANDLE": [_handle]}, partition_workers=2)
+        assert response["stats"] == {"received": 6, "successes": 6}
+        assert dict(calls) == {0: [0, 2, 4], 1: [1, 3, 5]}
+
+    def test_idempotency_by_offset(self, set_environment):
+        calls = []
+
+        def _handle(foo, **kwargs):
+            calls.append(foo)
+
+        # Identical values at different offsets are different records.
+        event = testing.kafka_payload([{"foo": "bar"}] * 3)
+        response = self.run(
+            event, {"HANDLE": [_handle]}, idempotency_store=idempotency.MemoryStore()
+        )
+        assert response["stats"] == {"received": 3, "successes": 3}
+        assert calls == ["bar", "bar", "bar"]
+
+    def test_partition_stops_at_failure(self, set_environment):
+        calls = []
+
+        def _handle(i, **kwargs):
+            calls.append(i)
+            if i == 2:
+                raise exceptions.FailCatastrophically("failed")
+
+        event = testing.kafka_payload([{"i": i} for i in range(6)], partitions=2)
+        with pytest.raises(exceptions.FailCatastrophically) as e:
+            self.run(event, {"HANDLE": [_handle]})
+        # Partition 0 stopped after offset 1 failed; partition 1 carried on.
+        assert calls == [0, 2, 1, 3, 5]
+        assert "'unstarted': 1" in str(e.value)
+        assert "batchItemFailures" not in str(e.value)
+
+
+class TestDynamoDB:
+    def test_payload(self, set_environment):
+        calls = []
+
+        def _handle(event_name, keys, new_image, old_image, **kwargs):
+            calls.append((event_name, keys, new_image, old_image))
+
+        event = testing.dynamodb_payload(
+            [{"id": "a", "count": 2, "tags": ["x"], "meta": {"ok": True}}],
+            event_name="MODIFY",
+        )
+        response = process_event(
+            event=event,
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"HANDLE": [_handle]},
+            default_path="HANDLE",
+            event_source_type=EventSourceType.DYNAMODB,
+        )
+        assert response["stats"] == {"received": 1, "successes": 1}
+        assert calls == [
+            (
+                "MODIFY",
+                {"id": "a"},
+                {"id": "a", "count": 2, "tags": ["x"], "meta": {"ok": True}},
+                None,
+            )
+        ]
+
+    def test_invalid_image(self):
+        event = testing.dynamodb_payload([{"id": "a"}])
+        event["Records"][0]["dynamodb"]["NewImage"] = {"id": {"XX": "a"}}
+        with pytest.raises(exceptions.InvalidPayloadError):
+            get_payload_from_record(EventSourceType.DYNAMODB, event["Records"][0])
+
+
+@pytest.mark.usefixtures("sqs", "kinesis")
+class TestDeadLetterQueue:
+    def run(self, dlq, payloads):
+        def _poison(foo, **kwargs):
+            if foo == "poison":
+                raise exceptions.FailButContinue("poisoned")
+
+        return process_event(
+            event=testing.sqs_payload(payloads),
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"POISON": [_poison]},
+            default_path="POISON",
+            event_source_type=EventSourceType.SQS,
+            dlq=dlq,
+        )
+
+    def receive(self, queue_url):
+        messages = []
+        client = boto3.client("sqs")
+        while True:
+            resp = client.receive_message(QueueUrl=queue_url, MaxNumberOfMessages=10)
+            if not resp.get("Messages"):
+                return messages
+            for m in resp["Messages"]:
+                messages.append(json.loads(m["Body"]))
+                client.delete_message(
+                    QueueUrl=queue_url, ReceiptHandle=m["ReceiptHandle"]
+                )
+
+    def test_sqs(self, set_environment):
+        queue_url = get_queue_url(fixtures.SQS[0])
+        payloads = [{"foo": "poison", "i": i} for i in range(12)] + [{"foo": "bar"}]
+        response = self.run(Queue(QueueType.SQS, url=queue_url), payloads)
+        assert response["stats"] == {
+            "received": 13,
+            "successes": 1,
+            "dead_letters": 12,
+        }
+        messages = self.receive(queue_url)
+        assert sorted([m["record"]["i"] for m in messages]) == list(range(12))
+        assert messages[0]["exception"]["type"] == "FailButContinue"
+        assert messages[0]["exception"]["message"] == "poisoned"
+        assert messages[0]["event_source_type"] == "SQS"
+
+    def test_sqs_with_path(self, set_environment):
+        queue_url = get_queue_url(fixtures.SQS[0])
+        dlq = Queue(QueueType.SQS, path="REPAIR", url=queue_url)
+        self.run(dlq, [{"foo": "poison"}])
+        messages = self.receive(queue_url)
+        assert messages[0]["path"] == "REPAIR"
+        assert messages[0]["kwargs"]["record"] == {"foo": "poison"}
+
+    def test_kinesis(self, set_environment):
+        dlq = Queue(QueueType.KINESIS, name=fixtures.KINESIS[0])
+        response = self.run(dlq, [{"foo": "poison"}, {"foo": "poison"}])
+        assert response["stats"]["dead_letters"] == 2
+
+    @pytest.mark.parametrize(
+        "dlq",
+        [
+            Queue(QueueType.SQS, url="badqueue"),
+            Queue(QueueType.KINESIS, name="badstream"),
+        ],
+        ids=["sqs", "kinesis"],
+    )
+    def test_fail_to_send(self, set_environment, dlq):
+        # The batch is redriven rather than losing its dead letters.
+        with pytest.raises(exceptions.FailCatastrophically):
+            self.run(dlq, [{"foo": "poison"}])
+
+    @pytest.mark.parametrize("dlq", [True, False])
+    def test_undecodable(self, set_environment, dlq):
+        queue_url = get_queue_url(fixtures.SQS[0])
+        event = testing.sqs_payload([{"foo": "bar"}, {"foo": "bar"}])
+        event["Records"][0]["body"] = "{not json"
+        response = process_event(
+            event=event,
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"BAR": [lambda foo, **kwargs: foo]},
+            default_path="BAR",
+            event_source_type=EventSourceType.SQS,
+            dlq=Queue(QueueType.SQS, url=queue_url) if dlq else None,
+        )
+        assert response["stats"]["received"] == 2
+        assert response["stats"]["successes"] == 1
+        messages = self.receive(queue_url)
+        if dlq:
+            assert len(messages) == 1
+            assert messages[0]["record"] == event["Records"][0]
+            assert messages[0]["exception"]["type"] == "InvalidPayloadError"
+        else:
+            assert messages == []
+
+
+@pytest.mark.usefixtures("sqs", "kinesis")
+class TestLocalQueues:
+    def run(self, local_queues, foo="bar", error=None):
+        calls = []
+        queue_url = get_queue_url(fixtures.SQS[0])
+        boto3.client("sqs").purge_queue(QueueUrl=queue_url)
+
+        def root(**kwargs):
+            return Payload(
+                queue=Queue(QueueType.SQS, path="LEAF", url=queue_url),
+                kwargs={"foo": foo},
+            )
+
+        def leaf(foo, **kwargs):
+            calls.append(foo)
+            if error:
+                raise error
+            return "leaf"
+
+        response = process_event(
+            event=testing.raw_payload([{"path": "ROOT", "kwargs": {}}]),
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"ROOT": [root], "LEAF": [leaf]},
+            event_source_type=EventSourceType.RAW,
+            local_queues=local_queues,
+        )
+        attributes = boto3.client("sqs").get_queue_attributes(
+            QueueUrl=queue_url, AttributeNames=["ApproximateNumberOfMessages"]
+        )["Attributes"]
+        return response, calls, int(attributes["ApproximateNumberOfMessages"])
+
+    def test_inline(self, set_environment):
+        # Matched by name, though the Action's queue was configured by url.
+        response, calls, n_messages = self.run(
+            [Queue(QueueType.SQS, name=fixtures.SQS[0])]
+        )
+        assert calls == ["bar"]
+        assert n_messages == 0
+        # The same output as publishing the record.
+        assert "output" not in response
+
+    def test_remote(self, set_environment):
+        response, calls, n_messages = self.run(
+            [Queue(QueueType.KINESIS, name=fixtures.SQS[0])]
+        )
+        assert calls == []
+        assert n_messages == 1
+        assert "output" not in response
+
+    def test_inline_serialized(self, set_environment):
+        response, calls, n_messages = self.run(
+            [Queue(QueueType.SQS, name=fixtures.SQS[0])], foo=("bar",)
+        )
+        # Received as it would have been from the queue.
+        assert calls == [["bar"]]
+        assert n_messages == 0
+
+    @pytest.mark.parametrize(
+        "error",
+        [exceptions.FailButContinue("poisoned"), exceptions.FailCatastrophically()],
+        ids=["continue", "catastrophically"],
+    )
+    def test_inline_failure(self, set_environment, error):
+        response, calls, n_messages = self.run(
+            [Queue(QueueType.SQS, name=fixtures.SQS[0])], error=error
+        )
+        # The current record succeeds, and the failed one is published instead.
+        assert response["stats"] == {"received": 1, "successes": 1}
+        assert calls == ["bar"]
+        assert n_messages == 1
+
+
+@pytest.mark.usefixtures("sqs", "kinesis")
+class TestEnvelope:
+    def test_unpack(self, set_environment):
+        calls = []
+
+        def _poison(foo, **kwargs):
+            if foo == "poison":
+                raise exceptions.FailButContinue("poisoned")
+            calls.append(foo)
+            return foo
+
+        records = [{"foo": "bar"}, {"foo": "poison"}, {"foo": "baz"}]
+        response = process_event(
+            event=testing.sqs_payload(
+                [envelope.pack(records, max_bytes=1024)[0], {"foo": "wiz"}]
+            ),
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"POISON": [_poison]},
+            default_path="POISON",
+            event_source_type=EventSourceType.SQS,
+        )
+        # Each packed record is tracked individually.
+        assert response["stats"] == {"received": 4, "successes": 3}
+        assert calls == ["bar", "baz", "wiz"]
+        assert response["output"] == ["bar", "baz", "wiz"]
+
+    def test_outbox(self, set_environment):
+        queue_url = get_queue_url(fixtures.SQS[0])
+        response = process_event(
+            event=testing.raw_payload(
+                [{"path": "ROOT", "kwargs": {"foo": i}} for i in range(20)]
+            ),
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={
+                "ROOT": [
+                    Action(
+                        queues=[
+                            Queue(
+                                QueueType.SQS, path="LEAF", url=queue_url, envelope=True
+                            )
+                        ],
+                        required_params=["foo"],
+                    )
+                ]
+            },
+            event_source_type=EventSourceType.RAW,
+        )
+        assert response["stats"] == {"received": 20, "successes": 20}
+        messages = boto3.client("sqs").receive_message(
+            QueueUrl=queue_url, MaxNumberOfMessages=10
+        )["Messages"]
+        # Every record sent during the invocation was packed into one message.
+        assert len(messages) == 1
+        records = envelope.unpack(json.loads(messages[0]["Body"]))
+        assert [r["kwargs"]["foo"] for r in records] == list(range(20))
+
+
+@pytest.mark.usefixtures("sqs", "kinesis")
+class TestCompression:
+    RECORD = {"path": "ECHO", "kwargs": {"foo": "bar" * 1000}}
+
+    def run(self, event, event_source_type):
+        return process_event(
+            event=event,
+            context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+            paths={"ECHO": [lambda foo, **kwargs: foo]},
+            event_source_type=event_source_type,
+        )
+
+    def test_sqs(self, set_environment):
+        queue_url = get_queue_url(fixtures.SQS[0])
+        queue = Queue(QueueType.SQS, url=queue_url, codec=Codec.GZIP)
+        put_record(queue=queue, record=self.RECORD)
+        message = boto3.client("sqs").receive_message(QueueUrl=queue_url)["Messages"][0]
+        assert len(message["Body"]) < len(json.dumps(self.RECORD))
+        response = self.run(
+            {"Records": [{"body": message["Body"], "messageId": "0"}]},
+            EventSourceType.SQS,
+        )
+        assert response["output"] == [self.RECORD["kwargs"]["foo"]]
+
+    @pytest.mark.parametrize("wire_format", [WireFormat.JSON, WireFormat.MSGPACK])
+    def test_sqs_wire_format(self, set_environment, wire_format):
+        if wire_format == WireFormat.MSGPACK:
+            pytest.importorskip("msgpack")
+        queue_url = get_queue_url(fixtures.SQS[0])
+        queue = Queue(QueueType.SQS, url=queue_url, wire_format=wire_format)
+        put_record(queue=queue, record=self.RECORD)
+        message = boto3.client("sqs").receive_message(QueueUrl=queue_url)["Messages"][0]
+        boto3.client("sqs").delete_message(
+            QueueUrl=queue_url, ReceiptHandle=message["ReceiptHandle"]
+        )
+        response = self.run(
+            {"Records": [{"body": message["Body"], "messageId": "0"}]},
+            EventSourceType.SQS,
+        )
+        assert response["output"] == [self.RECORD["kwargs"]["foo"]]
+
+    def test_kinesis(self, set_environment):
+        data = kinesis.build(self.RECORD, codec=Codec.GZIP)["Data"]
+        assert isinstance(data, bytes)
+        event = {
+            "Records": [
+                {
+                    "kinesis": {
+                        "data": base64.b64encode(data).decode("utf-8"),
+                        "sequenceNumber": "0",
+                    }
+                }
+            ]
+        }
+        response = self.run(event, EventSourceType.KINESIS)
+        assert response["output"] == [self.RECORD["kwargs"]["foo"]]
+
+
+def test_kpl_aggregated(set_environment):
+    seen = []
+
+    def _poison(foo, **kwargs):
+        if foo == "poison":
+            raise exceptions.FailButContinue("poisoned")
+        seen.append(foo)
+
+    entries = kinesis.aggregate_entries(
+        [kinesis.build({"foo": foo}) for foo in ("bar", "poison", "baz")],
+        by_key=False,
+    )
+    assert len(entries) == 1
+    event = {
+        "Records": [
+            {
+                "kinesis": {
+                    "data": base64.b64encode(e["Data"]).decode("utf-8"),
+                    "sequenceNumber": "0",
+                }
+            }
+            for e in entries
+        ]
+    }
+    response = process_event(
+        event=event,
+        context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+        paths={"POISON": [_poison]},
+        default_path="POISON",
+        event_source_type=EventSourceType.KINESIS,
+    )
+    assert response["stats"] == {"received": 3, "successes": 2}
+    assert seen == ["bar", "baz"]
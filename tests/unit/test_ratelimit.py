@@ -0,0 +1,81 @@
+import pytest
+
+from lpipe import ratelimit
+from lpipe.queue import Queue, QueueType
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+class TestTokenBucket:
+    def test_within_capacity(self):
+        clock = FakeClock()
+        bucket = ratelimit.TokenBucket(rate=10, clock=clock)
+        assert bucket.reserve(10) == 0
+
+    def test_overdrawn(self):
+        clock = FakeClock()
+        bucket = ratelimit.TokenBucket(rate=10, clock=clock)
+        assert bucket.reserve(10) == 0
+        assert bucket.reserve(5) == pytest.approx(0.5)
+        clock.now += 0.5
+        assert bucket.reserve(5) == pytest.approx(0.5)
+
+    def test_refill_capped(self):
+        clock = FakeClock()
+        bucket = ratelimit.TokenBucket(rate=10, clock=clock)
+        bucket.reserve(10)
+        clock.now += 100
+        assert bucket.reserve(10) == 0
+        assert bucket.reserve(10) == pytest.approx(1)
+
+
+class TestRateLimiter:
+    def test_records_and_bytes(self):
+        clock = FakeClock()
+        limiter = ratelimit.RateLimiter(
+            records_per_second=100,
+            bytes_per_second=1000,
+            clock=clock,
+            sleep=clock.sleep,
+        )
+        assert limiter.acquire(10, 1000) == 0
+        # bytes are the bottleneck
+        assert limiter.acquire(10, 500) == pytest.approx(0.5)
+        assert clock.slept == [pytest.approx(0.5)]
+
+    def test_deadline(self):
+        clock = FakeClock()
+        limiter = ratelimit.RateLimiter(
+            records_per_second=1, clock=clock, sleep=clock.sleep
+        )
+        limiter.acquire(1)
+        assert limiter.acquire(10, deadline=2) == pytest.approx(2)
+        assert limiter.acquire(10, deadline=1) == 0
+
+
+class TestQueueRateLimiter:
+    def test_unset(self):
+        assert Queue(QueueType.SQS, name="foo").rate_limiter is None
+
+    def test_shared(self):
+        a = Queue(QueueType.KINESIS, name="shared", records_per_second=1000)
+        b = Queue(QueueType.KINESIS, name="shared", records_per_second=1000)
+        assert a.rate_limiter is b.rate_limiter
+        assert a.rate_limiter is a.rate_limiter
+
+    def test_reconfigured(self):
+        a = Queue(QueueType.KINESIS, name="reconfigured", records_per_second=1000)
+        b = Queue(QueueType.KINESIS, name="reconfigured", bytes_per_second=1000)
+        assert a.rate_limiter is not b.rate_limiter
+        assert "bytes" in b.rate_limiter.buckets
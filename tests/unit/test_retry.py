@@ -0,0 +1,140 @@
+import boto3_fixtures as b3f
+import pytest
+from decouple import config
+
+from lpipe import Action, Retry, exceptions, testing
+from lpipe.pipeline import EventSourceType, process_event
+
+
+class Flaky:
+    def __init__(self, failures, exception=ConnectionResetError):
+        self.failures = failures
+        self.exception = exception
+        self.calls = 0
+
+    def __call__(self, **kwargs):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.exception()
+        return "ok"
+
+
+class TestRetry:
+    def test_success_after_retries(self):
+        slept = []
+        f = Flaky(2)
+        retry = Retry(
+            exceptions=(ConnectionResetError,), attempts=3, sleep=slept.append
+        )
+        assert retry.call(f) == "ok"
+        assert f.calls == 3
+        assert len(slept) == 2
+
+    def test_exhausted(self):
+        f = Flaky(3)
+        retry = Retry(
+            exceptions=(ConnectionResetError,), attempts=3, sleep=lambda s: None
+        )
+        with pytest.raises(ConnectionResetError):
+            retry.call(f)
+        assert f.calls == 3
+
+    def test_unmatched_exception(self):
+        f = Flaky(1, exception=KeyError)
+        retry = Retry(exceptions=(ConnectionResetError,), sleep=lambda s: None)
+        with pytest.raises(KeyError):
+            retry.call(f)
+        assert f.calls == 1
+
+    def test_default_exceptions(self):
+        f = Flaky(1)
+        with pytest.raises(ConnectionResetError):
+            Retry(sleep=lambda s: None).call(f)
+        assert f.calls == 1
+
+    def test_lpipe_exceptions_not_retried(self):
+        f = Flaky(1, exception=exceptions.InvalidPayloadError)
+        retry = Retry(exceptions=(Exception,), sleep=lambda s: None)
+        with pytest.raises(exceptions.InvalidPayloadError):
+            retry.call(f)
+        assert f.calls == 1
+
+    def test_backoff(self):
+        retry = Retry(base=1, max_backoff=3)
+        for attempt, cap in [(1, 1), (2, 2), (3, 3), (10, 3)]:
+            assert 0 <= retry.backoff(attempt) <= cap
+
+    def test_deadline(self):
+        f = Flaky(1)
+        retry = Retry(exceptions=(ConnectionResetError,), base=10, sleep=lambda s: None)
+        retry.backoff = lambda attempt: 10
+        with pytest.raises(ConnectionResetError):
+            retry.call(f, deadline=0)
+        assert f.calls == 1
+
+    def test_max_time(self):
+        f = Flaky(1)
+        retry = Retry(
+            exceptions=(ConnectionResetError,), max_time=5, sleep=lambda s: None
+        )
+        retry.backoff = lambda attempt: 10
+        with pytest.raises(ConnectionResetError):
+            retry.call(f)
+        assert f.calls == 1
+
+
+class TestResend:
+    def send(self, outcomes):
+        sent = []
+
+        def _send(entries):
+            sent.append(list(entries))
+            ok = outcomes.pop(0)
+            return [i for i, e in enumerate(entries) if e not in ok]
+
+        return _send, sent
+
+    def test_resend_failed(self):
+        send, sent = self.send([{"a", "c"}, {"b"}])
+        responses, failed = Retry(sleep=lambda s: None).resend(
+            send, ["a", "b", "c"], failed=lambda r, entries: r
+        )
+        assert sent == [["a", "b", "c"], ["b"]]
+        assert failed == []
+        assert len(responses) == 2
+
+    def test_gives_up(self):
+        send, sent = self.send([set(), set()])
+        responses, failed = Retry(attempts=2, sleep=lambda s: None).resend(
+            send, ["a", "b"], failed=lambda r, entries: r
+        )
+        assert len(sent) == 2
+        assert failed == ["a", "b"]
+
+
+def test_action_retry(set_environment):
+    f = Flaky(2)
+
+    def flaky(**kwargs):
+        return f(**kwargs)
+
+    response = process_event(
+        event=testing.raw_payload([{"foo": "bar"}]),
+        context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+        paths={
+            "FLAKY": [
+                Action(
+                    functions=[flaky],
+                    retry=Retry(
+                        exceptions=(ConnectionResetError,),
+                        attempts=3,
+                        sleep=lambda s: None,
+                    ),
+                )
+            ]
+        },
+        default_path="FLAKY",
+        event_source_type=EventSourceType.RAW,
+    )
+    assert f.calls == 3
+    assert response["output"] == ["ok"]
@@ -0,0 +1,238 @@
+import threading
+from enum import Enum
+
+import boto3_fixtures as b3f
+import pytest
+from decouple import config
+
+from lpipe import Action, Payload, testing
+from lpipe.pipeline import EventSourceType, process_event
+from lpipe.scheduler import Order, Scheduler
+
+
+def run(paths, payload, **kwargs):
+    return process_event(
+        event=testing.raw_payload([payload]),
+        context=b3f.awslambda.MockContext(function_name=config("FUNCTION_NAME")),
+        paths=paths,
+        event_source_type=EventSourceType.RAW,
+        **kwargs,
+    )
+
+
+def tree(calls):
+    """A returns [B, C], B returns D, C and D return their names."""
+
+    def a(**kwargs):
+        calls.append("A")
+        return [Payload(path="B", kwargs={}), Payload(path="C", kwargs={})]
+
+    def b(**kwargs):
+        calls.append("B")
+        return Payload(path="D", kwargs={})
+
+    def c(**kwargs):
+        calls.append("C")
+        return "C"
+
+    def d(**kwargs):
+        calls.append("D")
+        return "D"
+
+    return {"A": [a], "B": [b], "C": [c], "D": [d]}
+
+
+@pytest.mark.parametrize(
+    "scheduler,order,output",
+    [
+        (None, ["A", "B", "D", "C"], "C"),
+        (Scheduler(order=Order.DFS), ["A", "B", "D", "C"], "C"),
+        (Scheduler(order=Order.BFS), ["A", "B", "C", "D"], "D"),
+        (
+            Scheduler(
+                order=Order.PRIORITY,
+                priority=lambda p: {"B": 2, "C": 1}.get(str(p.path).split(".")[-1], 0),
+            ),
+            ["A", "C", "B", "D"],
+            "D",
+        ),
+    ],
+)
+def test_order(set_environment, scheduler, order, output):
+    calls = []
+    response = run(tree(calls), {"path": "A", "kwargs": {}}, scheduler=scheduler)
+    assert calls == order
+    assert response["output"] == [output]
+
+
+def test_action_paths_dfs(set_environment):
+    calls = []
+
+    def record(name):
+        def f(**kwargs):
+            calls.append(name)
+
+        return f
+
+    paths = {
+        "ROOT": [
+            Action(functions=[record("ROOT_1")], paths=["LEAF"]),
+            Action(functions=[record("ROOT_2")]),
+        ],
+        "LEAF": [record("LEAF")],
+    }
+    run(paths, {"path": "ROOT", "kwargs": {}})
+    # An Action's paths finish before the next Action starts
+    assert calls == ["ROOT_1", "LEAF", "ROOT_2"]
+
+
+def deep(n: int, **kwargs):
+    if n > 0:
+        return Payload(path="DEEP", kwargs={"n": n - 1})
+    return "bottom"
+
+
+@pytest.mark.parametrize("order", [Order.DFS, Order.BFS])
+def test_deep_chain(set_environment, order):
+    # Far deeper than the recursion limit would allow for recursive execution.
+    response = run(
+        {"DEEP": [deep]},
+        {"path": "DEEP", "kwargs": {"n": 3000}},
+        scheduler=Scheduler(order=order),
+    )
+    assert response["output"] == ["bottom"]
+
+
+@pytest.mark.parametrize("order", [Order.DFS, Order.BFS])
+def test_max_depth(set_environment, order):
+    response = run(
+        {"DEEP": [deep]},
+        {"path": "DEEP", "kwargs": {"n": 10}},
+        scheduler=Scheduler(order=order, max_depth=5),
+    )
+    assert response["stats"] == {"received": 1, "successes": 0}
+
+
+@pytest.mark.parametrize("order", [Order.DFS, Order.BFS])
+def test_max_fan_out(set_environment, order):
+    calls = []
+    paths = tree(calls)
+    response = run(
+        paths,
+        {"path": "A", "kwargs": {}},
+        scheduler=Scheduler(order=order, max_fan_out=1),
+    )
+    assert response["stats"] == {"received": 1, "successes": 0}
+    assert calls == ["A"]
+
+
+def test_concurrent_branches(set_environment):
+    barrier = threading.Barrier(4, timeout=5)
+
+    def fan_out(**kwargs):
+        return [Payload(path="WAIT", kwargs={}) for _ in range(4)]
+
+    def wait(logger, **kwargs):
+        # Only passes if all 4 branches are running at once.
+        with logger.context(bind={"branch": threading.get_ident()}):
+            barrier.wait()
+        return "done"
+
+    response = run(
+        {"FAN_OUT": [fan_out], "WAIT": [wait]},
+        {"path": "FAN_OUT", "kwargs": {}},
+        scheduler=Scheduler(order=Order.BFS, max_workers=4),
+    )
+    assert response["output"] == ["done"]
+
+
+def test_deferred_poisoned_branch(set_environment):
+    def fan_out(**kwargs):
+        return [Payload(path="INVALID", kwargs={}), Payload(path="OK", kwargs={})]
+
+    response = run(
+        {
+            "FAN_OUT": [fan_out],
+            "INVALID": [Action(paths=["OK"], required_params=["foo"])],
+            "OK": [lambda **kwargs: None],
+        },
+        {"path": "FAN_OUT", "kwargs": {}},
+        scheduler=Scheduler(order=Order.BFS),
+    )
+    # The invalid branch poisons the record, as it would have depth-first.
+    assert response["stats"] == {"received": 1, "successes": 0}
+
+
+@pytest.mark.parametrize("order,calls", [(Order.DFS, []), (Order.BFS, ["OK"])])
+def test_unhandled_exception(set_environment, order, calls):
+    _calls = []
+    Path = Enum("Path", ["FAN_OUT", "UNDEFINED", "OK"])
+
+    def fan_out(**kwargs):
+        return [Payload(path="UNDEFINED", kwargs={}), Payload(path="OK", kwargs={})]
+
+    def ok(**kwargs):
+        _calls.append("OK")
+
+    response = run(
+        {Path.FAN_OUT: [fan_out], Path.OK: [ok]},
+        {"path": "FAN_OUT", "kwargs": {}},
+        path_enum=Path,
+        scheduler=Scheduler(order=order),
+    )
+    # Logged and skipped, as unhandled exceptions always have been.
+    assert response["stats"] == {"received": 1, "successes": 1}
+    assert _calls == calls
+
+
+def test_concurrent_action_paths(set_environment):
+    barrier = threading.Barrier(4, timeout=5)
+
+    def branch(name):
+        def f(**kwargs):
+            # Only passes if all 4 branches are running at once.
+            barrier.wait()
+            return name
+
+        return f
+
+    paths = {
+        "ROOT": [Action(paths=["A", "B", "C", "D"], max_workers=4)],
+        "A": [branch("A")],
+        "B": [branch("B")],
+        "C": [branch("C")],
+        "D": [branch("D")],
+    }
+    response = run(paths, {"path": "ROOT", "kwargs": {}})
+    # The result of the last branch, as if they had run one after another.
+    assert response["output"] == ["D"]
+
+
+def test_concurrent_action_paths_nested(set_environment):
+    paths = {
+        "ROOT": [Action(paths=["MIDDLE", "MIDDLE"], max_workers=2)],
+        "MIDDLE": [Action(paths=["LEAF", "LEAF", "LEAF"], max_workers=2)],
+        "LEAF": [lambda **kwargs: "leaf"],
+    }
+    response = run(paths, {"path": "ROOT", "kwargs": {}})
+    assert response["output"] == ["leaf"]
+
+
+def test_concurrent_action_paths_failure(set_environment):
+    calls = []
+
+    def ok(**kwargs):
+        calls.append("OK")
+
+    paths = {
+        "ROOT": [
+            Action(paths=["INVALID", "OK"], max_workers=2),
+            Action(functions=[ok]),
+        ],
+        "INVALID": [Action(paths=["OK"], required_params=["foo"])],
+        "OK": [ok],
+    }
+    response = run(paths, {"path": "ROOT", "kwargs": {}})
+    assert response["stats"] == {"received": 1, "successes": 0}
+    # Sibling branches still run, but the Action's failure stops the path.
+    assert calls == ["OK"]
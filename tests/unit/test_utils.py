@@ -20,6 +20,29 @@ def test_batch():
     assert iter[2] == [5, 6]
 
 
+class TestBatchBySize:
+    def test_count(self):
+        things = ["a", "b", "c", "d", "e"]
+        iter = list(utils.batch_by_size(things, max_count=2, max_bytes=100))
+        assert iter == [["a", "b"], ["c", "d"], ["e"]]
+
+    def test_bytes(self):
+        things = ["aaaa", "bbbb", "cc", "dddddd", "e"]
+        iter = list(utils.batch_by_size(things, max_count=10, max_bytes=8))
+        assert iter == [["aaaa", "bbbb"], ["cc", "dddddd"], ["e"]]
+
+    def test_item_too_large(self):
+        with pytest.raises(ValueError):
+            list(utils.batch_by_size(["a", "bbbbbb"], max_count=10, max_bytes=4))
+
+    def test_check_sizes(self):
+        utils.check_sizes(["aaaa", "bb"], max_bytes=4)
+        with pytest.raises(exceptions.RecordTooLargeError) as e:
+            utils.check_sizes(["aaaa", "bbbbb", "c", "dddddd"], max_bytes=4)
+        assert "record 1 is 5 bytes" in str(e.value)
+        assert "record 3 is 6 bytes" in str(e.value)
+
+
 class FakePath(Enum):
     FOO = 1
 
@@ -0,0 +1,72 @@
+import json
+from enum import Enum
+
+import pytest
+
+from lpipe import compression, exceptions, wire
+from lpipe.compression import Codec
+from lpipe.payload import Payload
+from lpipe.utils import AutoEncoder
+from lpipe.wire import WireFormat
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+class Color(Enum):
+    RED = 1
+
+
+RECORD = {
+    "path": "FOO",
+    "kwargs": {
+        "color": Color.RED,
+        "bytes": b"bar",
+        "payload": Payload(path="BAR", kwargs={"i": 1}),
+        "nested": [{"a": None, "b": 1.5, "c": True}],
+    },
+}
+
+
+def test_json():
+    assert wire.loads(wire.dumps({"foo": "bar"})) == {"foo": "bar"}
+
+
+@pytest.mark.skipif(msgpack is None, reason="msgpack is not installed")
+class TestMsgpack:
+    def test_round_trip(self):
+        data = wire.dumps(RECORD, WireFormat.MSGPACK)
+        assert data.startswith(wire.MSGPACK_MAGIC)
+        # Decodes exactly as a JSON hop would.
+        assert wire.loads(data) == json.loads(json.dumps(RECORD, cls=AutoEncoder))
+
+    def test_smaller(self):
+        record = {"path": "FOO", "kwargs": {"values": list(range(1000))}}
+        assert len(wire.dumps(record, WireFormat.MSGPACK)) < len(wire.dumps(record))
+
+    def test_compressed(self):
+        record = {"path": "FOO", "kwargs": {"foo": "bar" * 1000}}
+        data = wire.dumps(record, WireFormat.MSGPACK)
+        compressed = compression.maybe_compress(data, Codec.GZIP)
+        assert isinstance(compressed, bytes) and compressed != data
+        assert wire.loads(compressed) == record
+        text = compression.compress_text(data, Codec.GZIP)
+        assert wire.loads(text) == record
+        assert wire.loads(text.encode("utf-8")) == record
+
+    def test_text(self):
+        text = compression.compress_text(wire.dumps({"foo": "bar"}, WireFormat.MSGPACK))
+        assert text.startswith(compression.TEXT_PREFIX)
+        assert wire.loads(text) == {"foo": "bar"}
+
+    def test_invalid(self):
+        with pytest.raises(exceptions.InvalidPayloadError):
+            wire.loads(wire.MSGPACK_MAGIC + b"\xc1")
+
+
+@pytest.mark.skipif(msgpack is not None, reason="msgpack is installed")
+def test_msgpack_not_installed():
+    with pytest.raises(exceptions.InvalidConfigurationError):
+        wire.dumps({"foo": "bar"}, WireFormat.MSGPACK)